@@ -0,0 +1,124 @@
+# ia_whatsapp_assistant/app/core/archive.py
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from app.core.dedup import prune_processed_messages
+from app.core.task_manager import ARCHIVED_STATUSES
+from app.db.database import run_in_session
+from app.models import models
+from config.settings import (ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_BATCH_PAUSE_SECONDS, ARCHIVE_INTERVAL_SECONDS,
+                             DEDUP_RETENTION_DAYS)
+
+logger = logging.getLogger(__name__)
+
+# Hot/cold split: completed and cancelled tasks finished more than `after_days` ago move from `tasks` to
+# `tasks_archive`, so the owner-scoped and reminder queries stop walking dead rows. Each batch is one short
+# transaction: pick up to `batch_size` candidates (skipping rows another transaction holds locked, where the
+# backend supports it), DELETE ... RETURNING them and INSERT exactly those rows into the archive. Between batches
+# the archiver sleeps, so request writers are never queued behind it for long.
+_ARCHIVED_COLUMNS = ("id", "description", "due_date", "priority", "status", "reminded_at", "owner_id", "created_at",
+                     "updated_at")
+
+def archive_batch(db, cutoff: datetime, limit: int):
+    """Moves up to `limit` tasks finished before `cutoff` (UTC, like updated_at) to the archive. Returns the count."""
+    Task = models.Task
+    # updated_at is set when the status changes; rows never updated fall back to their creation time
+    finished_at = func.coalesce(Task.updated_at, Task.created_at)
+    # One status at a time in due_date order walks ix_tasks_status_due and stops after `limit` matches, where
+    # ordering all finished tasks by id would read and sort every one of them on each batch
+    ids = []
+    for status in ARCHIVED_STATUSES:
+        ids += db.scalars(
+            select(Task.id)
+            .where(Task.status == status, finished_at < cutoff)
+            .order_by(Task.status, Task.due_date)
+            .limit(limit - len(ids))
+            .with_for_update(skip_locked=True)
+        )
+        if len(ids) >= limit:
+            break
+    if not ids:
+        db.rollback()
+        return 0
+    columns = [getattr(Task, name) for name in _ARCHIVED_COLUMNS]
+    if db.get_bind().dialect.delete_returning:
+        statement = delete(Task).where(Task.id.in_(ids))
+        rows = db.execute(statement.returning(*columns), execution_options={"synchronize_session": False}).all()
+    else:
+        rows = db.execute(select(*columns).where(Task.id.in_(ids))).all()
+        db.execute(delete(Task).where(Task.id.in_(ids)), execution_options={"synchronize_session": False})
+    if rows:
+        db.execute(insert(models.TaskArchive), [dict(zip(_ARCHIVED_COLUMNS, row)) for row in rows])
+    db.commit()
+    return len(rows)
+
+class TaskArchiver:
+    """Archives old finished tasks every `interval_seconds`, in batches of `batch_size`.
+
+    The same loop prunes webhook message ids claimed more than `dedup_retention_days` ago from
+    processed_messages, in batches of the same size. `session_factory` may produce Session or AsyncSession
+    objects.
+    """
+
+    def __init__(self, session_factory, after_days: float = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                 pause_seconds: float = ARCHIVE_BATCH_PAUSE_SECONDS, interval_seconds: float = ARCHIVE_INTERVAL_SECONDS,
+                 dedup_retention_days: float = DEDUP_RETENTION_DAYS, clock=datetime.utcnow):
+        self.session_factory = session_factory
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.interval_seconds = interval_seconds
+        self.dedup_retention_days = dedup_retention_days
+        self._clock = clock
+        self._task = None
+        self.archived = 0
+        self.pruned_message_ids = 0
+
+    async def _run_batches(self, batch, cutoff: datetime):
+        """Calls batch(db, cutoff, batch_size) until a batch comes back short. Returns the total count."""
+        total = 0
+        while True:
+            count = await run_in_session(self.session_factory, batch, cutoff, self.batch_size)
+            total += count
+            if count < self.batch_size:
+                return total
+            await asyncio.sleep(self.pause_seconds)
+
+    async def run_once(self):
+        """Archives everything currently past the cutoff, one batch at a time. Returns the number of tasks moved."""
+        now = self._clock()
+        cutoff = now - timedelta(days=self.after_days)
+        moved = await self._run_batches(archive_batch, cutoff)
+        self.archived += moved
+        if moved:
+            logger.info("Archived finished tasks", extra={"tasks": moved, "cutoff": cutoff.isoformat()})
+        dedup_cutoff = now - timedelta(days=self.dedup_retention_days)
+        pruned = await self._run_batches(prune_processed_messages, dedup_cutoff)
+        self.pruned_message_ids += pruned
+        if pruned:
+            logger.info("Pruned processed message ids", extra={"message_ids": pruned, "cutoff": dedup_cutoff.isoformat()})
+        return moved
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        return {"archived": self.archived, "after_days": self.after_days, "pruned_message_ids": self.pruned_message_ids}
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Task archiving failed")
+            await asyncio.sleep(self.interval_seconds)
@@ -0,0 +1,180 @@
+# ia_whatsapp_assistant/app/core/capture.py
+
+import copy
+import glob
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+
+from config.settings import (CAPTURE_DIR, CAPTURE_ROTATE_MB, CAPTURE_MAX_FILES, CAPTURE_QUEUE_SIZE,
+                             CAPTURE_PSEUDONYMIZE, CAPTURE_PSEUDONYMIZE_KEY)
+
+logger = logging.getLogger(__name__)
+
+# Opt-in capture of raw webhook deliveries for replay (benchmarks/replay_capture.py). The request path only
+# enqueues (arrival time, payload); a writer thread pseudonymizes, serializes and appends one JSON line per
+# delivery to gzip files that rotate by size. Files being written end in ".part" and are renamed when closed.
+
+FILE_PREFIX = "capture-"
+FILE_SUFFIX = ".ndjson.gz"
+
+class Pseudonymizer:
+    """Replaces phone numbers with stable digit strings (HMAC of the number) and drops profile names.
+
+    The same key maps a number to the same pseudonym across files and restarts, so per-user ordering and
+    intent mixes survive; without a key a random one is used for the life of the process.
+    """
+
+    def __init__(self, key: str = None):
+        self._key = (key or secrets.token_hex(32)).encode()
+        self._cache = {}
+
+    def phone(self, number):
+        if not number:
+            return number
+        pseudonym = self._cache.get(number)
+        if pseudonym is None:
+            digest = hmac.new(self._key, str(number).encode(), hashlib.sha256).hexdigest()
+            pseudonym = self._cache[number] = "99" + str(int(digest, 16) % 10 ** 11).zfill(11)
+        return pseudonym
+
+    def payload(self, payload: dict):
+        """A pseudonymized deep copy of a webhook delivery; the original is left untouched."""
+        payload = copy.deepcopy(payload)
+        for entry in payload.get("entry") or []:
+            for change in entry.get("changes") or []:
+                value = change.get("value") or {}
+                for contact in value.get("contacts") or []:
+                    contact["wa_id"] = self.phone(contact.get("wa_id"))
+                    if "profile" in contact:
+                        contact["profile"] = {"name": "redacted"}
+                for message in value.get("messages") or []:
+                    message["from"] = self.phone(message.get("from"))
+                for status in value.get("statuses") or []:
+                    status["recipient_id"] = self.phone(status.get("recipient_id"))
+        return payload
+
+class TrafficCapture:
+    """Appends deliveries to rotated, gzip-compressed NDJSON files from a background thread."""
+
+    def __init__(self, directory: str = CAPTURE_DIR, rotate_bytes: int = int(CAPTURE_ROTATE_MB * 1024 * 1024),
+                 max_files: int = CAPTURE_MAX_FILES, queue_size: int = CAPTURE_QUEUE_SIZE,
+                 pseudonymize: bool = CAPTURE_PSEUDONYMIZE, pseudonymize_key: str = CAPTURE_PSEUDONYMIZE_KEY):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes # Uncompressed bytes per file
+        self.max_files = max_files # Oldest closed files are deleted beyond this; 0 keeps them all
+        self.pseudonymizer = Pseudonymizer(pseudonymize_key) if pseudonymize else None
+        self.captured = 0
+        self.dropped = 0
+        self.files_closed = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._file = None
+        self._path = None
+        self._written = 0
+        self._sequence = 0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def record(self, payload: dict, arrived_at: float = None):
+        """Called on the request path: enqueues the delivery, or counts it as dropped if the writer is behind."""
+        try:
+            self._queue.put_nowait((arrived_at if arrived_at is not None else time.time(), payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Writes what is queued, closes the current file and stops the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def stats(self):
+        return {"captured": self.captured, "dropped": self.dropped, "files_closed": self.files_closed,
+                "queued": self._queue.qsize(), "current_file": self._path}
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except Exception:
+                self.dropped += 1
+                logger.exception("Traffic capture failed to write a delivery")
+        self._close_file()
+
+    def _write(self, arrived_at: float, payload: dict):
+        if self.pseudonymizer is not None:
+            payload = self.pseudonymizer.payload(payload)
+        line = (json.dumps({"ts": arrived_at, "payload": payload}, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+        if self._file is None:
+            self._open_file()
+        self._file.write(line)
+        self._written += len(line)
+        self.captured += 1
+        if self._written >= self.rotate_bytes:
+            self._close_file()
+
+    def _open_file(self):
+        self._sequence += 1
+        name = f"{FILE_PREFIX}{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._sequence:04d}{FILE_SUFFIX}"
+        self._path = os.path.join(self.directory, name)
+        self._file = gzip.open(self._path + ".part", "wb")
+        self._written = 0
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._path + ".part", self._path)
+        self._file = None
+        self._path = None
+        self.files_closed += 1
+        self._prune()
+
+    def _prune(self):
+        if self.max_files <= 0:
+            return
+        closed_files = sorted(glob.glob(os.path.join(self.directory, f"{FILE_PREFIX}*{FILE_SUFFIX}")))
+        for path in closed_files[:-self.max_files]:
+            os.remove(path)
+
+def capture_files(path: str):
+    """The closed capture files under a directory, oldest first (or [path] for a single file)."""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, f"{FILE_PREFIX}*{FILE_SUFFIX}")))
+    return [path]
+
+def read_capture(paths):
+    """Yields (arrival timestamp, payload) from capture files in order.
+
+    A file cut short (e.g. a ".part" file left by a crash) yields what was complete before the cut.
+    """
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as capture_file:
+            try:
+                for line in capture_file:
+                    if not line.endswith("\n"):
+                        break # Truncated last line
+                    record = json.loads(line)
+                    yield record["ts"], record["payload"]
+            except EOFError:
+                logger.warning("Capture file %s is truncated; replaying what was complete", path)
@@ -0,0 +1,101 @@
+# ia_whatsapp_assistant/app/core/dedup.py
+
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.lru import LRUCache
+from app.models import models
+from config.settings import DEDUP_CACHE_SIZE, DEDUP_CACHE_TTL_SECONDS
+
+class RecentIdCache(LRUCache):
+    """Bounded set of recently seen ids with a TTL."""
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def add(self, key):
+        self.put(key, True)
+
+# Fast path shared by every request handled by this process
+recent_message_ids = RecentIdCache(DEDUP_CACHE_SIZE, DEDUP_CACHE_TTL_SECONDS)
+
+def claim_message_ids(db: Session, message_ids: list):
+    """Inserts ids into processed_messages inside the caller's transaction and returns the ones newly claimed.
+
+    The unique index on message_id makes concurrent workers agree on a single owner per id; if the
+    caller rolls back, its claims are released and a redelivery will be processed.
+    """
+    if not message_ids:
+        return set()
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect_name == "sqlite" else postgresql_insert
+        stmt = (
+            insert(models.ProcessedMessage)
+            .values([{"message_id": message_id} for message_id in message_ids])
+            .on_conflict_do_nothing(index_elements=["message_id"])
+            .returning(models.ProcessedMessage.message_id)
+        )
+        return set(db.execute(stmt).scalars())
+    already_processed = set(db.scalars(
+        select(models.ProcessedMessage.message_id).where(models.ProcessedMessage.message_id.in_(message_ids))
+    ))
+    new_ids = [message_id for message_id in message_ids if message_id not in already_processed]
+    db.add_all(models.ProcessedMessage(message_id=message_id) for message_id in new_ids)
+    db.flush()
+    return set(new_ids)
+
+def filter_new_messages(db: Session, messages: list):
+    """Flags which parsed messages are first deliveries. Returns a list of booleans aligned with `messages`.
+
+    Redeliveries are dropped by the in-process cache without touching the database; the rest are claimed in
+    processed_messages. Messages without an id are always treated as new.
+    """
+    candidate_ids = []
+    seen_ids = set()
+    for message in messages:
+        message_id = message.get("message_id")
+        if message_id and message_id not in seen_ids and message_id not in recent_message_ids:
+            seen_ids.add(message_id)
+            candidate_ids.append(message_id)
+    claimed_ids = claim_message_ids(db, candidate_ids)
+
+    is_new = []
+    for message in messages:
+        message_id = message.get("message_id")
+        if not message_id:
+            is_new.append(True)
+        elif message_id in claimed_ids:
+            is_new.append(True)
+            claimed_ids.discard(message_id) # A repeat inside the same delivery is a duplicate
+        else:
+            is_new.append(False)
+    return is_new
+
+def remember_message_ids(message_ids):
+    """Adds committed ids to the fast path."""
+    for message_id in message_ids:
+        if message_id:
+            recent_message_ids.add(message_id)
+
+def prune_processed_messages(db: Session, cutoff: datetime, limit: int):
+    """Deletes up to `limit` claimed ids processed before `cutoff` (UTC) and commits. Returns the count.
+
+    Ids only need to outlive the window in which a delivery can be retried; without this the table and its
+    unique index grow with every inbound message. Ids grow with processed_at, so the oldest come first by id.
+    """
+    ProcessedMessage = models.ProcessedMessage
+    candidates = (
+        select(ProcessedMessage.id)
+        .where(ProcessedMessage.processed_at < cutoff)
+        .order_by(ProcessedMessage.id)
+        .limit(limit)
+    )
+    result = db.execute(delete(ProcessedMessage).where(ProcessedMessage.id.in_(candidates.scalar_subquery())),
+                        execution_options={"synchronize_session": False})
+    db.commit()
+    return result.rowcount
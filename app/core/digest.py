@@ -0,0 +1,185 @@
+# ia_whatsapp_assistant/app/core/digest.py
+
+import asyncio
+import itertools
+import logging
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from app.core import renderer, outbox
+from app.db.database import get_session_local
+from app.models import models
+from config.settings import DIGEST_BATCH_SIZE, DIGEST_YIELD_PER, WHATSAPP_MAX_TEXT_LENGTH
+
+logger = logging.getLogger(__name__)
+
+# The morning digest is one range query over the day's pending tasks joined to their opted-in owners, ordered
+# by owner and streamed with yield_per (a server-side cursor where the driver has one). Rows are grouped by
+# owner as they arrive, so Python holds one fetch batch plus one batch of rendered messages however many users
+# there are. Every `batch_size` users the messages are written to the outbox in their own transaction and the
+# outbox sender is woken, so delivery starts while the rest is still being read.
+# Every worker process runs its own DailyDigest; a row in digest_runs claims the day, so only the process that
+# inserts it sends. The claim is committed before anything is queued: a process that dies mid-digest leaves the
+# rest of that day unsent rather than risking a second copy for everyone.
+
+def claim_digest_day(db, day: date):
+    """Inserts the digest_runs row for `day` and commits. Returns True if this caller claimed the day."""
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect_name == "sqlite" else postgresql_insert
+        stmt = (
+            insert(models.DigestRun)
+            .values(day=day)
+            .on_conflict_do_nothing(index_elements=["day"])
+            .returning(models.DigestRun.day)
+        )
+        claimed = db.execute(stmt).scalar() is not None
+        db.commit()
+        return claimed
+    db.add(models.DigestRun(day=day))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+def digest_query(day: date):
+    day_start = datetime.combine(day, datetime.min.time())
+    Task, User = models.Task, models.User
+    return (
+        select(Task.owner_id, User.whatsapp_id, Task.id, Task.description, Task.due_date)
+        .join(User, Task.owner_id == User.id)
+        .where(
+            User.opt_in_status == True,
+            Task.status == "pending",
+            Task.due_date >= day_start,
+            Task.due_date < day_start + timedelta(days=1),
+        )
+        .order_by(Task.owner_id, Task.due_date, Task.id)
+    )
+
+def iter_digests(read_db, day: date, yield_per: int = DIGEST_YIELD_PER):
+    """Streams (whatsapp_id, [task rows]) per owner, in owner order."""
+    rows = read_db.execute(digest_query(day).execution_options(yield_per=yield_per))
+    for _, owner_rows in itertools.groupby(rows, key=lambda row: row.owner_id):
+        tasks = list(owner_rows)
+        yield tasks[0].whatsapp_id, tasks
+
+def enqueue_daily_digest(read_db, write_session_factory, day: date = None, batch_size: int = DIGEST_BATCH_SIZE,
+                         yield_per: int = DIGEST_YIELD_PER, on_batch=None):
+    """Renders one digest per opted-in user with pending tasks on `day` and writes them to the outbox.
+
+    `read_db` streams the query; each batch is committed through a session from `write_session_factory`, then
+    `on_batch()` is called (e.g. to wake the outbox sender). Returns (users, tasks).
+    """
+    day = day or date.today()
+    users = tasks = 0
+    outgoing = []
+
+    def flush():
+        with write_session_factory() as write_db:
+            outbox.enqueue(write_db, outgoing)
+            write_db.commit()
+        outgoing.clear()
+        if on_batch is not None:
+            on_batch()
+
+    batch_users = 0
+    for whatsapp_id, owner_tasks in iter_digests(read_db, day, yield_per):
+        for chunk in renderer.split_message(renderer.render_daily_digest(owner_tasks), WHATSAPP_MAX_TEXT_LENGTH):
+            outgoing.append((whatsapp_id, chunk))
+        users += 1
+        tasks += len(owner_tasks)
+        batch_users += 1
+        if batch_users >= batch_size:
+            flush()
+            batch_users = 0
+    if outgoing:
+        flush()
+    return users, tasks
+
+class DailyDigest:
+    """Sends the digest every day at `send_at` (local "HH:MM").
+
+    The digest runs in a worker thread on sync sessions, since it streams one long query. A process that
+    starts after `send_at` waits for the next day rather than sending a second digest, and of several processes
+    only the one that claims the day in digest_runs sends it.
+    """
+
+    def __init__(self, send_at: str = "08:00", session_factory=None, batch_size: int = DIGEST_BATCH_SIZE,
+                 yield_per: int = DIGEST_YIELD_PER, clock=datetime.now):
+        hour, minute = (int(part) for part in send_at.split(":"))
+        self.send_at = (hour, minute)
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.yield_per = yield_per
+        self._clock = clock
+        self._task = None
+        self.last_run = None # (day, users, tasks, seconds)
+        self.skipped_runs = 0 # Days another process had already claimed
+
+    def next_run(self, now: datetime):
+        run_at = now.replace(hour=self.send_at[0], minute=self.send_at[1], second=0, microsecond=0)
+        return run_at if run_at > now else run_at + timedelta(days=1)
+
+    async def run_once(self, day: date = None):
+        """Builds and queues the digest for `day` (default today), then hands it to the outbox sender.
+
+        Returns (users, tasks), or None if the day was already claimed by another run.
+        """
+        day = day or self._clock().date()
+        session_factory = self.session_factory or get_session_local()
+        loop = asyncio.get_running_loop()
+
+        def wake_sender():
+            if outbox.outbox_sender is not None and outbox.outbox_sender.running:
+                loop.call_soon_threadsafe(outbox.outbox_sender.notify)
+
+        def build():
+            with session_factory() as db:
+                if not claim_digest_day(db, day):
+                    return None
+            with session_factory() as read_db:
+                return enqueue_daily_digest(read_db, session_factory, day, self.batch_size, self.yield_per, wake_sender)
+
+        started = time.perf_counter()
+        result = await asyncio.to_thread(build)
+        if result is None:
+            self.skipped_runs += 1
+            logger.info("Daily digest already claimed", extra={"day": day.isoformat()})
+            return None
+        users, tasks = result
+        await outbox.dispatch_pending()
+        self.last_run = (day.isoformat(), users, tasks, round(time.perf_counter() - started, 3))
+        logger.info("Daily digest queued", extra={"day": day.isoformat(), "users": users, "tasks": tasks})
+        return users, tasks
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        return {"send_at": "%02d:%02d" % self.send_at, "last_run": self.last_run, "skipped_runs": self.skipped_runs}
+
+    async def _run(self):
+        run_at = None
+        while True:
+            now = self._clock()
+            # Never the same slot twice, even if the sleep ended a little before run_at by this clock
+            run_at = self.next_run(now if run_at is None else max(now, run_at))
+            await asyncio.sleep((run_at - now).total_seconds())
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Daily digest failed")
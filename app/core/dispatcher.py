@@ -0,0 +1,63 @@
+# ia_whatsapp_assistant/app/core/dispatcher.py
+
+import asyncio
+import zlib
+
+from app.core.ingestion import IngestionQueue
+
+class ShardedDispatcher:
+    """Routes jobs to a fixed shard by key (whatsapp_id); each shard is a bounded queue with a single worker.
+
+    Jobs for one key run one at a time in submission order, while different shards run in parallel.
+    """
+
+    def __init__(self, shards: int = 8, queue_maxsize: int = 200):
+        self.shards = [IngestionQueue(self._run_job, workers=1, maxsize=queue_maxsize) for _ in range(shards)]
+
+    @property
+    def running(self):
+        return bool(self.shards) and self.shards[0].running
+
+    def shard_for(self, key: str):
+        # crc32 instead of hash(): stable across processes and restarts
+        return zlib.crc32(key.encode("utf-8")) % len(self.shards)
+
+    def start(self):
+        for shard in self.shards:
+            shard.start()
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Stops all shards, letting each drain its accepted jobs within `drain_timeout`."""
+        await asyncio.gather(*(shard.stop(drain_timeout=drain_timeout) for shard in self.shards))
+
+    async def submit(self, key: str, job, timeout: float = 0.0):
+        """Enqueues `job` (an async callable) on the key's shard without waiting for it. May raise QueueFullError."""
+        await self.shards[self.shard_for(key)].submit((job, None), timeout=timeout)
+
+    async def run(self, key: str, job, timeout: float = 0.0):
+        """Enqueues `job` on the key's shard and waits for its result."""
+        future = asyncio.get_running_loop().create_future()
+        await self.shards[self.shard_for(key)].submit((job, future), timeout=timeout)
+        return await future
+
+    def stats(self):
+        return {
+            "shards": len(self.shards),
+            "queue_maxsize": self.shards[0].maxsize if self.shards else 0,
+            "queue_depth": [shard.depth() for shard in self.shards],
+            "in_flight": [shard.in_flight for shard in self.shards],
+            "processed": sum(shard.processed for shard in self.shards),
+            "failed": sum(shard.failed for shard in self.shards),
+            "rejected": sum(shard.rejected for shard in self.shards),
+        }
+
+    async def _run_job(self, item):
+        job, future = item
+        try:
+            result = await job()
+        except Exception as e:
+            if future is not None and not future.done():
+                future.set_exception(e)
+            raise # Let the shard count and log the failure
+        if future is not None and not future.done():
+            future.set_result(result)
@@ -0,0 +1,77 @@
+# ia_whatsapp_assistant/app/core/ingestion.py
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when an event cannot be enqueued (queue full past the timeout, or stopped)."""
+
+class IngestionQueue:
+    """Bounded in-process queue of raw webhook events drained by a pool of asyncio workers."""
+
+    def __init__(self, handler, workers: int = 4, maxsize: int = 1000):
+        self.handler = handler # async callable receiving one queued event
+        self.workers = workers
+        self.maxsize = maxsize
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_flight = 0 # Events a worker is handling right now
+        self._queue = None
+        self._tasks = []
+        self._accepting = False
+
+    @property
+    def running(self):
+        return self._accepting
+
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Creates the queue and worker tasks on the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._accepting = True
+
+    async def submit(self, event, timeout: float = 0.0):
+        """Enqueues an event, waiting up to `timeout` seconds for space before raising QueueFullError."""
+        if not self._accepting:
+            raise QueueFullError("Ingestion queue is not accepting events")
+        try:
+            if timeout > 0:
+                await asyncio.wait_for(self._queue.put(event), timeout)
+            else:
+                self._queue.put_nowait(event)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self.rejected += 1
+            raise QueueFullError(f"Ingestion queue full ({self.maxsize} events)")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Stops accepting events, waits up to `drain_timeout` for the queue to drain, then stops the workers."""
+        self._accepting = False
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Ingestion drain timed out with %d events still queued", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, worker_id: int):
+        while True:
+            event = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self.handler(event)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Ingestion worker %d failed to process event", worker_id)
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
@@ -0,0 +1,122 @@
+# ia_whatsapp_assistant/app/core/log.py
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+from config.settings import APP_ENV, LOG_LEVEL, LOG_FORMAT, LOG_PAYLOAD_SAMPLE_RATE
+
+# Modules log through logging.getLogger(__name__) with %-style arguments, so nothing is formatted for
+# disabled levels. configure_logging() puts a QueueHandler on the root logger: callers only enqueue the
+# record, and a background QueueListener formats it and writes to stdout.
+# LOG_LEVEL applies to the "app" loggers only; the root logger, and with it httpx, httpcore, aiosqlite and
+# asyncio, never goes below INFO, so DEBUG=True does not flood the output with library internals.
+
+APP_LOGGER = "app"
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is logged as a field
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+def _extra_fields(record: logging.LogRecord):
+    return {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRS}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus the record's `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for development, with `extra` fields appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread.
+
+    The stock prepare() merges the message and its arguments in the calling thread; here the record is
+    queued as is, so logged arguments must not be mutated afterwards.
+    """
+
+    def prepare(self, record):
+        return record
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is when the record is emitted."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+_listener = None
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT, handler: logging.Handler = None):
+    """Routes the root logger through a non-blocking queue. Safe to call again to reconfigure."""
+    global _listener
+    stop_logging()
+    handler = handler or _StdoutHandler()
+    handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    app_logger = logging.getLogger(APP_LOGGER)
+    app_logger.setLevel(level)
+    root.setLevel(max(app_logger.level, logging.INFO))
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+
+def stop_logging():
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(stop_logging)
+
+class LazyJson:
+    """Serializes its value only if a handler actually formats the record."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value, ensure_ascii=False, default=str)
+
+def log_payload(logger: logging.Logger, message: str, payload, sample_rate: float = None):
+    """Logs a full payload at DEBUG for a sampled fraction of calls. Never in production."""
+    if APP_ENV == "production" or not logger.isEnabledFor(logging.DEBUG):
+        return
+    sample_rate = LOG_PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+    logger.debug("%s: %s", message, LazyJson(payload))
@@ -0,0 +1,70 @@
+# ia_whatsapp_assistant/app/core/lru.py
+
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """Bounded LRU with an optional TTL and hit/miss counters; the in-process caches build on it.
+
+    Entries expire `ttl_seconds` after they were stored (never if it is None). Expired entries are dropped
+    when looked up, and from the least recently used end whenever something is stored.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float = None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict() # key -> (value, time it was stored)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expired(self, stored_at: float, now: float):
+        return self.ttl_seconds is not None and now - stored_at > self.ttl_seconds
+
+    def get(self, key, default=None, is_valid=None):
+        """The value for `key`, or `default` on a miss. An entry failing `is_valid(value)` is dropped as a miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            if not self._expired(stored_at, self._clock()) and (is_valid is None or is_valid(value)):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        entries = self._entries
+        now = self._clock()
+        entries[key] = (value, now)
+        entries.move_to_end(key)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        if self.ttl_seconds is not None:
+            while entries and self._expired(next(iter(entries.values()))[1], now):
+                entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
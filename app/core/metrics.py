@@ -0,0 +1,209 @@
+# ia_whatsapp_assistant/app/core/metrics.py
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config.settings import METRICS_ENABLED
+
+# In-process counters and histograms, rendered in the Prometheus text format by GET /metrics. Recording is a
+# dict lookup and an increment; cumulative buckets, label escaping and formatting only happen on a scrape.
+# With METRICS_ENABLED off every record call returns immediately.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; the webhook path is mostly sub-millisecond work plus DB and HTTP round trips
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+enabled = METRICS_ENABLED
+_registry = []
+
+class Counter:
+    """Monotonic counter, one value per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {} # label values tuple -> count
+        _registry.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        if enabled:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def reset(self):
+        self._values.clear()
+
+    def samples(self):
+        for labelvalues, value in self._values.items():
+            yield self.name, dict(zip(self.labelnames, labelvalues)), value
+
+class Histogram:
+    """Fixed-bucket histogram. Each observation increments a single (non-cumulative) bucket."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._counts = {} # label values tuple -> [count per bucket..., count above the last bucket]
+        self._sums = {}
+        _registry.append(self)
+
+    def observe(self, value, *labelvalues):
+        if not enabled:
+            return
+        counts = self._counts.get(labelvalues)
+        if counts is None:
+            counts = self._counts[labelvalues] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1 # Buckets are upper bounds: value <= le
+        self._sums[labelvalues] = self._sums.get(labelvalues, 0) + value
+
+    def count(self, *labelvalues):
+        return sum(self._counts.get(labelvalues, ()))
+
+    def reset(self):
+        self._counts.clear()
+        self._sums.clear()
+
+    def samples(self):
+        for labelvalues, counts in self._counts.items():
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(upper_bound)}, cumulative
+            yield f"{self.name}_sum", labels, self._sums[labelvalues]
+            yield f"{self.name}_count", labels, cumulative
+
+class Sampled:
+    """Gauge or counter whose values are read from `source` on each scrape, for state another component keeps.
+
+    `source` returns {label values tuple: value}; with no source (or metrics disabled) nothing is rendered.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str = "gauge", labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = labelnames
+        self.source = None
+        _registry.append(self)
+
+    def reset(self):
+        pass # Nothing recorded here; the source owns the values
+
+    def samples(self):
+        if not enabled or self.source is None:
+            return
+        for labelvalues, value in self.source().items():
+            yield self.name, dict(zip(self.labelnames, labelvalues)), value
+
+stage_seconds = Histogram(
+    "whatsapp_stage_duration_seconds",
+    "Time spent in each stage of message handling (parse, lookup, nlp, task_manager, commit, send).",
+    ("stage", "intent"),
+)
+webhook_seconds = Histogram("whatsapp_webhook_duration_seconds", "Time to answer a POST /webhook.")
+intents_total = Counter("whatsapp_intents_total", "Messages handled, by recognized intent.", ("intent",))
+db_queries_total = Counter("whatsapp_db_queries_total", "SQL statements sent to the database.")
+db_queries_per_batch = Histogram(
+    "whatsapp_db_queries_per_batch",
+    "SQL statements per processed message batch (a webhook delivery, or its share on one dispatcher shard).",
+    buckets=QUERY_COUNT_BUCKETS,
+)
+send_failures_total = Counter("whatsapp_send_failures_total", "Outbound WhatsApp messages that failed to send.", ("reason",))
+outbox_messages_total = Counter(
+    "whatsapp_outbox_messages_total", "Outbox delivery attempts, by outcome (sent, retry, failed).", ("outcome",)
+)
+
+dispatcher_queue_depth = Sampled("whatsapp_dispatcher_queue_depth", "Jobs waiting in each dispatcher shard's queue.", "gauge", ("shard",))
+dispatcher_in_flight = Sampled("whatsapp_dispatcher_in_flight", "Jobs each dispatcher shard is running right now.", "gauge", ("shard",))
+dispatcher_rejected_total = Sampled(
+    "whatsapp_dispatcher_rejected_total", "Jobs refused because the dispatcher shard's queue was full.", "counter", ("shard",)
+)
+
+def track_dispatcher(dispatcher):
+    """Exports the per-shard state of a ShardedDispatcher on /metrics; None stops exporting it."""
+    if dispatcher is None:
+        dispatcher_queue_depth.source = dispatcher_in_flight.source = dispatcher_rejected_total.source = None
+        return
+    per_shard = lambda value: lambda: {(str(index),): value(shard) for index, shard in enumerate(dispatcher.shards)}
+    dispatcher_queue_depth.source = per_shard(lambda shard: shard.depth())
+    dispatcher_in_flight.source = per_shard(lambda shard: shard.in_flight)
+    dispatcher_rejected_total.source = per_shard(lambda shard: shard.rejected)
+
+def observe_stage(stage: str, started: float, intent: str = ""):
+    """Records the time since `started` (a time.perf_counter() value) for a stage."""
+    if enabled:
+        stage_seconds.observe(time.perf_counter() - started, stage, intent)
+
+class QueryCount:
+    __slots__ = ("count", "outer")
+
+    def __init__(self, outer=None):
+        self.count = 0
+        self.outer = outer # An enclosing count_queries block, which counts the same statements
+
+_query_scope = ContextVar("query_scope", default=None)
+
+@contextmanager
+def count_queries():
+    """Counts the SQL statements executed by the current task or thread inside the block.
+
+    Works whether or not metrics are enabled, so tests can assert on round trips. Blocks nest.
+    """
+    counter = QueryCount(_query_scope.get())
+    token = _query_scope.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_scope.reset(token)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_scope.get()
+    while counter is not None:
+        counter.count += 1
+        counter = counter.outer
+    db_queries_total.inc()
+
+def reset():
+    """Clears every recorded value (tests and benchmarks)."""
+    for metric in _registry:
+        metric.reset()
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(label_value):
+    return str(label_value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def render_prometheus():
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample_name, labels, value in metric.samples():
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(label_value)}"' for key, label_value in labels.items())
+                lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{sample_name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,347 @@
+# ia_whatsapp_assistant/app/core/outbox.py
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, insert, or_, bindparam
+
+from app.core import metrics
+from app.db.database import get_session_factory, run_in_session
+from app.gateway import outbound
+from app.models import models
+from config.settings import (OUTBOX_BATCH_SIZE, OUTBOX_MAX_IN_FLIGHT, OUTBOX_POLL_SECONDS, OUTBOX_LEASE_SECONDS,
+                             OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF_BASE_SECONDS, OUTBOX_BACKOFF_MAX_SECONDS,
+                             OUTBOX_BREAKER_THRESHOLD, OUTBOX_BREAKER_COOLDOWN_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# Transactional outbox. Replies and reminders are inserted into outbox_messages by enqueue(), in the same
+# transaction as the task changes that produced them, so a committed change always has its message and a
+# rolled back one never does. OutboxSender delivers them: it claims a batch of due rows with one conditional
+# UPDATE (a token and a lease, so concurrent senders never claim the same row), sends them through
+# app.gateway.outbound, deletes what was sent and reschedules failures with exponential backoff. A circuit
+# breaker stops claiming while the Graph API keeps failing. Delivery is at least once: a sender that dies
+# after sending but before recording it leaves the row to be sent again when its lease expires.
+
+OutboxEntry = namedtuple("OutboxEntry", ["id", "recipient", "body", "attempts", "claim_token"])
+
+def enqueue(db, outgoing: list):
+    """Adds (recipient, text) messages to the outbox in the caller's transaction; the caller commits."""
+    if not outgoing:
+        return
+    now = datetime.now()
+    db.execute(insert(models.OutboxMessage), [
+        {"recipient": to_phone_number, "body": text, "status": "pending", "attempts": 0, "next_attempt_at": now}
+        for to_phone_number, text in outgoing
+    ])
+
+def is_retryable(result: dict):
+    """Transport errors, timeouts, 429 and 5xx may pass on a later attempt; other 4xx answers never will."""
+    status_code = result.get("status_code")
+    return status_code is None or status_code in (408, 429) or status_code >= 500
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `cooldown_seconds` lets one probe through (half open).
+
+    The probe's success closes it again, its failure reopens it for another cooldown.
+    """
+
+    def __init__(self, threshold: int = OUTBOX_BREAKER_THRESHOLD, cooldown_seconds: float = OUTBOX_BREAKER_COOLDOWN_SECONDS,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_out = False
+
+    def allow(self):
+        """Whether a send may start now. Moves an open breaker whose cooldown is over to half open."""
+        if self.threshold <= 0 or self.state == "closed":
+            return True
+        if self.state == "open" and self._clock() - self.opened_at >= self.cooldown_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_out:
+            self._probe_out = True
+            return True
+        return False # Open, or half open with the probe still out
+
+    def cancel_probe(self):
+        """The send allowed as a probe did not happen; the next allow() may start another."""
+        self._probe_out = False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_out = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.threshold > 0 and (self.state == "half_open" or self.failures >= self.threshold):
+            if self.state == "closed":
+                logger.warning("Outbox circuit breaker opened after %d consecutive failures", self.failures)
+            elif self.state == "half_open":
+                logger.warning("Outbox circuit breaker probe failed; open for another %.0fs", self.cooldown_seconds)
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = self._clock()
+            self._probe_out = False
+
+class OutboxSender:
+    """Claims due outbox rows in batches and delivers them. Several senders (processes) may share one table.
+
+    `session_factory` may produce Session or AsyncSession objects. Up to `max_in_flight` claimed batches are
+    being delivered at once, so a throttled recipient in one batch does not hold up the next.
+    """
+
+    def __init__(self, session_factory, batch_size: int = OUTBOX_BATCH_SIZE, max_in_flight: int = OUTBOX_MAX_IN_FLIGHT,
+                 poll_seconds: float = OUTBOX_POLL_SECONDS, lease_seconds: float = OUTBOX_LEASE_SECONDS,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS, backoff_base_seconds: float = OUTBOX_BACKOFF_BASE_SECONDS,
+                 backoff_max_seconds: float = OUTBOX_BACKOFF_MAX_SECONDS, breaker: CircuitBreaker = None,
+                 clock=datetime.now, rng: random.Random = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.breaker = breaker or CircuitBreaker()
+        self._clock = clock
+        self._random = rng or random.Random()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._deliveries = set()
+        self._wake = asyncio.Event()
+        self._task = None
+        self.claimed = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def notify(self):
+        """Wakes the sender loop (new rows were committed) instead of waiting for the next poll."""
+        self._wake.set()
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Stops claiming and waits up to `drain_timeout` seconds for batches being delivered.
+
+        Unsent rows stay in the table; rows of a cancelled delivery are claimed again once their lease expires.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._deliveries:
+            done, not_done = await asyncio.wait(set(self._deliveries), timeout=drain_timeout)
+            for task in not_done:
+                task.cancel()
+            await asyncio.gather(*not_done, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "claimed": self.claimed,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches_in_flight": len(self._deliveries),
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+        }
+
+    def backoff_seconds(self, attempts: int, retry_after: float = None):
+        """Delay before attempt `attempts + 1`: base * 2**(attempts - 1), capped, with jitter in its upper half."""
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempts - 1))
+        delay = delay / 2 + self._random.uniform(0, delay / 2) # Spreads out rows that failed together
+        return max(delay, retry_after or 0.0)
+
+    def claim_batch(self, db, limit: int):
+        """Claims up to `limit` due rows for this sender (one conditional UPDATE) and returns them oldest first."""
+        now = self._clock()
+        token = uuid.uuid4().hex
+        claimable = (
+            models.OutboxMessage.status == "pending",
+            models.OutboxMessage.next_attempt_at <= now,
+            or_(models.OutboxMessage.claimed_until == None, models.OutboxMessage.claimed_until < now),
+        )
+        # SKIP LOCKED lets concurrent senders on Postgres take different rows instead of queueing on the same
+        # ones; SQLite ignores it (writers are serialized anyway). The outer WHERE re-checks the claim either way.
+        due_ids = (
+            select(models.OutboxMessage.id).where(*claimable)
+            .order_by(models.OutboxMessage.id).limit(limit).with_for_update(skip_locked=True)
+        )
+        claim = (
+            update(models.OutboxMessage)
+            .where(models.OutboxMessage.id.in_(due_ids), *claimable)
+            .values(claim_token=token, claimed_until=now + timedelta(seconds=self.lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        columns = (models.OutboxMessage.id, models.OutboxMessage.recipient, models.OutboxMessage.body,
+                   models.OutboxMessage.attempts)
+        if db.get_bind().dialect.update_returning:
+            rows = db.execute(claim.returning(*columns)).all()
+        else:
+            db.execute(claim)
+            rows = db.execute(select(*columns).where(models.OutboxMessage.claim_token == token)).all()
+        db.commit()
+        return [OutboxEntry(*row, token) for row in sorted(rows)]
+
+    def record_results(self, db, sent: list, retries: list, failed: list):
+        """Deletes sent rows and reschedules or gives up on the others, if this sender still holds their claim.
+
+        `retries` holds (entry, next_attempt_at, error) and `failed` holds (entry, error).
+        """
+        outbox = models.OutboxMessage.__table__
+        if sent:
+            db.execute(delete(outbox).where(outbox.c.id.in_([entry.id for entry in sent]),
+                                            outbox.c.claim_token == sent[0].claim_token))
+        updates = [
+            {"b_id": entry.id, "b_token": entry.claim_token, "b_status": "pending", "b_attempts": entry.attempts + 1,
+             "b_next_attempt_at": next_attempt_at, "b_error": error}
+            for entry, next_attempt_at, error in retries
+        ] + [
+            {"b_id": entry.id, "b_token": entry.claim_token, "b_status": "failed", "b_attempts": entry.attempts + 1,
+             "b_next_attempt_at": self._clock(), "b_error": error}
+            for entry, error in failed
+        ]
+        if updates:
+            db.execute(
+                update(outbox)
+                .where(outbox.c.id == bindparam("b_id"), outbox.c.claim_token == bindparam("b_token"))
+                .values(status=bindparam("b_status"), attempts=bindparam("b_attempts"),
+                        next_attempt_at=bindparam("b_next_attempt_at"), last_error=bindparam("b_error"),
+                        claim_token=None, claimed_until=None),
+                updates,
+            )
+        db.commit()
+
+    async def run_once(self):
+        """Claims one batch (a single probe while the breaker is half open) and starts delivering it.
+
+        Returns the number of rows claimed; 0 when nothing is due or the breaker is open.
+        """
+        if not self.breaker.allow():
+            return 0
+        limit = 1 if self.breaker.state == "half_open" else self.batch_size
+        await self._in_flight.acquire()
+        try:
+            entries = await run_in_session(self.session_factory, self.claim_batch, limit)
+        except Exception:
+            self._in_flight.release()
+            raise
+        if not entries:
+            self._in_flight.release()
+            self.breaker.cancel_probe() # Nothing to probe with
+            return 0
+        self.claimed += len(entries)
+        task = asyncio.create_task(self._deliver_batch(entries))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+        return len(entries)
+
+    async def drain(self):
+        """Delivers everything that is due now and waits for it (used when no sender loop is running)."""
+        while await self.run_once():
+            await asyncio.gather(*set(self._deliveries), return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            self._wake.clear() # Rows committed from here on set it again and skip the wait below
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                logger.exception("Outbox sender pass failed")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue # More may be due right away
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver_batch(self, entries: list):
+        try:
+            by_recipient = {}
+            for entry in entries:
+                by_recipient.setdefault(entry.recipient, []).append(entry)
+            outcomes = await asyncio.gather(*(self._send_to_recipient(to, recipient_entries)
+                                              for to, recipient_entries in by_recipient.items()))
+            sent, retries, failed = [], [], []
+            now = self._clock()
+            for entry, result in (outcome for recipient_outcomes in outcomes for outcome in recipient_outcomes):
+                if result.get("status") != "error":
+                    sent.append(entry)
+                    continue
+                attempts = entry.attempts + 1
+                error = str(result.get("error_message") or result.get("status_code"))[:500]
+                if is_retryable(result) and attempts < self.max_attempts:
+                    delay = self.backoff_seconds(attempts, result.get("retry_after"))
+                    retries.append((entry, now + timedelta(seconds=delay), error))
+                else:
+                    failed.append((entry, error))
+                    logger.error("Giving up on outbox message after %d attempts: %s", attempts, error,
+                                 extra={"outbox_id": entry.id, "to": entry.recipient})
+            await run_in_session(self.session_factory, self.record_results, sent, retries, failed)
+            self.sent += len(sent)
+            self.retried += len(retries)
+            self.failed += len(failed)
+            for outcome, rows in (("sent", sent), ("retry", retries), ("failed", failed)):
+                if rows:
+                    metrics.outbox_messages_total.inc(outcome, amount=len(rows))
+        except Exception:
+            logger.exception("Outbox delivery failed; the batch is retried when its lease expires")
+        finally:
+            self._in_flight.release()
+
+    async def _send_to_recipient(self, to_phone_number: str, entries: list):
+        """Sends a recipient's texts in order; returns [(entry, result)] and feeds the circuit breaker."""
+        try:
+            results = await outbound.send_messages(to_phone_number, [entry.body for entry in entries])
+        except Exception as e:
+            results = [{"status": "error", "error_message": str(e)}] * len(entries)
+        outcomes = []
+        for entry, result in zip(entries, results):
+            result = result if isinstance(result, dict) else {} # Anything but an error dict counts as sent
+            if result.get("status") != "error":
+                self.breaker.record_success()
+            elif is_retryable(result):
+                self.breaker.record_failure()
+            outcomes.append((entry, result))
+        return outcomes
+
+# Running sender loop of this process, set by start_outbox_sender()
+outbox_sender = None
+
+def start_outbox_sender(session_factory=None, **options):
+    """Starts the process-wide sender loop on the running event loop (app startup)."""
+    global outbox_sender
+    outbox_sender = OutboxSender(session_factory or get_session_factory(), **options)
+    outbox_sender.start()
+    return outbox_sender
+
+async def stop_outbox_sender(drain_timeout: float = 10.0):
+    global outbox_sender
+    if outbox_sender is not None:
+        await outbox_sender.stop(drain_timeout)
+        outbox_sender = None
+
+async def dispatch_pending(session_factory=None):
+    """Called after committing outbox rows: wakes the running sender, or delivers them right here without one."""
+    if outbox_sender is not None and outbox_sender.running:
+        outbox_sender.notify()
+        return
+    await OutboxSender(session_factory or get_session_factory()).drain()
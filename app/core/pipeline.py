@@ -0,0 +1,284 @@
+# ia_whatsapp_assistant/app/core/pipeline.py
+
+import asyncio
+import functools
+import logging
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.gateway import whatsapp_handler
+from app.nlp import processor as nlp_processor
+from app.core import task_manager, dedup, renderer, metrics, outbox
+from app.core.renderer import ListCursor, list_cursors
+from app.core.reminder_cache import get_reminder_block
+from app.db.database import get_session_factory, run_in_session
+from config.settings import TASK_LIST_PAGE_SIZE, WHATSAPP_MAX_TEXT_LENGTH
+
+logger = logging.getLogger(__name__)
+
+async def process_webhook_payload(db, payload: dict):
+    """Parses a raw webhook delivery and processes every message in it as one batch."""
+    started = time.perf_counter()
+    messages = whatsapp_handler.parse_incoming_whatsapp_messages(payload)
+    metrics.observe_stage("parse", started)
+    if not messages:
+        return {"status": "ignored", "reason": "Non-text message or parse error"}
+    results = await process_message_batch(db, messages)
+    if len(results) == 1:
+        return results[0]
+    return {"status": "batch_processed", "count": len(results), "results": results}
+
+async def dispatch_webhook_payload(dispatcher, payload: dict, wait: bool = True, timeout: float = 0.0):
+    """Routes a delivery's messages to the dispatcher shard of each sender, so each user's messages run in order.
+
+    Messages that share a shard are processed as one batch. With wait=False the call returns once every
+    sub-batch is enqueued (acknowledge-first ingestion). May raise QueueFullError.
+    """
+    started = time.perf_counter()
+    messages = whatsapp_handler.parse_incoming_whatsapp_messages(payload)
+    metrics.observe_stage("parse", started)
+    if not messages:
+        return {"status": "ignored", "reason": "Non-text message or parse error"}
+
+    by_shard = {}
+    for position, parsed_message in enumerate(messages):
+        by_shard.setdefault(dispatcher.shard_for(parsed_message["whatsapp_id"]), []).append((position, parsed_message))
+
+    sub_batches = []
+    for entries in by_shard.values():
+        shard_key = entries[0][1]["whatsapp_id"]
+        shard_messages = [parsed_message for _, parsed_message in entries]
+        job = functools.partial(process_message_batch_in_new_session, shard_messages)
+        sub_batches.append((entries, shard_key, job))
+
+    if not wait:
+        for _, shard_key, job in sub_batches:
+            await dispatcher.submit(shard_key, job, timeout=timeout)
+        return {"status": "accepted", "messages": len(messages)}
+
+    shard_results = await asyncio.gather(*(dispatcher.run(shard_key, job, timeout=timeout) for _, shard_key, job in sub_batches))
+    results = [None] * len(messages)
+    for (entries, _, _), batch_results in zip(sub_batches, shard_results):
+        for (position, _), result in zip(entries, batch_results):
+            results[position] = result
+    if len(results) == 1:
+        return results[0]
+    return {"status": "batch_processed", "count": len(results), "results": results}
+
+async def process_message_batch_in_new_session(messages: list):
+    """Dispatcher job: processes a batch of parsed messages on its own DB session (sync or async per DB_SESSION_MODE)."""
+    results = await run_in_session(get_session_factory(), apply_message_batch, messages)
+    await outbox.dispatch_pending()
+    return results
+
+async def process_incoming_message(db, parsed_message: dict):
+    """Processes a single parsed message (a batch of one)."""
+    results = await process_message_batch(db, [parsed_message])
+    return results[0]
+
+async def process_message_batch(db, messages: list):
+    """Processes a batch of parsed messages with one user lookup per sender and a single commit.
+
+    `db` is a Session or an AsyncSession; with the latter the database work runs through run_sync and never
+    blocks the event loop. Replies are committed to the outbox together with the task changes and sent from
+    there, in order for each recipient and concurrently across recipients.
+    """
+    if isinstance(db, AsyncSession):
+        results = await db.run_sync(apply_message_batch, messages)
+    else:
+        results = apply_message_batch(db, messages)
+    await outbox.dispatch_pending()
+    return results
+
+def apply_message_batch(db: Session, messages: list):
+    """The database part of process_message_batch. Commits the batch with its replies in the outbox; returns results."""
+    results = []
+    outgoing = []
+    with metrics.count_queries() as queries, task_manager.unit_of_work(db):
+        # Redeliveries are dropped here, before any NLP or task work
+        started = time.perf_counter()
+        is_new = dedup.filter_new_messages(db, messages)
+        new_messages = [m for m, new in zip(messages, is_new) if new]
+        users = task_manager.resolve_users(db, {m["whatsapp_id"] for m in new_messages})
+        metrics.observe_stage("lookup", started)
+        for parsed_message, new in zip(messages, is_new):
+            if not new:
+                logger.info("Dropping redelivered message", extra={"message_id": parsed_message["message_id"], "whatsapp_id": parsed_message["whatsapp_id"]})
+                results.append({"status": "duplicate_ignored", "message_id": parsed_message["message_id"]})
+                continue
+            result, reply_text = handle_message(db, users, parsed_message)
+            results.append(result)
+            # Replies over the WhatsApp body limit go out as several messages
+            for chunk in renderer.split_message(reply_text, WHATSAPP_MAX_TEXT_LENGTH):
+                outgoing.append((parsed_message["whatsapp_id"], chunk))
+        outbox.enqueue(db, outgoing)
+        started = time.perf_counter() # The unit of work commits as the block ends
+    metrics.observe_stage("commit", started)
+    metrics.db_queries_per_batch.observe(queries.count)
+    dedup.remember_message_ids(m.get("message_id") for m in messages)
+    return results
+
+def handle_message(db: Session, users: dict, parsed_message: dict):
+    """Runs NLP and task_manager for one message without committing. Returns (result, reply_text).
+
+    `users` maps whatsapp_id -> User or CachedUser for the current batch; users created or updated here replace
+    their entry.
+    """
+    user_whatsapp_id = parsed_message["whatsapp_id"]
+    user_phone_number = parsed_message["phone_number"]
+    message_text = parsed_message["text"]
+    logger.debug("Processing message", extra={"whatsapp_id": user_whatsapp_id, "message_id": parsed_message.get("message_id")})
+
+    started = time.perf_counter()
+    user = users.get(user_whatsapp_id)
+    if not user:
+        user = task_manager.create_user(db, user_whatsapp_id, user_phone_number, commit=False)
+        users[user_whatsapp_id] = user
+        response_text = ("Olá! Sou sua assistente de rotina pessoal. "
+                         "Posso te ajudar a organizar suas tarefas e mais. "
+                         "Você concorda em receber minhas mensagens e utilizar meus serviços? "
+                         "Responda 'Sim' para continuar ou 'Não' para cancelar.")
+        metrics.observe_stage("task_manager", started, "new_user")
+        return {"status": "new_user_prompted_for_opt_in"}, response_text
+
+    started = time.perf_counter()
+    parsed_intent = nlp_processor.parse_intent(message_text)
+    intent = parsed_intent.name
+    metrics.observe_stage("nlp", started, intent)
+    metrics.intents_total.inc(intent)
+    # Everything from here to the reply is task_manager work (queries and flushes) plus rendering
+    started = time.perf_counter()
+    response_text = "Desculpe, não entendi o que você quis dizer. Pode tentar de outra forma?"
+
+    if not user.opt_in_status:
+        if intent == "opt_in_yes":
+            users[user_whatsapp_id] = task_manager.update_user_opt_in(db, user, True, commit=False)
+            response_text = "Ótimo! Sua inscrição foi confirmada. Como posso te ajudar hoje? Digite 'ajuda' para ver os comandos."
+        elif intent == "opt_in_no":
+            users[user_whatsapp_id] = task_manager.update_user_opt_in(db, user, False, commit=False)
+            response_text = "Entendido. Se mudar de ideia, é só me chamar e dizer 'Sim'."
+        else:
+            response_text = ("Por favor, responda 'Sim' para confirmar o uso do serviço ou 'Não' para cancelar.")
+        metrics.observe_stage("task_manager", started, intent)
+        return {"status": "opt_in_processed"}, response_text
+
+    # Writes from earlier messages of this batch are still pending; make them visible to list reads and to the
+    # bulk task statements. The reminder block below deliberately skips this so consecutive additions are
+    # inserted together.
+    if intent in ("list_tasks", "list_reminders", "more", "complete_task", "delete_task", "reschedule_task"):
+        db.flush()
+
+    # Cached per user and day; task_manager drops the entry whenever this user's tasks change
+    simulated_reminder_text = get_reminder_block(db, user)
+    shows_reminders = intent == "list_reminders"
+ 
+    if intent == "add_task":
+        description = parsed_intent.description
+        due_date = parsed_intent.due_date
+        task = task_manager.create_task(db, user, description, due_date=due_date, commit=False)
+        response_text = f"Tarefa '{description}' adicionada! para {due_date.strftime('%d/%m/%Y %H:%M')}."
+
+    elif intent == "clarify_add_task":
+        response_text = "Para adicionar uma tarefa, me diga a descrição. Ex: Lembrar de comprar pão amanhã às 8h"
+
+    elif intent == "list_tasks" or intent == "list_reminders":
+        # A new listing starts from the first page
+        response_text = render_list_page(db, user_whatsapp_id, user, ListCursor(intent, parsed_intent.date_filter, None))
+
+    elif intent == "more":
+        cursor = current_list_cursor(db, user_whatsapp_id)
+        if cursor:
+            shows_reminders = cursor.intent == "list_reminders"
+            response_text = render_list_page(db, user_whatsapp_id, user, cursor)
+        else:
+            response_text = "Não há mais nada para mostrar. Tente 'minhas tarefas' ou 'meus lembretes'."
+
+    elif intent == "complete_task":
+        # One owner-scoped UPDATE for every id in the message ("concluir tarefas 3, 4 e 7")
+        rows = task_manager.update_task_statuses(db, parsed_intent.task_ids, user, "completed", commit=False)
+        response_text = renderer.render_bulk_result(parsed_intent.task_ids, [row.id for row in rows],
+                                                    "marcada como concluída", "marcadas como concluídas")
+
+    elif intent == "delete_task":
+        rows = task_manager.delete_tasks(db, parsed_intent.task_ids, user, commit=False)
+        response_text = renderer.render_bulk_result(parsed_intent.task_ids, [row.id for row in rows],
+                                                    "apagada", "apagadas")
+
+    elif intent == "reschedule_task":
+        due_date = parsed_intent.due_date
+        rows = task_manager.reschedule_tasks(db, parsed_intent.task_ids, user, due_date, commit=False)
+        when = due_date.strftime('%d/%m/%Y %H:%M')
+        response_text = renderer.render_bulk_result(parsed_intent.task_ids, [row.id for row in rows],
+                                                    f"remarcada para {when}", f"remarcadas para {when}")
+            
+    elif intent == "too_many_task_ids":
+        response_text = (f"Posso alterar no máximo {nlp_processor.MAX_TASK_IDS} tarefas por mensagem. "
+                         "Divida o pedido, ex.: 'Concluir tarefas 1 a 50' e depois 'Concluir tarefas 51 a 100'.")
+
+    elif intent == "help":
+        response_text = ("Comandos disponíveis (MVP):\n"
+                         "- Adicionar tarefa: 'Lembrar de [descrição] para [data] às [hora]'\n"
+                         "- Listar tarefas: 'Minhas tarefas de hoje'\n"
+                         "- Listar lembretes: 'Meus lembretes de hoje' ou 'Lembretes para amanhã'\n"
+                         "- Concluir tarefa: 'Concluir tarefa [número da tarefa]' ou 'Concluir tarefas 3, 4 e 7'\n"
+                         "- Apagar tarefas: 'Apagar tarefas 3 a 5'\n"
+                         "- Remarcar tarefas: 'Adiar tarefas 3, 4 para amanhã às 10h'\n"
+                         "- Ajuda: 'ajuda'")
+
+    elif intent == "unknown":
+        response_text = "Não entendi. Tente 'ajuda' para ver o que posso fazer."
+    
+    if simulated_reminder_text and not shows_reminders:
+        final_response_text = response_text + simulated_reminder_text
+    else:
+        final_response_text = response_text
+
+    metrics.observe_stage("task_manager", started, intent)
+    return {"status": "processed", "intent": intent, "response_sent": final_response_text}, final_response_text
+
+def render_list_page(db: Session, whatsapp_id: str, user, cursor: ListCursor):
+    """Renders the page of tasks/reminders after cursor.after and remembers where the next one starts."""
+    if cursor.intent == "list_tasks":
+        # list_tasks shows every pending task whatever the date filter
+        tasks, next_after = task_manager.get_task_page(db, user, status="pending", after=cursor.after, limit=TASK_LIST_PAGE_SIZE)
+        header = f"Suas tarefas pendentes ({cursor.date_filter}):\n"
+        empty_text = f"Você não tem tarefas pendentes ({cursor.date_filter})."
+    else:
+        due_from, due_before = task_manager.reminder_day_bounds(cursor.date_filter)
+        tasks, next_after = task_manager.get_task_page(db, user, status="pending", due_from=due_from, due_before=due_before,
+                                                       after=cursor.after, limit=TASK_LIST_PAGE_SIZE)
+        header = f"Seus lembretes para {cursor.date_filter}:\n"
+        empty_text = f"Você não tem lembretes agendados para {cursor.date_filter}."
+
+    stage_list_cursor(db, whatsapp_id, cursor._replace(after=next_after) if next_after is not None else None)
+    if not tasks:
+        return empty_text
+    return renderer.render_task_page(header, tasks, has_more=next_after is not None)
+
+# A page only reaches the user if the transaction that queued it in the outbox commits, so the cursor moves
+# past it in list_cursors from after_commit; a rolled back batch leaves the old cursor and "mais" repeats the
+# page. Until then the new cursor lives on the session, where later messages of the same batch see it.
+
+def stage_list_cursor(db: Session, whatsapp_id: str, cursor):
+    """Sets (or, with None, drops) the user's list cursor once `db` commits."""
+    db.info.setdefault("list_cursors_pending", {})[whatsapp_id] = cursor
+
+def current_list_cursor(db: Session, whatsapp_id: str):
+    pending = db.info.get("list_cursors_pending", {})
+    if whatsapp_id in pending:
+        return pending[whatsapp_id]
+    return list_cursors.get(whatsapp_id)
+
+@event.listens_for(Session, "after_commit")
+def _store_list_cursors(session):
+    for whatsapp_id, cursor in session.info.pop("list_cursors_pending", {}).items():
+        if cursor is not None:
+            list_cursors.put(whatsapp_id, cursor)
+        else:
+            list_cursors.pop(whatsapp_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_list_cursors(session):
+    session.info.pop("list_cursors_pending", None)
@@ -0,0 +1,38 @@
+# ia_whatsapp_assistant/app/core/reminder_cache.py
+
+from datetime import date
+
+from app.core import task_manager, renderer
+from app.core.lru import LRUCache
+from config.settings import REMINDER_BLOCK_CACHE_SIZE, REMINDER_BLOCK_CACHE_TTL_SECONDS
+
+class ReminderBlockCache(LRUCache):
+    """Bounded LRU of the rendered "Lembrete Rápido" block keyed on (owner id, day).
+
+    An entry for another day is a miss, so the block is rebuilt when the day rolls over. task_manager drops a
+    user's entry whenever their tasks change in this process; the TTL bounds staleness across processes.
+    """
+
+    def get(self, owner_id: int, day: date):
+        """The cached block ("" when nothing is due), or None on a miss."""
+        entry = super().get(owner_id, is_valid=lambda entry: entry[0] == day)
+        return entry[1] if entry is not None else None
+
+    def put(self, owner_id: int, day: date, text: str):
+        super().put(owner_id, (day, text))
+
+    def invalidate(self, owner_id: int):
+        self.pop(owner_id)
+
+# Cross-request cache shared by this process
+reminder_block_cache = ReminderBlockCache(REMINDER_BLOCK_CACHE_SIZE, REMINDER_BLOCK_CACHE_TTL_SECONDS)
+task_manager.register_owner_invalidator(reminder_block_cache.invalidate)
+
+def get_reminder_block(db, user):
+    """The reminder block for `user` (User or CachedUser), querying the day's tasks only on a cache miss."""
+    today = date.today()
+    text = reminder_block_cache.get(user.id, today)
+    if text is None:
+        text = renderer.render_reminder_block(task_manager.get_pending_reminders_for_today(db, user))
+        reminder_block_cache.put(user.id, today, text)
+    return text
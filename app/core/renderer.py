@@ -0,0 +1,94 @@
+# ia_whatsapp_assistant/app/core/renderer.py
+
+from collections import namedtuple
+
+from app.core.lru import LRUCache
+from config.settings import LIST_CURSOR_CACHE_SIZE, LIST_CURSOR_TTL_SECONDS
+
+# Replies are built as lists of parts and joined once; task lists are rendered one page at a time and any
+# reply longer than the WhatsApp body limit is split into several messages on line boundaries.
+
+MORE_HINT = "\nResponda 'mais' para ver as próximas."
+
+def render_task_lines(parts: list, tasks, date_format: str = "%d/%m/%Y %H:%M", with_ids: bool = True):
+    """Appends one line per task ("id. description (Prazo: ...)") to `parts`."""
+    for task in tasks:
+        if with_ids:
+            parts.append(f"{task.id}. {task.description}")
+        else:
+            parts.append(f"- {task.description}")
+        if task.due_date:
+            parts.append(f" (Prazo: {task.due_date.strftime(date_format)})\n")
+        else:
+            parts.append("\n")
+    return parts
+
+def render_task_page(header: str, tasks, has_more: bool):
+    parts = render_task_lines([header], tasks)
+    if has_more:
+        parts.append(MORE_HINT)
+    return "".join(parts)
+
+def render_reminder_block(tasks):
+    """The "Lembrete Rápido" block appended to replies; empty when there is nothing due today."""
+    if not tasks:
+        return ""
+    parts = ["\n\nLembrete Rápido! Você tem as seguintes tarefas para hoje:\n"]
+    return "".join(render_task_lines(parts, tasks, date_format="%H:%M", with_ids=False))
+
+def render_daily_digest(tasks):
+    """The morning summary: the day's pending tasks, with ids so they can be completed by number."""
+    parts = ["Bom dia! Suas tarefas para hoje:\n"]
+    render_task_lines(parts, tasks, date_format="%H:%M")
+    parts.append("\nResponda 'concluir tarefas' com os números quando terminar.")
+    return "".join(parts)
+
+def render_id_list(ids):
+    """"3", "3 e 4", "3, 4 e 7"."""
+    ids = [str(task_id) for task_id in ids]
+    return ids[0] if len(ids) == 1 else ", ".join(ids[:-1]) + " e " + ids[-1]
+
+def render_bulk_result(task_ids, done_ids, singular: str, plural: str):
+    """Reply to a command on one or more tasks: the ids it applied to ("Tarefas 3 e 4 {plural}!") and the ones
+    that were not found, both in the order the user gave them."""
+    done_ids = set(done_ids)
+    done = [task_id for task_id in task_ids if task_id in done_ids]
+    missing = [task_id for task_id in task_ids if task_id not in done_ids]
+    parts = []
+    if len(done) == 1:
+        parts.append(f"Tarefa {done[0]} {singular}!")
+    elif done:
+        parts.append(f"Tarefas {render_id_list(done)} {plural}!")
+    if len(missing) == 1:
+        parts.append(f"Não encontrei a tarefa {missing[0]} ou ela não é sua.")
+    elif missing:
+        parts.append(f"Não encontrei as tarefas {render_id_list(missing)} ou elas não são suas.")
+    return " ".join(parts)
+
+def split_message(text: str, max_length: int):
+    """Splits text into chunks of at most max_length characters, preferring line breaks."""
+    if len(text) <= max_length:
+        return [text]
+    chunks = []
+    start = 0
+    while len(text) - start > max_length:
+        end = text.rfind("\n", start, start + max_length)
+        if end <= start:
+            end = start + max_length # A single line longer than the limit is cut where it must be
+        else:
+            end += 1 # Keep the line break with the chunk it ends
+        chunks.append(text[start:end])
+        start = end
+    if start < len(text):
+        chunks.append(text[start:])
+    return chunks
+
+# Where a user stopped in a paginated list, so "mais" continues from there. `after` is the (due_date, id)
+# keyset of the last row shown.
+ListCursor = namedtuple("ListCursor", ["intent", "date_filter", "after"])
+
+class ListCursorStore(LRUCache):
+    """Bounded LRU of ListCursor keyed on whatsapp_id; entries expire after ttl_seconds."""
+
+# Shared by this process; the sharded dispatcher keeps each user's messages on one worker
+list_cursors = ListCursorStore(LIST_CURSOR_CACHE_SIZE, LIST_CURSOR_TTL_SECONDS)
@@ -0,0 +1,231 @@
+# ia_whatsapp_assistant/app/core/scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from app.core import task_manager, outbox
+from app.db.database import run_in_session
+from app.models import models
+
+logger = logging.getLogger(__name__)
+
+_READY = -1
+_OVERFLOW = -2
+
+class TimingWheel:
+    """Hashed timing wheel with an overflow heap for timers beyond its horizon.
+
+    Timers due within `slots * tick_seconds` live in a slot (O(1) schedule and cancel); later ones wait in a
+    heap and move into the wheel as it turns. Keys are unique: scheduling a key again moves its timer.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 3600, now: float = None):
+        self.tick_seconds = tick_seconds
+        self._slots = [{} for _ in range(slots)]
+        self._current_tick = self._tick_of(time.time() if now is None else now)
+        self._where = {} # key -> slot index, _READY or _OVERFLOW
+        self._ready = {} # key -> (due_ts, value) already due when scheduled
+        self._overflow = [] # heap of (due_ts, seq, key); stale entries are skipped lazily
+        self._overflow_entries = {} # key -> (due_ts, value)
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def _tick_of(self, timestamp: float):
+        return int(timestamp // self.tick_seconds)
+
+    def schedule(self, key, due_ts: float, value=None):
+        self.cancel(key)
+        tick = self._tick_of(due_ts)
+        if tick <= self._current_tick:
+            self._ready[key] = (due_ts, value)
+            self._where[key] = _READY
+        elif tick - self._current_tick < len(self._slots):
+            index = tick % len(self._slots)
+            self._slots[index][key] = (due_ts, value)
+            self._where[key] = index
+        else:
+            self._overflow_entries[key] = (due_ts, value)
+            heapq.heappush(self._overflow, (due_ts, next(self._sequence), key))
+            self._where[key] = _OVERFLOW
+
+    def cancel(self, key):
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        if where == _READY:
+            del self._ready[key]
+        elif where == _OVERFLOW:
+            del self._overflow_entries[key]
+        else:
+            del self._slots[where][key]
+        return True
+
+    def advance(self, now: float):
+        """Turns the wheel up to `now`. Returns [(key, due_ts, value)] for the timers that came due, by due time."""
+        fired = [(key, due_ts, value) for key, (due_ts, value) in self._ready.items()]
+        for key in self._ready:
+            del self._where[key]
+        self._ready = {}
+
+        target_tick = self._tick_of(now)
+        slot_count = len(self._slots)
+        # After a full turn every slot has been visited, so a long pause costs at most one turn
+        for step in range(1, min(target_tick - self._current_tick, slot_count) + 1):
+            index = (self._current_tick + step) % slot_count
+            slot = self._slots[index]
+            if slot:
+                for key, (due_ts, value) in slot.items():
+                    fired.append((key, due_ts, value))
+                    del self._where[key]
+                self._slots[index] = {}
+        self._current_tick = max(self._current_tick, target_tick)
+
+        while self._overflow and self._tick_of(self._overflow[0][0]) - self._current_tick < slot_count:
+            due_ts, _, key = heapq.heappop(self._overflow)
+            entry = self._overflow_entries.get(key)
+            if entry is None or entry[0] != due_ts:
+                continue # Cancelled or rescheduled
+            del self._overflow_entries[key]
+            del self._where[key]
+            if self._tick_of(due_ts) <= self._current_tick:
+                fired.append((key, due_ts, entry[1]))
+            else:
+                self.schedule(key, due_ts, entry[1])
+
+        fired.sort(key=lambda item: item[1])
+        return fired
+
+class ReminderScheduler:
+    """Pushes a reminder through the gateway when a pending task's due_date arrives.
+
+    Only tasks due within `horizon_seconds` are held in memory. A periodic indexed range query on
+    (status, due_date) slides that window forward and picks up changes made by other processes; changes made
+    through this process's task_manager are applied immediately via a task listener. Each reminder is claimed
+    with a conditional UPDATE of tasks.reminded_at, so concurrent schedulers never send it twice, and its text
+    is written to the outbox in that same transaction.
+    `session_factory` may produce Session or AsyncSession objects.
+    """
+
+    def __init__(self, session_factory, tick_seconds: float = 1.0, horizon_seconds: float = 900,
+                 refresh_seconds: float = 60, grace_seconds: float = 300, clock=time.time):
+        self.session_factory = session_factory
+        self.tick_seconds = tick_seconds
+        self.horizon_seconds = horizon_seconds
+        self.refresh_seconds = refresh_seconds
+        self.grace_seconds = grace_seconds
+        self._clock = clock
+        self.wheel = TimingWheel(tick_seconds, slots=int(horizon_seconds / tick_seconds) + 1, now=clock())
+        self._loaded_until = 0.0
+        self._next_refresh = 0.0
+        self._task = None
+        self.reminders_sent = 0
+
+    def on_task_changes(self, changes):
+        """task_manager listener: keeps the wheel in step with committed task changes."""
+        window_start = self._clock() - self.grace_seconds
+        for change in changes:
+            if change.event != "deleted" and change.status == "pending" and change.due_date is not None:
+                due_ts = change.due_date.timestamp()
+                # Same window as refresh(): a task created or moved into the past is not reminded
+                if window_start <= due_ts <= self._loaded_until:
+                    self.wheel.schedule(change.task_id, due_ts)
+                    continue
+            self.wheel.cancel(change.task_id)
+
+    def refresh(self, db):
+        """Loads pending, not yet reminded tasks due inside the window (one indexed range query)."""
+        now = self._clock()
+        window_start = datetime.fromtimestamp(now - self.grace_seconds)
+        window_end = datetime.fromtimestamp(now + self.horizon_seconds)
+        rows = db.execute(
+            select(models.Task.id, models.Task.due_date).where(
+                models.Task.status == "pending",
+                models.Task.reminded_at == None,
+                models.Task.due_date >= window_start,
+                models.Task.due_date < window_end,
+            )
+        ).all()
+        for task_id, due_date in rows:
+            self.wheel.schedule(task_id, due_date.timestamp())
+        self._loaded_until = window_end.timestamp()
+        return len(rows)
+
+    def claim_due_reminders(self, db, task_ids: list):
+        """Marks tasks as reminded and queues the reminders of opted-in owners in the outbox, in one transaction.
+
+        Returns (whatsapp_id, description, due_date) for the reminders queued.
+        """
+        claim = (
+            update(models.Task)
+            .where(models.Task.id.in_(task_ids), models.Task.status == "pending", models.Task.reminded_at == None)
+            .values(reminded_at=datetime.now())
+        )
+        if db.get_bind().dialect.update_returning:
+            claimed_ids = list(db.execute(claim.returning(models.Task.id)).scalars())
+        else:
+            claimed_ids = list(db.scalars(select(models.Task.id).where(
+                models.Task.id.in_(task_ids), models.Task.status == "pending", models.Task.reminded_at == None
+            )))
+            db.execute(claim.where(models.Task.id.in_(claimed_ids)))
+        if not claimed_ids:
+            db.commit()
+            return []
+        reminders = db.execute(
+            select(models.User.whatsapp_id, models.Task.description, models.Task.due_date)
+            .join(models.User, models.Task.owner_id == models.User.id)
+            .where(models.Task.id.in_(claimed_ids), models.User.opt_in_status == True)
+            .order_by(models.Task.due_date)
+        ).all()
+        outbox.enqueue(db, [(whatsapp_id, f"Lembrete! Está na hora de: {description} (Prazo: {due_date.strftime('%H:%M')})")
+                            for whatsapp_id, description, due_date in reminders])
+        db.commit()
+        return reminders
+
+    async def run_once(self):
+        """One tick: refreshes the window when due, then sends the reminders that came due."""
+        now = self._clock()
+        if now >= self._next_refresh:
+            self._next_refresh = now + self.refresh_seconds
+            await run_in_session(self.session_factory, self.refresh)
+        fired = self.wheel.advance(now)
+        if not fired:
+            return 0
+        reminders = await run_in_session(self.session_factory, self.claim_due_reminders, [task_id for task_id, _, _ in fired])
+        if reminders:
+            # The outbox sender delivers the fan-out, paced within the rate limits by the outbound dispatcher
+            await outbox.dispatch_pending(self.session_factory)
+        self.reminders_sent += len(reminders)
+        return len(reminders)
+
+    def start(self):
+        task_manager.register_task_listener(self.on_task_changes)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task_manager.unregister_task_listener(self.on_task_changes)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        return {"scheduled": len(self.wheel), "reminders_sent": self.reminders_sent}
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Reminder scheduler tick failed")
+            await asyncio.sleep(self.tick_seconds)
@@ -1,44 +1,240 @@
 # ia_whatsapp_assistant/app/core/task_manager.py
 
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, cast, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, cast, Date, event, select, update, delete
 from app.models import models
 from app.db.database import SessionLocal, engine # Import engine as well
+from app.core.user_cache import user_cache
 from datetime import datetime, timedelta, date
 
+logger = logging.getLogger(__name__)
+
 # Ensure tables are created (idempotent call)
 # models.Base.metadata.create_all(bind=engine) # This should be handled by app startup or migrations, not here.
 
+# --- Task change notifications --- #
+
+# Listeners (e.g. the reminder scheduler) receive a list of TaskChange once the transaction that made the
+# changes commits; rolled back work is never reported. Values are snapshotted at flush time, because no SQL
+# may be emitted from inside after_commit.
+TaskChange = namedtuple("TaskChange", ["event", "task_id", "owner_id", "status", "due_date"])
+_task_listeners = []
+
+def register_task_listener(listener):
+    if listener not in _task_listeners:
+        _task_listeners.append(listener)
+
+def unregister_task_listener(listener):
+    if listener in _task_listeners:
+        _task_listeners.remove(listener)
+
+# Caches derived from one user's tasks (e.g. the reminder block) register a callback taking an owner id. It
+# runs as soon as a task of that owner changes in a session, and again when the transaction commits or rolls
+# back, so nothing computed from the old rows or from uncommitted ones outlives the transaction.
+_owner_invalidators = []
+
+def register_owner_invalidator(callback):
+    if callback not in _owner_invalidators:
+        _owner_invalidators.append(callback)
+
+def unregister_owner_invalidator(callback):
+    if callback in _owner_invalidators:
+        _owner_invalidators.remove(callback)
+
+def _invalidate_owners(db: Session, owner_ids):
+    owner_ids = set(owner_ids)
+    db.info.setdefault("task_owners_changed", set()).update(owner_ids)
+    _run_owner_invalidators(owner_ids)
+
+def _run_owner_invalidators(owner_ids):
+    for owner_id in owner_ids:
+        for callback in list(_owner_invalidators):
+            callback(owner_id)
+
+def _record_task_change(db: Session, change_event: str, db_task):
+    if _task_listeners or _owner_invalidators:
+        db.info.setdefault("task_changes_pending", []).append((change_event, db_task))
+        _invalidate_owners(db, [db_task.owner_id])
+
+def _record_executed_task_changes(db: Session, change_event: str, rows):
+    """Bulk UPDATE/DELETE statements run immediately, so their RETURNING rows are already the flushed values."""
+    if (_task_listeners or _owner_invalidators) and rows:
+        db.info.setdefault("task_changes_flushed", []).extend(
+            TaskChange(change_event, row.id, row.owner_id, row.status, row.due_date) for row in rows
+        )
+        _invalidate_owners(db, (row.owner_id for row in rows))
+
+@event.listens_for(Session, "after_flush")
+def _snapshot_task_changes(session, flush_context):
+    pending = session.info.pop("task_changes_pending", None)
+    if pending:
+        flushed = session.info.setdefault("task_changes_flushed", [])
+        for change_event, db_task in pending:
+            flushed.append(TaskChange(change_event, db_task.id, db_task.owner_id, db_task.status, db_task.due_date))
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_task_changes(session):
+    session.info.pop("task_changes_pending", None) # Recorded but never flushed: nothing actually changed
+    _run_owner_invalidators(session.info.pop("task_owners_changed", ()))
+    changes = session.info.pop("task_changes_flushed", None)
+    if not changes:
+        return
+    for listener in list(_task_listeners):
+        try:
+            listener(changes)
+        except Exception:
+            logger.exception("Task change listener %r failed", listener)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_task_changes(session):
+    session.info.pop("task_changes_pending", None)
+    session.info.pop("task_changes_flushed", None)
+    _run_owner_invalidators(session.info.pop("task_owners_changed", ()))
+
+# --- Unit of work --- #
+
+# A webhook (or any other request) runs every task_manager call in one transaction: inside unit_of_work(db),
+# commit=True only flushes, and the block commits once when it ends or rolls back if it raises. Nested blocks
+# join the outermost one. Objects are not refreshed after a commit: the session keeps their values
+# (expire_on_commit=False), and ids and server defaults already came back in the INSERT's RETURNING where
+# the backend supports it.
+
+@contextmanager
+def unit_of_work(db: Session):
+    depth = db.info.get("unit_of_work_depth", 0)
+    db.info["unit_of_work_depth"] = depth + 1
+    try:
+        yield db
+        if depth == 0:
+            db.commit()
+    except BaseException:
+        if depth == 0:
+            db.rollback()
+        raise
+    finally:
+        db.info["unit_of_work_depth"] = depth
+
+def _commit(db: Session):
+    """What commit=True means for the functions below: commit now, or flush if a unit of work is open."""
+    if db.info.get("unit_of_work_depth"):
+        db.flush()
+    else:
+        db.commit()
+
 # --- User Management --- #
 
+# Functions below take `user` as a models.User or CachedUser already resolved by the caller, a user id,
+# or a whatsapp id (looked up through the caches below).
+# Passing commit=False leaves the transaction open so a caller can batch several changes into one commit.
+
+def _identity_map(db: Session):
+    """Request-scoped map whatsapp_id -> User, stored on the session so it lives exactly as long as the request."""
+    return db.info.setdefault("users_by_whatsapp_id", {})
+
 def get_user_by_whatsapp_id(db: Session, whatsapp_id: str):
-    return db.query(models.User).filter(models.User.whatsapp_id == whatsapp_id).first()
+    identity_map = _identity_map(db)
+    db_user = identity_map.get(whatsapp_id)
+    if db_user is None:
+        db_user = db.query(models.User).filter(models.User.whatsapp_id == whatsapp_id).first()
+        if db_user is not None:
+            identity_map[whatsapp_id] = db_user
+            user_cache.put(db_user)
+    return db_user
+
+def get_users_by_whatsapp_ids(db: Session, whatsapp_ids):
+    """Loads several users in one query. Returns {whatsapp_id: User} for the ones that exist."""
+    if not whatsapp_ids:
+        return {}
+    identity_map = _identity_map(db)
+    users = db.query(models.User).filter(models.User.whatsapp_id.in_(list(whatsapp_ids))).all()
+    for db_user in users:
+        identity_map[db_user.whatsapp_id] = db_user
+        user_cache.put(db_user)
+    return {db_user.whatsapp_id: db_user for db_user in users}
+
+def resolve_user(db: Session, whatsapp_id: str):
+    """Returns a User or CachedUser (both expose id and opt_in_status), hitting the database only on a cache miss."""
+    db_user = _identity_map(db).get(whatsapp_id)
+    if db_user is not None:
+        return db_user
+    return user_cache.get(whatsapp_id) or get_user_by_whatsapp_id(db, whatsapp_id)
+
+def resolve_users(db: Session, whatsapp_ids):
+    """Batch form of resolve_user: one IN query for all cache misses. Returns {whatsapp_id: User or CachedUser}."""
+    identity_map = _identity_map(db)
+    resolved = {}
+    missing = []
+    for whatsapp_id in whatsapp_ids:
+        user = identity_map.get(whatsapp_id) or user_cache.get(whatsapp_id)
+        if user is not None:
+            resolved[whatsapp_id] = user
+        else:
+            missing.append(whatsapp_id)
+    resolved.update(get_users_by_whatsapp_ids(db, missing))
+    return resolved
 
-def create_user(db: Session, whatsapp_id: str, phone_number: str):
+def _resolve_user(db: Session, user):
+    """Returns the session-bound User for any accepted form of `user` (needed to modify it)."""
+    if isinstance(user, models.User):
+        return user
+    if isinstance(user, str):
+        return get_user_by_whatsapp_id(db, user)
+    user_id = user if isinstance(user, int) else user.id
+    return db.get(models.User, user_id)
+
+def _resolve_owner_id(db: Session, user):
+    if isinstance(user, int):
+        return user
+    if isinstance(user, str):
+        user = resolve_user(db, user)
+    return user.id if user is not None else None
+
+def create_user(db: Session, whatsapp_id: str, phone_number: str, commit: bool = True):
     db_user = models.User(whatsapp_id=whatsapp_id, phone_number=phone_number, opt_in_status=False)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    if commit:
+        _commit(db)
+    else:
+        db.flush() # Assigns db_user.id for tasks created later in the same transaction
+    _identity_map(db)[whatsapp_id] = db_user
     return db_user
 
-def update_user_opt_in(db: Session, whatsapp_id: str, opt_in_status: bool):
-    db_user = get_user_by_whatsapp_id(db, whatsapp_id)
+def update_user_opt_in(db: Session, user, opt_in_status: bool, commit: bool = True):
+    db_user = _resolve_user(db, user)
     if db_user:
         db_user.opt_in_status = opt_in_status
         db_user.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(db_user)
+        user_cache.invalidate(db_user.whatsapp_id)
+        if commit:
+            _commit(db)
     return db_user
 
 # --- Task Management (including Reminders) --- #
 
-def create_task(db: Session, user_whatsapp_id: str, description: str, due_date_str: str = None, priority: str = None):
-    db_user = get_user_by_whatsapp_id(db, user_whatsapp_id)
-    if not db_user:
-        return None 
+# Completed and cancelled tasks eventually move to tasks_archive (app.core.archive). Reads of those statuses
+# query both tables and merge the results, so callers see one history; pending reads only touch `tasks`.
+ARCHIVED_STATUSES = ("completed", "cancelled")
+
+def _task_models(status: str):
+    return (models.Task, models.TaskArchive) if status in ARCHIVED_STATUSES else (models.Task,)
+
+def _due_date_order(task):
+    """Sort key matching ORDER BY due_date NULLS FIRST, id."""
+    return (task.due_date is not None, task.due_date, task.id)
+
+def create_task(db: Session, user, description: str, due_date_str: str = None, priority: str = None, commit: bool = True,
+                due_date: datetime = None):
+    """Creates a pending task. Pass `due_date` as a datetime (hot path) or `due_date_str` as "%Y-%m-%d %H:%M:%S"."""
+    owner_id = _resolve_owner_id(db, user)
+    if owner_id is None:
+        return None
     
-    parsed_due_date = None
-    if due_date_str:
+    parsed_due_date = due_date
+    if parsed_due_date is None and due_date_str:
         try:
             # Ensure due_date_str is correctly parsed if provided
             parsed_due_date = datetime.strptime(due_date_str, "%Y-%m-%d %H:%M:%S") 
@@ -50,25 +246,29 @@ def create_task(db: Session, user_whatsapp_id: str, description: str, due_date_s
         description=description, 
         due_date=parsed_due_date, 
         priority=priority, 
-        owner_id=db_user.id,
+        owner_id=owner_id,
         status="pending"
     )
     db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    _record_task_change(db, "created", db_task)
+    if commit:
+        _commit(db)
     return db_task
 
-def get_tasks_by_user(db: Session, user_whatsapp_id: str, status: str = "pending"):
-    db_user = get_user_by_whatsapp_id(db, user_whatsapp_id)
-    if not db_user:
-        return []
-    return db.query(models.Task).filter(models.Task.owner_id == db_user.id, models.Task.status == status).order_by(models.Task.due_date.asc()).all()
-
-def get_reminders_for_user_by_date_filter(db: Session, user_whatsapp_id: str, date_filter: str = "hoje"):
-    db_user = get_user_by_whatsapp_id(db, user_whatsapp_id)
-    if not db_user:
+def get_tasks_by_user(db: Session, user, status: str = "pending"):
+    owner_id = _resolve_owner_id(db, user)
+    if owner_id is None:
         return []
+    sources = _task_models(status)
+    tasks = []
+    for Model in sources:
+        tasks.extend(db.query(Model).filter(Model.owner_id == owner_id, Model.status == status).order_by(Model.due_date.asc()).all())
+    if len(sources) > 1:
+        tasks.sort(key=_due_date_order)
+    return tasks
 
+def reminder_day_bounds(date_filter: str = "hoje"):
+    """[start, end) datetimes of the day a reminder date filter refers to."""
     # Determine the target date based on the filter
     target_query_date = date.today()
     if date_filter == "amanhã":
@@ -78,18 +278,59 @@ def get_reminders_for_user_by_date_filter(db: Session, user_whatsapp_id: str, da
     # Define the start and end of the target day for datetime comparison
     day_start_dt = datetime.combine(target_query_date, datetime.min.time())
     next_day_start_dt = datetime.combine(target_query_date + timedelta(days=1), datetime.min.time())
+    return day_start_dt, next_day_start_dt
+
+def get_reminders_for_user_by_date_filter(db: Session, user, date_filter: str = "hoje"):
+    owner_id = _resolve_owner_id(db, user)
+    if owner_id is None:
+        return []
 
+    day_start_dt, next_day_start_dt = reminder_day_bounds(date_filter)
     return db.query(models.Task).filter(
-        models.Task.owner_id == db_user.id,
+        models.Task.owner_id == owner_id,
         models.Task.status == "pending",
         models.Task.due_date != None,  # Ensure there is a due date
         models.Task.due_date >= day_start_dt, # Due date is on or after the start of the target day
         models.Task.due_date < next_day_start_dt  # Due date is before the start of the next day
     ).order_by(models.Task.due_date.asc()).all()
 
-def get_pending_reminders_for_today(db: Session, user_whatsapp_id: str):
-    db_user = get_user_by_whatsapp_id(db, user_whatsapp_id)
-    if not db_user:
+def get_task_page(db: Session, user, status: str = "pending", due_from: datetime = None, due_before: datetime = None,
+                  after: tuple = None, limit: int = 20):
+    """One page of a user's tasks ordered by (due_date, id), tasks without a due date first.
+
+    Keyset pagination: `after` is the (due_date, id) of the last row already shown. Reads at most limit + 1
+    rows. Returns (tasks, next_after), where next_after is None on the last page.
+    """
+    owner_id = _resolve_owner_id(db, user)
+    if owner_id is None:
+        return [], None
+
+    sources = _task_models(status)
+    tasks = []
+    for Task in sources:
+        query = db.query(Task).filter(Task.owner_id == owner_id, Task.status == status)
+        if due_from is not None:
+            query = query.filter(Task.due_date >= due_from)
+        if due_before is not None:
+            query = query.filter(Task.due_date < due_before)
+        if after is not None:
+            after_due_date, after_id = after
+            if after_due_date is None:
+                query = query.filter(or_(and_(Task.due_date == None, Task.id > after_id), Task.due_date != None))
+            else:
+                query = query.filter(or_(Task.due_date > after_due_date, and_(Task.due_date == after_due_date, Task.id > after_id)))
+        tasks.extend(query.order_by(Task.due_date.asc().nulls_first(), Task.id.asc()).limit(limit + 1).all())
+    if len(sources) > 1:
+        # Each table gave its first limit + 1 rows past the keyset, so the merged first limit + 1 are exact
+        tasks = sorted(tasks, key=_due_date_order)[:limit + 1]
+    if len(tasks) <= limit:
+        return tasks, None
+    tasks = tasks[:limit]
+    return tasks, (tasks[-1].due_date, tasks[-1].id)
+
+def get_pending_reminders_for_today(db: Session, user):
+    owner_id = _resolve_owner_id(db, user)
+    if owner_id is None:
         return []
     
     today_query_date = date.today()
@@ -97,7 +338,7 @@ def get_pending_reminders_for_today(db: Session, user_whatsapp_id: str):
     next_day_start_dt = datetime.combine(today_query_date + timedelta(days=1), datetime.min.time())
 
     return db.query(models.Task).filter(
-        models.Task.owner_id == db_user.id,
+        models.Task.owner_id == owner_id,
         models.Task.status == "pending",
         models.Task.due_date != None,
         models.Task.due_date >= day_start_dt,
@@ -105,26 +346,153 @@ def get_pending_reminders_for_today(db: Session, user_whatsapp_id: str):
         # models.Task.due_date <= datetime.now() # Optionally, only if due time has passed or is now (for immediate reminders)
     ).order_by(models.Task.due_date.asc()).all()
 
-def get_task_by_id(db: Session, task_id: int, user_whatsapp_id: str):
-    db_user = get_user_by_whatsapp_id(db, user_whatsapp_id)
-    if not db_user:
+def get_task_by_id(db: Session, task_id: int, user):
+    owner_id = _resolve_owner_id(db, user)
+    if owner_id is None:
         return None
-    return db.query(models.Task).filter(models.Task.id == task_id, models.Task.owner_id == db_user.id).first()
+    return db.query(models.Task).filter(models.Task.id == task_id, models.Task.owner_id == owner_id).first()
 
-def update_task_status(db: Session, task_id: int, user_whatsapp_id: str, new_status: str):
-    db_task = get_task_by_id(db, task_id, user_whatsapp_id)
+def update_task_status(db: Session, task_id: int, user, new_status: str, commit: bool = True):
+    db_task = get_task_by_id(db, task_id, user)
     if db_task:
         db_task.status = new_status
         db_task.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(db_task)
+        _record_task_change(db, "updated", db_task)
+        if commit:
+            _commit(db)
     return db_task
 
-def delete_task(db: Session, task_id: int, user_whatsapp_id: str):
-    db_task = get_task_by_id(db, task_id, user_whatsapp_id)
+def delete_task(db: Session, task_id: int, user, commit: bool = True):
+    db_task = get_task_by_id(db, task_id, user)
     if db_task:
         db.delete(db_task)
-        db.commit()
+        _record_task_change(db, "deleted", db_task)
+        if commit:
+            _commit(db)
         return True
     return False
 
+# --- Bulk task operations --- #
+
+# One owner-scoped UPDATE/DELETE for any number of task ids, with RETURNING (id, owner_id, status, due_date)
+# of the rows it touched; ids that do not exist or belong to someone else are simply not returned. On
+# dialects without RETURNING the matching ids are selected first, in the same transaction.
+# Task objects already loaded in the session are kept in step (synchronize_session="auto").
+TaskRow = namedtuple("TaskRow", ["id", "owner_id", "status", "due_date"])
+
+def _bulk_returning(db: Session, statement, owner_id: int, task_ids, *conditions):
+    Task = models.Task
+    dialect = db.get_bind().dialect
+    supports_returning = dialect.delete_returning if statement.is_delete else dialect.update_returning
+    columns = (Task.id, Task.owner_id, Task.status, Task.due_date)
+    if supports_returning:
+        rows = db.execute(statement.returning(*columns)).all()
+    else:
+        rows = db.execute(select(*columns).where(Task.owner_id == owner_id, Task.id.in_(task_ids), *conditions)).all()
+        if rows:
+            db.execute(statement)
+    return sorted((TaskRow(*row) for row in rows), key=lambda row: row.id)
+
+def update_task_statuses(db: Session, task_ids, user, new_status: str, commit: bool = True):
+    """Sets the status of the user's tasks among `task_ids` in one statement. Returns the affected rows by id."""
+    owner_id = _resolve_owner_id(db, user)
+    task_ids = list(task_ids)
+    if owner_id is None or not task_ids:
+        return []
+    Task = models.Task
+    statement = (
+        update(Task).where(Task.owner_id == owner_id, Task.id.in_(task_ids))
+        .values(status=new_status, updated_at=datetime.utcnow())
+    )
+    rows = _bulk_returning(db, statement, owner_id, task_ids)
+    rows = [row._replace(status=new_status) for row in rows] # Fallback path selected them before the UPDATE
+    _record_executed_task_changes(db, "updated", rows)
+    if commit:
+        _commit(db)
+    return rows
+
+def reschedule_tasks(db: Session, task_ids, user, due_date: datetime, commit: bool = True):
+    """Moves the user's pending tasks among `task_ids` to `due_date` and re-arms their reminders (one statement)."""
+    owner_id = _resolve_owner_id(db, user)
+    task_ids = list(task_ids)
+    if owner_id is None or not task_ids:
+        return []
+    Task = models.Task
+    statement = (
+        update(Task).where(Task.owner_id == owner_id, Task.id.in_(task_ids), Task.status == "pending")
+        .values(due_date=due_date, reminded_at=None, updated_at=datetime.utcnow())
+    )
+    rows = _bulk_returning(db, statement, owner_id, task_ids, Task.status == "pending")
+    rows = [row._replace(due_date=due_date) for row in rows]
+    _record_executed_task_changes(db, "updated", rows)
+    if commit:
+        _commit(db)
+    return rows
+
+def delete_tasks(db: Session, task_ids, user, commit: bool = True):
+    """Deletes the user's tasks among `task_ids` in one statement. Returns the deleted rows by id."""
+    owner_id = _resolve_owner_id(db, user)
+    task_ids = list(task_ids)
+    if owner_id is None or not task_ids:
+        return []
+    Task = models.Task
+    statement = delete(Task).where(Task.owner_id == owner_id, Task.id.in_(task_ids))
+    rows = _bulk_returning(db, statement, owner_id, task_ids)
+    _record_executed_task_changes(db, "deleted", rows)
+    if commit:
+        _commit(db)
+    return rows
+
+# --- Async session variants --- #
+
+# Same functions for an AsyncSession: each runs the sync version above through run_sync, so the ORM code is
+# shared and its SQL is awaited on the async driver instead of blocking the event loop.
+
+async def get_user_by_whatsapp_id_async(db: AsyncSession, whatsapp_id: str):
+    return await db.run_sync(get_user_by_whatsapp_id, whatsapp_id)
+
+async def resolve_users_async(db: AsyncSession, whatsapp_ids):
+    return await db.run_sync(resolve_users, whatsapp_ids)
+
+async def create_user_async(db: AsyncSession, whatsapp_id: str, phone_number: str, commit: bool = True):
+    return await db.run_sync(create_user, whatsapp_id, phone_number, commit=commit)
+
+async def update_user_opt_in_async(db: AsyncSession, user, opt_in_status: bool, commit: bool = True):
+    return await db.run_sync(update_user_opt_in, user, opt_in_status, commit=commit)
+
+async def create_task_async(db: AsyncSession, user, description: str, due_date_str: str = None, priority: str = None,
+                            commit: bool = True, due_date: datetime = None):
+    return await db.run_sync(create_task, user, description, due_date_str=due_date_str, priority=priority, commit=commit,
+                             due_date=due_date)
+
+async def get_tasks_by_user_async(db: AsyncSession, user, status: str = "pending"):
+    return await db.run_sync(get_tasks_by_user, user, status=status)
+
+async def get_reminders_for_user_by_date_filter_async(db: AsyncSession, user, date_filter: str = "hoje"):
+    return await db.run_sync(get_reminders_for_user_by_date_filter, user, date_filter)
+
+async def get_task_page_async(db: AsyncSession, user, status: str = "pending", due_from: datetime = None,
+                              due_before: datetime = None, after: tuple = None, limit: int = 20):
+    return await db.run_sync(get_task_page, user, status=status, due_from=due_from, due_before=due_before, after=after,
+                             limit=limit)
+
+async def get_pending_reminders_for_today_async(db: AsyncSession, user):
+    return await db.run_sync(get_pending_reminders_for_today, user)
+
+async def get_task_by_id_async(db: AsyncSession, task_id: int, user):
+    return await db.run_sync(get_task_by_id, task_id, user)
+
+async def update_task_status_async(db: AsyncSession, task_id: int, user, new_status: str, commit: bool = True):
+    return await db.run_sync(update_task_status, task_id, user, new_status, commit=commit)
+
+async def delete_task_async(db: AsyncSession, task_id: int, user, commit: bool = True):
+    return await db.run_sync(delete_task, task_id, user, commit=commit)
+
+async def update_task_statuses_async(db: AsyncSession, task_ids, user, new_status: str, commit: bool = True):
+    return await db.run_sync(update_task_statuses, task_ids, user, new_status, commit=commit)
+
+async def reschedule_tasks_async(db: AsyncSession, task_ids, user, due_date: datetime, commit: bool = True):
+    return await db.run_sync(reschedule_tasks, task_ids, user, due_date, commit=commit)
+
+async def delete_tasks_async(db: AsyncSession, task_ids, user, commit: bool = True):
+    return await db.run_sync(delete_tasks, task_ids, user, commit=commit)
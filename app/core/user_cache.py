@@ -0,0 +1,22 @@
+# ia_whatsapp_assistant/app/core/user_cache.py
+
+from collections import namedtuple
+
+from app.core.lru import LRUCache
+
+from config.settings import USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
+
+# What the hot path needs to know about a user; detached from any DB session.
+CachedUser = namedtuple("CachedUser", ["id", "whatsapp_id", "opt_in_status"])
+
+class UserCache(LRUCache):
+    """Bounded LRU of CachedUser keyed on whatsapp_id, with a TTL bounding staleness across processes."""
+
+    def put(self, db_user):
+        super().put(db_user.whatsapp_id, CachedUser(db_user.id, db_user.whatsapp_id, bool(db_user.opt_in_status)))
+
+    def invalidate(self, whatsapp_id: str):
+        self.pop(whatsapp_id)
+
+# Cross-request cache shared by this process
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
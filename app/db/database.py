@@ -1,19 +1,32 @@
 # app/db/database.py
-from sqlalchemy import create_engine
+import logging
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config.settings import DATABASE_URL as DEFAULT_DATABASE_URL
+from config.settings import DATABASE_URL as DEFAULT_DATABASE_URL, DB_SESSION_MODE, STORAGE_PROFILE
+from config.settings import SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KIB
+from config.settings import (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE_SECONDS, DB_POOL_PRE_PING,
+                             DB_STATEMENT_CACHE_SIZE)
+
+logger = logging.getLogger(__name__)
 
 engine = None
 SessionLocal = None
+# Async engine over the same database as `engine`, created on first use
+async_engine = None
+AsyncSessionLocal = None
+storage_profile = "default" # Profile the engines were created with
 Base = declarative_base()
 _is_test_db_initialized = False # Flag to indicate test DB setup
 
-def initialize_database(db_url: str = None, is_test_setup: bool = False):
-    global engine, SessionLocal, _is_test_db_initialized
+def initialize_database(db_url: str = None, is_test_setup: bool = False, profile: str = None):
+    global engine, SessionLocal, async_engine, AsyncSessionLocal, storage_profile, _is_test_db_initialized
     
     if _is_test_db_initialized and not is_test_setup:
-        print(f"DEBUG DB: Test database is active ({engine.url if engine else 'N/A'}). Main DB initialization with '{db_url if db_url else DEFAULT_DATABASE_URL}' skipped.")
+        logger.debug("Test database is active (%s). Main DB initialization with '%s' skipped.", engine.url if engine else "N/A", db_url or DEFAULT_DATABASE_URL)
         return
 
     effective_db_url = None
@@ -22,11 +35,11 @@ def initialize_database(db_url: str = None, is_test_setup: bool = False):
         # For tests, db_url should be the shared memory URI with uri=true in the query string.
         # The dialect sqlite+pysqlite is also good practice.
         effective_db_url = "sqlite+pysqlite:///file:memdb1?mode=memory&cache=shared&uri=true"
-        print(f"DEBUG DB: Initializing TEST database with URI: {effective_db_url}")
+        logger.debug("Initializing TEST database with URI: %s", effective_db_url)
         _is_test_db_initialized = True
     else:
         effective_db_url = db_url if db_url else DEFAULT_DATABASE_URL
-        print(f"DEBUG DB: Initializing MAIN database with URL: {effective_db_url}")
+        logger.debug("Initializing MAIN database")
 
     if not effective_db_url:
         raise ValueError("Database URL must be provided for initialization.")
@@ -36,27 +49,139 @@ def initialize_database(db_url: str = None, is_test_setup: bool = False):
     if "sqlite" in effective_db_url:
         connect_args = {"check_same_thread": False}
         
+    # The test database is in memory: WAL and pool tuning do not apply to it
+    storage_profile = profile or ("default" if is_test_setup else STORAGE_PROFILE)
+    options = engine_options(effective_db_url, storage_profile)
+    connect_args.update(options.pop("connect_args", {}))
+
     # The uri=True parameter is not a direct argument to create_engine.
     # It's part of the connection string for SQLite URI filenames.
-    engine = create_engine(effective_db_url, connect_args=connect_args)
+    engine = create_engine(effective_db_url, connect_args=connect_args, **options)
+    apply_storage_profile(engine, storage_profile)
         
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    print(f"DEBUG DB: Engine set to {engine.url}, SessionLocal configured.")
+    # Objects keep their values across commit (as in the async sessions), so task_manager never reloads them
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    async_engine = None
+    AsyncSessionLocal = None
+    logger.info("Database engine ready", extra={"url": engine.url.render_as_string(hide_password=True), "storage_profile": storage_profile})
+
+# --- Storage profiles --- #
+
+# "default" leaves create_engine's defaults. "production" applies SQLITE_PRAGMAS on every new SQLite
+# connection (WAL lets readers run alongside the single writer; synchronous=NORMAL is durable across
+# application crashes in WAL mode), and on server databases sizes the pool explicitly and caches statements.
+STORAGE_PROFILES = ("default", "production")
+
+def sqlite_pragmas():
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}", # Negative: KiB rather than pages
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+def engine_options(db_url, profile: str):
+    """Extra create_engine / create_async_engine keyword arguments for a storage profile."""
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile '{profile}'. Expected one of {STORAGE_PROFILES}.")
+    url = make_url(db_url)
+    if profile == "default" or url.get_backend_name() == "sqlite":
+        return {} # SQLite is tuned through pragmas on connect, see apply_storage_profile
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "query_cache_size": DB_STATEMENT_CACHE_SIZE, # SQLAlchemy's compiled statement cache
+    }
+    # Server-side prepared statements, per connection
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    elif url.get_driver_name() == "psycopg":
+        options["connect_args"] = {"prepare_threshold": 5}
+    return options
+
+def apply_storage_profile(target_engine, profile: str):
+    """Installs the profile's per-connection setup (SQLite pragmas) on a sync engine."""
+    if profile != "production" or target_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(target_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in sqlite_pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
 
 def get_engine():
     if not engine:
-        print("DEBUG DB: get_engine() called before explicit initialization. Initializing with default URL.")
+        logger.debug("get_engine() called before explicit initialization. Initializing with default URL.")
         initialize_database()
     return engine
 
 def get_session_local():
     if not SessionLocal:
-        print("DEBUG DB: get_session_local() called before explicit initialization. Initializing with default URL.")
+        logger.debug("get_session_local() called before explicit initialization. Initializing with default URL.")
         initialize_database()
     return SessionLocal
 
 def create_db_and_tables(target_engine):
-    print(f"DEBUG DB: Creating tables on engine {target_engine.url}")
+    logger.debug("Creating tables on engine %s", target_engine.url)
     Base.metadata.create_all(bind=target_engine)
-    print("DEBUG DB: Tables created.")
+    logger.debug("Tables created.")
+
+
+# Async driver used for each sync backend
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def to_async_url(db_url):
+    url = make_url(db_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'.")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def get_async_engine():
+    global async_engine
+    if async_engine is None:
+        # In tests this points aiosqlite at the same shared in-memory database as the sync engine
+        async_url = to_async_url(get_engine().url)
+        async_engine = create_async_engine(async_url, **engine_options(async_url, storage_profile))
+        apply_storage_profile(async_engine.sync_engine, storage_profile)
+        logger.info("Async database engine ready", extra={"url": async_engine.url.render_as_string(hide_password=True)})
+    return async_engine
+
+def get_async_session_local():
+    global AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        # Objects stay loaded after commit: touching an expired attribute would need IO outside run_sync
+        AsyncSessionLocal = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
+async def dispose_async_engine():
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = None
+        AsyncSessionLocal = None
+
+def get_session_factory():
+    """Session factory for DB_SESSION_MODE: AsyncSession in "async" mode, Session otherwise."""
+    return get_async_session_local() if DB_SESSION_MODE == "async" else get_session_local()
+
+async def run_in_session(session_factory, fn, *args, **kwargs):
+    """Calls fn(session, *args, **kwargs) on a new session from either kind of factory.
 
+    With an AsyncSession, fn runs through run_sync: the same ORM code, with its SQL awaited on the async driver.
+    """
+    db = session_factory()
+    if isinstance(db, AsyncSession):
+        async with db:
+            return await db.run_sync(fn, *args, **kwargs)
+    with db:
+        return fn(db, *args, **kwargs)
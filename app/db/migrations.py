@@ -0,0 +1,100 @@
+# app/db/migrations.py
+#
+# Versioned schema migrations for databases created before a model change.
+# create_db_and_tables only creates missing tables; indexes or columns added to existing
+# tables go here. Run with: python -m app.db.migrations
+
+import logging
+
+from sqlalchemy import text, inspect as sqlalchemy_inspect
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData
+from sqlalchemy.sql import func
+
+from app.db.database import Base, get_engine
+from app.models import models # Import models to ensure Base is populated
+
+logger = logging.getLogger(__name__)
+
+_version_metadata = MetaData()
+schema_version_table = Table(
+    "schema_version", _version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+def _add_task_hot_query_indexes(connection):
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_tasks_owner_status_due ON tasks (owner_id, status, due_date)"
+    ))
+
+def _add_reminder_scheduler_support(connection):
+    task_columns = {column["name"] for column in sqlalchemy_inspect(connection).get_columns("tasks")}
+    if "reminded_at" not in task_columns:
+        # Same type as create_all would give the column (timestamptz on PostgreSQL)
+        column_type = models.Task.__table__.c.reminded_at.type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE tasks ADD COLUMN reminded_at {column_type}"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_tasks_status_due ON tasks (status, due_date)"))
+
+def _never_reuse_task_ids(connection):
+    """Rebuilds a SQLite `tasks` table with AUTOINCREMENT and starts its sequence past every archived id."""
+    if connection.dialect.name != "sqlite":
+        return
+    table_sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'")).scalar()
+    if "AUTOINCREMENT" not in table_sql.upper():
+        connection.execute(text("ALTER TABLE tasks RENAME TO _tasks_before_autoincrement"))
+        for row in connection.exec_driver_sql("PRAGMA index_list('_tasks_before_autoincrement')").all():
+            if row[3] == "c": # Created by CREATE INDEX; the model recreates them on the new table
+                connection.execute(text(f'DROP INDEX "{row[1]}"'))
+        models.Task.__table__.create(connection)
+        columns = ", ".join(column.name for column in models.Task.__table__.columns)
+        connection.execute(text(f"INSERT INTO tasks ({columns}) SELECT {columns} FROM _tasks_before_autoincrement"))
+        connection.execute(text("DROP TABLE _tasks_before_autoincrement"))
+    # Ids already handed out again collide with their archived namesake; move those live tasks to fresh ids
+    last_id = connection.execute(text(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM tasks), 0), COALESCE((SELECT MAX(id) FROM tasks_archive), 0))"
+    )).scalar()
+    reused_ids = connection.execute(text("SELECT id FROM tasks WHERE id IN (SELECT id FROM tasks_archive) ORDER BY id")).scalars().all()
+    for task_id in reused_ids:
+        last_id += 1
+        connection.execute(text("UPDATE tasks SET id = :new_id WHERE id = :task_id"), {"new_id": last_id, "task_id": task_id})
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'tasks'"))
+    connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', :seq)"), {"seq": last_id})
+
+# (version, description, function(connection)). Append only; each step must be safe to run on a
+# database that create_all already brought up to date (e.g. use IF NOT EXISTS).
+MIGRATIONS = [
+    (1, "composite index on tasks (owner_id, status, due_date)", _add_task_hot_query_indexes),
+    (2, "tasks.reminded_at and index on tasks (status, due_date)", _add_reminder_scheduler_support),
+    (3, "tasks ids are never reused (SQLite AUTOINCREMENT), as tasks_archive keeps them", _never_reuse_task_ids),
+]
+
+def get_schema_version(connection):
+    if not sqlalchemy_inspect(connection).has_table("schema_version"):
+        return 0
+    return connection.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+def migrate_database(target_engine=None):
+    """Creates missing tables, then applies pending migrations in order, one transaction each.
+
+    Returns the list of versions applied.
+    """
+    target_engine = target_engine or get_engine()
+    Base.metadata.create_all(bind=target_engine)
+    _version_metadata.create_all(bind=target_engine)
+    applied = []
+    with target_engine.connect() as connection:
+        current_version = get_schema_version(connection)
+    for version, description, upgrade in MIGRATIONS:
+        if version <= current_version:
+            continue
+        with target_engine.begin() as connection:
+            upgrade(connection)
+            connection.execute(schema_version_table.insert().values(version=version, description=description))
+        logger.info("Applied migration %d: %s", version, description)
+        applied.append(version)
+    return applied
+
+if __name__ == "__main__":
+    applied_versions = migrate_database()
+    print(f"Migrations applied: {applied_versions or 'none (already up to date)'}")
@@ -0,0 +1,231 @@
+# ia_whatsapp_assistant/app/gateway/outbound.py
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from app.gateway import whatsapp_handler
+from app.core import metrics
+from config.settings import (OUTBOUND_NUMBER_RATE, OUTBOUND_NUMBER_BURST, OUTBOUND_RECIPIENT_RATE, OUTBOUND_RECIPIENT_BURST,
+                             OUTBOUND_COALESCE_WINDOW_MS, OUTBOUND_MAX_429_RETRIES, OUTBOUND_RECIPIENT_BUCKETS,
+                             WHATSAPP_MAX_TEXT_LENGTH)
+
+logger = logging.getLogger(__name__)
+
+# Every reply and reminder leaves through send_messages(). While an OutboundDispatcher is running (started in
+# the app's lifespan) sends are paced by two token buckets, one for our PHONE_NUMBER_ID and one per recipient,
+# and texts queued for the same recipient within the coalescing window, or while its bucket is empty, go out as
+# one message. Without a dispatcher (tests, scripts) each text is sent directly, in order.
+
+COALESCE_SEPARATOR = "\n\n"
+
+class TokenBucket:
+    """`rate` tokens per second up to `burst`; rate <= 0 means unlimited."""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._clock = clock
+        self.tokens = self.burst
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Takes a token if one is available. Returns 0.0, or the seconds until one will be."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Waits for a token; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def penalize(self, seconds: float):
+        """Empties the bucket so the next token is `seconds` away (the API answered 429)."""
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class OutboundDispatcher:
+    """Paces and coalesces outbound WhatsApp texts. Bound to the event loop it was started on."""
+
+    def __init__(self, number_rate: float = OUTBOUND_NUMBER_RATE, number_burst: float = OUTBOUND_NUMBER_BURST,
+                 recipient_rate: float = OUTBOUND_RECIPIENT_RATE, recipient_burst: float = OUTBOUND_RECIPIENT_BURST,
+                 coalesce_window_ms: float = OUTBOUND_COALESCE_WINDOW_MS, max_length: int = WHATSAPP_MAX_TEXT_LENGTH,
+                 max_429_retries: int = OUTBOUND_MAX_429_RETRIES, recipient_buckets: int = OUTBOUND_RECIPIENT_BUCKETS,
+                 clock=time.monotonic):
+        self.number_bucket = TokenBucket(number_rate, number_burst, clock)
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.coalesce_window = coalesce_window_ms / 1000.0
+        self.max_length = max_length
+        self.max_429_retries = max_429_retries
+        self.recipient_buckets = recipient_buckets
+        self._clock = clock
+        self._buckets = OrderedDict() # recipient -> TokenBucket; evicting one only grants that recipient a fresh burst
+        self._pending = {} # recipient -> [(text, future), ...] not yet sent
+        self._flushers = {} # recipient -> task sending that recipient's pending texts
+        self._accepting = False
+        self.submitted = 0
+        self.api_calls = 0
+        self.coalesced = 0 # Texts that rode along in another text's API call
+        self.throttled_seconds = 0.0
+        self.rate_limited = 0 # 429 answers from the API
+
+    @property
+    def running(self):
+        return self._accepting
+
+    def start(self):
+        self._accepting = True
+
+    def submit(self, to_phone_number: str, text: str):
+        """Queues a text; returns a future with the send result. Texts to one recipient keep their order."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(to_phone_number, []).append((text, future))
+        self.submitted += 1
+        if to_phone_number not in self._flushers:
+            self._flushers[to_phone_number] = asyncio.create_task(self._flush(to_phone_number))
+        return future
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Stops accepting texts and sends what is pending, waiting up to `drain_timeout` seconds."""
+        self._accepting = False
+        flushers = list(self._flushers.values())
+        if not flushers:
+            return
+        done, not_done = await asyncio.wait(flushers, timeout=drain_timeout)
+        if not_done:
+            logger.warning("Outbound drain timed out with %d recipients still pending", len(not_done))
+            for task in not_done:
+                task.cancel()
+            await asyncio.gather(*not_done, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "api_calls": self.api_calls,
+            "coalesced": self.coalesced,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "rate_limited": self.rate_limited,
+            "pending_recipients": len(self._pending),
+        }
+
+    def _recipient_bucket(self, to_phone_number: str):
+        bucket = self._buckets.get(to_phone_number)
+        if bucket is None:
+            bucket = self._buckets[to_phone_number] = TokenBucket(self.recipient_rate, self.recipient_burst, self._clock)
+            while len(self._buckets) > self.recipient_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(to_phone_number)
+        return bucket
+
+    def _take_batch(self, to_phone_number: str):
+        """Removes the pending texts that fit in one message (at least one) and returns them."""
+        pending = self._pending[to_phone_number]
+        size = len(pending[0][0])
+        count = 1
+        while count < len(pending) and size + len(COALESCE_SEPARATOR) + len(pending[count][0]) <= self.max_length:
+            size += len(COALESCE_SEPARATOR) + len(pending[count][0])
+            count += 1
+        batch, self._pending[to_phone_number] = pending[:count], pending[count:]
+        if not self._pending[to_phone_number]:
+            del self._pending[to_phone_number]
+        return batch
+
+    async def _flush(self, to_phone_number: str):
+        try:
+            while to_phone_number in self._pending:
+                if self.coalesce_window > 0:
+                    await asyncio.sleep(self.coalesce_window) # Let replies triggered together join this one
+                # Texts queued while waiting for tokens join the message too
+                self.throttled_seconds += await self._recipient_bucket(to_phone_number).acquire()
+                self.throttled_seconds += await self.number_bucket.acquire()
+                batch = self._take_batch(to_phone_number)
+                try:
+                    result = await self._deliver(to_phone_number, COALESCE_SEPARATOR.join(text for text, _ in batch))
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                if len(batch) > 1:
+                    self.coalesced += len(batch) - 1
+                    result = {**result, "coalesced": len(batch)}
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            del self._flushers[to_phone_number]
+
+    async def _deliver(self, to_phone_number: str, text: str):
+        attempt = 0
+        while True:
+            self.api_calls += 1
+            result = await _send_one(to_phone_number, text)
+            if result.get("status_code") != 429 or attempt >= self.max_429_retries:
+                return result
+            attempt += 1
+            self.rate_limited += 1
+            retry_after = result.get("retry_after") or 2 ** attempt
+            logger.warning("Graph API rate limited the send; retrying in %.1fs", retry_after, extra={"to": to_phone_number, "attempt": attempt})
+            self.number_bucket.penalize(retry_after)
+            await self.number_bucket.acquire()
+
+async def _send_one(to_phone_number: str, text: str):
+    started = time.perf_counter()
+    result = await whatsapp_handler.send_whatsapp_message_async(to_phone_number, text)
+    metrics.observe_stage("send", started)
+    return result
+
+# Running dispatcher of this process, set by start_outbound_dispatcher()
+outbound_dispatcher = None
+
+def start_outbound_dispatcher(**options):
+    """Starts the process-wide dispatcher on the running event loop (app startup)."""
+    global outbound_dispatcher
+    outbound_dispatcher = OutboundDispatcher(**options)
+    outbound_dispatcher.start()
+    return outbound_dispatcher
+
+async def stop_outbound_dispatcher(drain_timeout: float = 10.0):
+    global outbound_dispatcher
+    if outbound_dispatcher is not None:
+        await outbound_dispatcher.stop(drain_timeout)
+        outbound_dispatcher = None
+
+def _log_failed_send(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Outbound send failed", exc_info=future.exception())
+
+async def send_messages(to_phone_number: str, texts: list, wait: bool = True):
+    """Sends texts to one recipient in order; returns one result per text.
+
+    With wait=False and a running dispatcher the texts are handed over and the call returns None at once;
+    the dispatcher delivers them (and drains on shutdown), so a throttled recipient never holds up the caller.
+    """
+    if outbound_dispatcher is not None and outbound_dispatcher.running:
+        futures = [outbound_dispatcher.submit(to_phone_number, text) for text in texts]
+        if not wait:
+            for future in futures:
+                future.add_done_callback(_log_failed_send)
+            return None
+        return await asyncio.gather(*futures)
+    return [await _send_one(to_phone_number, text) for text in texts]
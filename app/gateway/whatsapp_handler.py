@@ -1,27 +1,103 @@
 # ia_whatsapp_assistant/app/gateway/whatsapp_handler.py
 
+import asyncio
+import logging
 import requests
+import httpx
 import json
-from config.settings import WHATSAPP_API_TOKEN, PHONE_NUMBER_ID
+from config.settings import (
+    WHATSAPP_API_TOKEN, PHONE_NUMBER_ID, WHATSAPP_API_BASE_URL,
+    WHATSAPP_HTTP_MAX_CONNECTIONS, WHATSAPP_HTTP_MAX_KEEPALIVE, WHATSAPP_HTTP_KEEPALIVE_EXPIRY,
+    WHATSAPP_HTTP_CONNECT_TIMEOUT, WHATSAPP_HTTP_TIMEOUT, WHATSAPP_SIMULATE_SENDS,
+)
+from app.core.log import log_payload
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
 
 # In a real scenario, this URL would be the Meta Graph API endpoint
-WHATSAPP_API_URL = f"https://graph.facebook.com/v17.0/{PHONE_NUMBER_ID}/messages"
+WHATSAPP_API_URL = f"{WHATSAPP_API_BASE_URL}/{PHONE_NUMBER_ID}/messages"
 
-# For MVP, we'll simulate sending messages by printing to console or returning the payload
-SIMULATE_WHATSAPP_MESSAGES = True
+# For MVP, we'll simulate sending messages by logging or returning the payload (WHATSAPP_SIMULATE_SENDS)
+SIMULATE_WHATSAPP_MESSAGES = WHATSAPP_SIMULATE_SENDS
 
-def send_whatsapp_message(to_phone_number: str, message_text: str):
-    """Simulates or sends a message to WhatsApp."""
-    payload = {
+# Shared outbound client (keep-alive pool), created lazily on the running event loop
+_async_client = None
+_async_client_loop = None
+
+def _build_text_payload(to_phone_number: str, message_text: str):
+    return {
         "messaging_product": "whatsapp",
         "to": to_phone_number,
         "type": "text",
         "text": {"body": message_text}
     }
 
+def get_async_client():
+    """Returns the shared pooled AsyncClient, creating it for the current event loop if needed."""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        # A client is bound to the loop that opened its connections; a new loop gets a new pool.
+        _async_client = httpx.AsyncClient(
+            headers={
+                "Authorization": f"Bearer {WHATSAPP_API_TOKEN}",
+                "Content-Type": "application/json"
+            },
+            limits=httpx.Limits(
+                max_connections=WHATSAPP_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=WHATSAPP_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=WHATSAPP_HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(WHATSAPP_HTTP_TIMEOUT, connect=WHATSAPP_HTTP_CONNECT_TIMEOUT),
+        )
+        _async_client_loop = loop
+    return _async_client
+
+async def close_async_client():
+    """Closes the shared client and its pooled connections (call on shutdown)."""
+    global _async_client, _async_client_loop
+    if _async_client is not None and not _async_client.is_closed:
+        await _async_client.aclose()
+    _async_client = None
+    _async_client_loop = None
+
+async def send_whatsapp_message_async(to_phone_number: str, message_text: str):
+    """Simulates or sends a message to WhatsApp without blocking the event loop."""
+    payload = _build_text_payload(to_phone_number, message_text)
+
+    if SIMULATE_WHATSAPP_MESSAGES:
+        logger.info("Simulated WhatsApp send", extra={"to": to_phone_number, "chars": len(message_text)})
+        log_payload(logger, "Simulated send payload", payload)
+        return {"status": "simulated_success", "payload": payload}
+    try:
+        response = await get_async_client().post(WHATSAPP_API_URL, json=payload)
+        response.raise_for_status()
+        response_data = response.json()
+        logger.debug("Message sent", extra={"to": to_phone_number})
+        return {"status": "success", "response": response_data}
+    except httpx.HTTPError as e:
+        metrics.send_failures_total.inc("http_status" if isinstance(e, httpx.HTTPStatusError) else "transport")
+        logger.warning("Error sending WhatsApp message: %s", e, extra={"to": to_phone_number})
+        error = {"status": "error", "error_message": str(e)}
+        if isinstance(e, httpx.HTTPStatusError):
+            error["status_code"] = e.response.status_code
+            error["retry_after"] = _retry_after_seconds(e.response.headers.get("Retry-After"))
+        return error
+
+def _retry_after_seconds(header_value):
+    try:
+        return float(header_value) if header_value is not None else None
+    except ValueError:
+        return None # HTTP-date form; callers fall back to their own backoff
+
+def send_whatsapp_message(to_phone_number: str, message_text: str):
+    """Simulates or sends a message to WhatsApp (blocking; prefer send_whatsapp_message_async in async code)."""
+    payload = _build_text_payload(to_phone_number, message_text)
+
     if SIMULATE_WHATSAPP_MESSAGES:
-        print(f"SIMULATING WHATSAPP SEND to {to_phone_number}: {message_text}")
-        print(f"Payload: {json.dumps(payload, indent=2)}")
+        logger.info("Simulated WhatsApp send", extra={"to": to_phone_number, "chars": len(message_text)})
+        log_payload(logger, "Simulated send payload", payload)
         return {"status": "simulated_success", "payload": payload}
     else:
         headers = {
@@ -31,36 +107,52 @@ def send_whatsapp_message(to_phone_number: str, message_text: str):
         try:
             response = requests.post(WHATSAPP_API_URL, headers=headers, data=json.dumps(payload))
             response.raise_for_status() # Raise an exception for HTTP errors
-            print(f"Message sent to {to_phone_number}. Response: {response.json()}")
+            logger.debug("Message sent", extra={"to": to_phone_number})
             return {"status": "success", "response": response.json()}
         except requests.exceptions.RequestException as e:
-            print(f"Error sending WhatsApp message to {to_phone_number}: {e}")
+            metrics.send_failures_total.inc("http_status" if isinstance(e, requests.exceptions.HTTPError) else "transport")
+            logger.warning("Error sending WhatsApp message: %s", e, extra={"to": to_phone_number})
             return {"status": "error", "error_message": str(e)}
 
+def iter_incoming_whatsapp_messages(payload: dict):
+    """Yields every text message in a webhook delivery, across all entries, changes and messages."""
+    if payload.get("object") != "whatsapp_business_account":
+        return
+    for entry in payload.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            if value.get("messaging_product") != "whatsapp":
+                continue
+            for message_object in value.get("messages") or []:
+                if message_object.get("type") != "text":
+                    continue
+                from_phone = message_object.get("from")
+                # whatsapp_id is usually the same as from_phone for user messages
+                yield {
+                    "whatsapp_id": from_phone,
+                    "phone_number": from_phone,
+                    "text": message_object.get("text", {}).get("body"),
+                    "message_id": message_object.get("id"),
+                    "timestamp": message_object.get("timestamp")
+                }
+
+def parse_incoming_whatsapp_messages(payload: dict):
+    """Returns the list of text messages in a delivery; a malformed delivery yields what parsed before the error."""
+    messages = []
+    try:
+        for message in iter_incoming_whatsapp_messages(payload):
+            messages.append(message)
+    except Exception:
+        logger.exception("Error parsing incoming WhatsApp message")
+    return messages
+
 def parse_incoming_whatsapp_message(payload: dict):
-    """Parses an incoming WhatsApp message payload (simplified for MVP)."""
+    """Parses the first text message of an incoming WhatsApp payload (see parse_incoming_whatsapp_messages)."""
     try:
-        if payload.get("object") == "whatsapp_business_account":
-            for entry in payload.get("entry", []):
-                for change in entry.get("changes", []):
-                    value = change.get("value", {})
-                    if value.get("messaging_product") == "whatsapp":
-                        # Get message details
-                        message_object = value.get("messages", [{}])[0]
-                        if message_object.get("type") == "text":
-                            text_body = message_object.get("text", {}).get("body")
-                            from_phone = message_object.get("from")
-                            # In a real app, you'd also get message_id, timestamp, etc.
-                            # whatsapp_id is usually the same as from_phone for user messages
-                            return {
-                                "whatsapp_id": from_phone, 
-                                "phone_number": from_phone, 
-                                "text": text_body
-                            }
-    except Exception as e:
-        print(f"Error parsing incoming WhatsApp message: {e}")
+        return next(iter_incoming_whatsapp_messages(payload), None)
+    except Exception:
+        logger.exception("Error parsing incoming WhatsApp message")
         return None
-    return None
 
 # Example of an incoming payload structure (for testing parse_incoming_whatsapp_message)
 EXAMPLE_INCOMING_PAYLOAD = {
@@ -96,7 +188,7 @@ if __name__ == "__main__":
     send_whatsapp_message("USER_PHONE_NUMBER", "Olá, este é um teste do assistente!")
 
     # Test parsing
-    parsed = parse_incoming_whatsapp_message(EXAMPLE_INCOMING_PAYLOAD)
+    parsed = parse_incoming_whatsapp_messages(EXAMPLE_INCOMING_PAYLOAD)
     print("\nParsed incoming message:")
     print(json.dumps(parsed, indent=2))
 
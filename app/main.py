@@ -1,40 +1,133 @@
 # app/main.py
 
 from fastapi import FastAPI, Request, HTTPException, Depends
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 import json
-from datetime import datetime
+import logging
+import time
 import os # Import os para os.getenv, embora o token principal venha de settings
 
-from app.gateway import whatsapp_handler
-from app.nlp import processor as nlp_processor
-from app.core import task_manager
+from app.core.log import configure_logging, log_payload
+from app.gateway import whatsapp_handler, outbound
+from app.core import pipeline, metrics, outbox
+from app.core.ingestion import QueueFullError
+from app.core.capture import TrafficCapture
+from app.core.dispatcher import ShardedDispatcher
+from app.core.user_cache import user_cache
+from app.core.reminder_cache import reminder_block_cache
+from app.nlp.cache import nlp_cache
+from app.core.scheduler import ReminderScheduler
+from app.core.digest import DailyDigest
+from app.core.archive import TaskArchiver
 from app.db.database import initialize_database, get_session_local, get_engine, create_db_and_tables
+from app.db.database import get_async_session_local, get_session_factory, dispose_async_engine
 from app.models import models # Import models to ensure Base is populated
 # WHATSAPP_VERIFY_TOKEN é importado daqui. Ele deve internamente usar os.getenv("VERIFY_TOKEN")
-from config.settings import WHATSAPP_VERIFY_TOKEN, DATABASE_URL
+from config.settings import WHATSAPP_VERIFY_TOKEN, DATABASE_URL, DB_SESSION_MODE
+from config.settings import CAPTURE_ENABLED
+from config.settings import INGESTION_MODE, INGESTION_ENQUEUE_TIMEOUT, INGESTION_DRAIN_TIMEOUT, DISPATCH_SHARDS, DISPATCH_SHARD_QUEUE_MAXSIZE
+from config.settings import (REMINDER_SCHEDULER_ENABLED, REMINDER_TICK_SECONDS, REMINDER_HORIZON_SECONDS,
+                             REMINDER_REFRESH_SECONDS, REMINDER_GRACE_SECONDS)
+from config.settings import DIGEST_ENABLED, DIGEST_TIME, DIGEST_BATCH_SIZE, DIGEST_YIELD_PER
+from config.settings import ARCHIVE_ENABLED
+
+# Logs em fila (não bloqueiam o request); nível e formato vêm de LOG_LEVEL / LOG_FORMAT
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # Inicializa o banco de dados com a URL padrão quando o app inicia
 initialize_database(DATABASE_URL)
 
 # Se precisar criar tabelas na inicialização (para prod/dev, não testes):
 # create_db_and_tables(get_engine())
+# Bancos já existentes recebem índices/colunas novos com: python -m app.db.migrations
+
+# Dispatcher por usuário (shards por whatsapp_id); criado no startup. Sem ele (ex.: testes sem lifespan),
+# o webhook processa a entrega diretamente na sessão da requisição.
+dispatcher = None
+# Agendador de lembretes proativos; criado no startup
+reminder_scheduler = None
+# Captura das entregas brutas para replay (CAPTURE_ENABLED); criada no startup
+traffic_capture = None
+# Resumo diário das tarefas do dia (DIGEST_ENABLED); criado no startup
+daily_digest = None
+# Move tarefas concluídas/canceladas antigas para tasks_archive (ARCHIVE_ENABLED); criado no startup
+task_archiver = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global dispatcher, reminder_scheduler, traffic_capture, daily_digest, task_archiver
+    if CAPTURE_ENABLED:
+        traffic_capture = TrafficCapture()
+        traffic_capture.start()
+    # Envios com limite por número/destinatário e respostas próximas juntadas numa só mensagem
+    outbound.start_outbound_dispatcher()
+    # Entrega as mensagens da outbox (respostas e lembretes gravados junto com as mudanças de tarefa)
+    outbox.start_outbox_sender(get_session_factory())
+    if DISPATCH_SHARDS > 0:
+        dispatcher = ShardedDispatcher(shards=DISPATCH_SHARDS, queue_maxsize=DISPATCH_SHARD_QUEUE_MAXSIZE)
+        dispatcher.start()
+        metrics.track_dispatcher(dispatcher)
+    if REMINDER_SCHEDULER_ENABLED:
+        reminder_scheduler = ReminderScheduler(
+            get_session_factory(), tick_seconds=REMINDER_TICK_SECONDS, horizon_seconds=REMINDER_HORIZON_SECONDS,
+            refresh_seconds=REMINDER_REFRESH_SECONDS, grace_seconds=REMINDER_GRACE_SECONDS
+        )
+        reminder_scheduler.start()
+    if DIGEST_ENABLED:
+        daily_digest = DailyDigest(send_at=DIGEST_TIME, batch_size=DIGEST_BATCH_SIZE, yield_per=DIGEST_YIELD_PER)
+        daily_digest.start()
+    if ARCHIVE_ENABLED:
+        task_archiver = TaskArchiver(get_session_factory())
+        task_archiver.start()
+    yield
+    if task_archiver is not None:
+        await task_archiver.stop()
+        task_archiver = None
+    if daily_digest is not None:
+        await daily_digest.stop()
+        daily_digest = None
+    if reminder_scheduler is not None:
+        await reminder_scheduler.stop()
+        reminder_scheduler = None
+    if dispatcher is not None:
+        # Drena o que já foi aceito antes de encerrar
+        await dispatcher.stop(drain_timeout=INGESTION_DRAIN_TIMEOUT)
+        metrics.track_dispatcher(None)
+        dispatcher = None
+    # O que não foi enviado continua na outbox para o próximo processo
+    await outbox.stop_outbox_sender(drain_timeout=INGESTION_DRAIN_TIMEOUT)
+    # Envia o que ainda está pendente e fecha o pool keep-alive do cliente de saída
+    await outbound.stop_outbound_dispatcher(drain_timeout=INGESTION_DRAIN_TIMEOUT)
+    await whatsapp_handler.close_async_client()
+    await dispose_async_engine()
+    if traffic_capture is not None:
+        # Grava o que ainda está na fila e fecha o arquivo atual
+        traffic_capture.stop()
+        traffic_capture = None
 
 app = FastAPI(
     title="IA WhatsApp Assistant MVP",
     description="MVP para um assistente de IA no WhatsApp para gerenciamento de rotina.",
-    version="0.1.2" # Versão incrementada
+    version="0.1.2", # Versão incrementada
+    lifespan=lifespan
 )
 
-# Loga o token esperado no escopo global para verificar se config.settings o carregou corretamente
+# Confirma se config.settings carregou o token (o valor em si nunca vai para o log)
 if WHATSAPP_VERIFY_TOKEN:
-    print(f"[LOG INICIAL] WHATSAPP_VERIFY_TOKEN (de config.settings) no escopo global: 	'{WHATSAPP_VERIFY_TOKEN}' (Tipo: {type(WHATSAPP_VERIFY_TOKEN)})")
+    logger.info("WHATSAPP_VERIFY_TOKEN carregado de config.settings.")
 else:
     # Este é um ponto crítico. Se WHATSAPP_VERIFY_TOKEN for None aqui, a variável de ambiente VERIFY_TOKEN não foi lida corretamente por config.settings.py
-    print(f"[LOG INICIAL ERRO CRÍTICO] WHATSAPP_VERIFY_TOKEN (de config.settings) é None ou vazio. Verifique a variável de ambiente VERIFY_TOKEN no Render e o arquivo config/settings.py.")
-
-# Dependência para obter a sessão do DB
-def get_db_session():
+    logger.critical("WHATSAPP_VERIFY_TOKEN (de config.settings) é None ou vazio. Verifique a variável de ambiente VERIFY_TOKEN no Render e o arquivo config/settings.py.")
+
+# Dependência para obter a sessão do DB (AsyncSession quando DB_SESSION_MODE="async")
+async def get_db_session():
+    if DB_SESSION_MODE == "async":
+        async with get_async_session_local()() as db:
+            yield db
+        return
     CurrentSessionLocal = get_session_local()
     db = CurrentSessionLocal()
     try:
@@ -48,171 +141,79 @@ async def read_root():
 
 @app.get("/webhook")
 async def verify_webhook(request: Request):
-    print("--- NOVA TENTATIVA DE VERIFICACAO DO WEBHOOK RECEBIDA ---")
-    
-    # WHATSAPP_VERIFY_TOKEN já foi carregado no escopo global a partir de config.settings
-    # Vamos logar seu valor e tipo aqui para confirmação no momento da chamada.
-    print(f"[DENTRO DO WEBHOOK GET] Token esperado (de config.settings via WHATSAPP_VERIFY_TOKEN): 	'{WHATSAPP_VERIFY_TOKEN}' (Tipo: {type(WHATSAPP_VERIFY_TOKEN)})")
-
     mode = request.query_params.get("hub.mode")
     token_recebido = request.query_params.get("hub.verify_token") # Este é o token que a Meta envia
     challenge = request.query_params.get("hub.challenge")
 
-    print(f"[DENTRO DO WEBHOOK GET] Modo recebido da Meta: 			'{mode}' (Tipo: {type(mode)})")
-    print(f"[DENTRO DO WEBHOOK GET] Token recebido da Meta (hub.verify_token): 	'{token_recebido}' (Tipo: {type(token_recebido)})")
-    print(f"[DENTRO DO WEBHOOK GET] Challenge recebido da Meta: 		'{challenge}' (Tipo: {type(challenge)})")
-
     # Verificações adicionais para depuração
     if WHATSAPP_VERIFY_TOKEN is None:
-        print("[ERRO DE CONFIGURACAO] WHATSAPP_VERIFY_TOKEN (de config.settings) é None DENTRO da função verify_webhook. Isso não deveria acontecer se o log inicial mostrou um valor.")
+        logger.error("WHATSAPP_VERIFY_TOKEN (de config.settings) é None DENTRO da função verify_webhook.")
     if token_recebido is None:
-        print("[AVISO] Token recebido da Meta (hub.verify_token) é None. A Meta não enviou o token?")
+        logger.warning("Token recebido da Meta (hub.verify_token) é None. A Meta não enviou o token?")
 
-    # Vamos comparar e logar o resultado da comparação
     comparacao_modo = (mode == "subscribe")
     # A comparação crucial:
     comparacao_token = (str(token_recebido) == str(WHATSAPP_VERIFY_TOKEN)) # Convertendo para string para garantir a comparação correta, caso um seja None ou de tipo diferente
-    
-    print(f"[DENTRO DO WEBHOOK GET] Resultado da comparacao (mode == 'subscribe'): 		{comparacao_modo}")
-    print(f"[DENTRO DO WEBHOOK GET] Resultado da comparacao (token_recebido == WHATSAPP_VERIFY_TOKEN): 	{comparacao_token}")
+    logger.debug("Verificação do webhook", extra={"mode": mode, "mode_ok": comparacao_modo, "token_ok": comparacao_token})
 
     if comparacao_modo and comparacao_token and WHATSAPP_VERIFY_TOKEN is not None and token_recebido is not None:
-        print(f"SUCESSO NA VERIFICACAO DO WEBHOOK! Retornando challenge: {challenge}")
+        logger.info("Webhook verificado com sucesso.")
         return int(challenge) # Meta espera um int
     else:
-        print(f"FALHA NA VERIFICACAO DO WEBHOOK. Detalhes das comparações acima. HTTP 403 será retornado.")
-        # Para depuração, vamos logar os tokens novamente caso a comparação falhe, para ter certeza.
-        print(f"Reconfirmando para falha: Token Recebido da Meta: '{token_recebido}', Token Esperado (de config.settings): '{WHATSAPP_VERIFY_TOKEN}'")
+        logger.warning("Falha na verificação do webhook; HTTP 403 será retornado.", extra={"mode_ok": comparacao_modo, "token_ok": comparacao_token})
         raise HTTPException(status_code=403, detail="Token de verificação inválido ou erro de configuração interna.")
 
 @app.post("/webhook")
 async def handle_whatsapp_message(request: Request, db: Session = Depends(get_db_session)):
+    started = time.perf_counter()
+    try:
+        return await _handle_webhook_post(request, db)
+    finally:
+        if metrics.enabled:
+            metrics.webhook_seconds.observe(time.perf_counter() - started)
+
+async def _handle_webhook_post(request: Request, db):
+    arrived_at = time.time()
     try:
         payload = await request.json()
-        print(f"Received payload: {json.dumps(payload, indent=2)}")
+        # Amostrado e só em DEBUG; em produção o payload nunca é serializado
+        log_payload(logger, "Received payload", payload)
     except json.JSONDecodeError:
-        print("Error decoding JSON")
+        logger.warning("Error decoding JSON")
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
 
-    parsed_message = whatsapp_handler.parse_incoming_whatsapp_message(payload)
-    if not parsed_message:
-        return {"status": "ignored", "reason": "Non-text message or parse error"}
-
-    user_whatsapp_id = parsed_message["whatsapp_id"]
-    user_phone_number = parsed_message["phone_number"]
-    message_text = parsed_message["text"]
-    print(f"Processing message from {user_whatsapp_id}: {message_text}")
-
-    user = task_manager.get_user_by_whatsapp_id(db, user_whatsapp_id)
-    if not user:
-        user = task_manager.create_user(db, user_whatsapp_id, user_phone_number)
-        response_text = ("Olá! Sou sua assistente de rotina pessoal. "
-                         "Posso te ajudar a organizar suas tarefas e mais. "
-                         "Você concorda em receber minhas mensagens e utilizar meus serviços? "
-                         "Responda 'Sim' para continuar ou 'Não' para cancelar.")
-        whatsapp_handler.send_whatsapp_message(user_whatsapp_id, response_text)
-        return {"status": "new_user_prompted_for_opt_in"}
-
-    nlp_result = nlp_processor.process_message_nlp(message_text)
-    intent = nlp_result.get("intent")
-    entities = nlp_result.get("entities", {})
-    response_text = "Desculpe, não entendi o que você quis dizer. Pode tentar de outra forma?"
-
-    if not user.opt_in_status:
-        if intent == "opt_in_yes":
-            task_manager.update_user_opt_in(db, user_whatsapp_id, True)
-            response_text = "Ótimo! Sua inscrição foi confirmada. Como posso te ajudar hoje? Digite 'ajuda' para ver os comandos."
-        elif intent == "opt_in_no":
-            task_manager.update_user_opt_in(db, user_whatsapp_id, False)
-            response_text = "Entendido. Se mudar de ideia, é só me chamar e dizer 'Sim'."
-        else:
-            response_text = ("Por favor, responda 'Sim' para confirmar o uso do serviço ou 'Não' para cancelar.")
-        whatsapp_handler.send_whatsapp_message(user_whatsapp_id, response_text)
-        return {"status": "opt_in_processed"}
-
-    simulated_reminder_text = ""
-    pending_today_reminders = task_manager.get_pending_reminders_for_today(db, user_whatsapp_id)
-    if pending_today_reminders:
-        simulated_reminder_text = "\n\nLembrete Rápido! Você tem as seguintes tarefas para hoje:\n"
-        for task in pending_today_reminders:
-            simulated_reminder_text += f"- {task.description}"
-            if task.due_date:
-                simulated_reminder_text += f" (Prazo: {task.due_date.strftime('%H:%M')})\n"
-            else:
-                simulated_reminder_text += "\n"
- 
-    if intent == "add_task":
-        description = entities.get("description")
-        due_date = entities.get("due_date")
-        if description:
-            task = task_manager.create_task(db, user_whatsapp_id, description, due_date_str=due_date)
-            response_text = f"Tarefa '{description}' adicionada!"
-            if due_date:
-                response_text += f" para {datetime.strptime(due_date, '%Y-%m-%d %H:%M:%S').strftime('%d/%m/%Y %H:%M')}."
-        else:
-            response_text = "Para adicionar uma tarefa, me diga a descrição. Ex: Lembrar de comprar pão amanhã às 8h"
-
-    elif intent == "list_tasks":
-        date_filter = entities.get("date_filter", "hoje")
-        tasks = task_manager.get_tasks_by_user(db, user_whatsapp_id, status="pending") # Filtrando por 'pending'
-        if tasks:
-            response_text = f"Suas tarefas pendentes ({date_filter}):\n"
-            for i, task in enumerate(tasks):
-                response_text += f"{task.id}. {task.description}"
-                if task.due_date:
-                    response_text += f" (Prazo: {task.due_date.strftime('%d/%m/%Y %H:%M')})\n"
-                else:
-                    response_text += "\n"
-        else:
-            response_text = f"Você não tem tarefas pendentes ({date_filter})."
-
-    elif intent == "list_reminders":
-        date_filter = entities.get("date_filter", "hoje")
-        reminders = task_manager.get_reminders_for_user_by_date_filter(db, user_whatsapp_id, date_filter)
-        if reminders:
-            response_text = f"Seus lembretes para {date_filter}:\n"
-            for i, task in enumerate(reminders):
-                response_text += f"{task.id}. {task.description}"
-                if task.due_date:
-                    response_text += f" (Prazo: {task.due_date.strftime('%d/%m/%Y %H:%M')})\n"
-                else:
-                    response_text += "\n"
-        else:
-            response_text = f"Você não tem lembretes agendados para {date_filter}."
-
-    elif intent == "complete_task":
-        task_id_str = entities.get("task_id")
-        if task_id_str:
-            try:
-                task_id = int(task_id_str)
-                updated_task = task_manager.update_task_status(db, task_id, user_whatsapp_id, "completed")
-                if updated_task:
-                    response_text = f"Tarefa {task_id} marcada como concluída!"
-                else:
-                    response_text = f"Não encontrei a tarefa {task_id} ou ela não é sua."
-            except ValueError:
-                response_text = "Por favor, forneça um número de tarefa válido para concluir."
-        else:
-            response_text = "Qual o número da tarefa que você quer concluir?"
-            
-    elif intent == "help":
-        response_text = ("Comandos disponíveis (MVP):\n"
-                         "- Adicionar tarefa: 'Lembrar de [descrição] para [data] às [hora]'\n"
-                         "- Listar tarefas: 'Minhas tarefas de hoje'\n"
-                         "- Listar lembretes: 'Meus lembretes de hoje' ou 'Lembretes para amanhã'\n"
-                         "- Concluir tarefa: 'Concluir tarefa [número da tarefa]'\n"
-                         "- Ajuda: 'ajuda'")
-
-    elif intent == "unknown":
-        response_text = "Não entendi. Tente 'ajuda' para ver o que posso fazer."
-    
-    if simulated_reminder_text and intent not in ["list_reminders"]:
-        final_response_text = response_text + simulated_reminder_text
-    else:
-        final_response_text = response_text
-
-    whatsapp_handler.send_whatsapp_message(user_whatsapp_id, final_response_text)
-    return {"status": "processed", "intent": intent, "response_sent": final_response_text}
+    if traffic_capture is not None:
+        # Só enfileira; compressão, pseudônimos e escrita ficam na thread da captura
+        traffic_capture.record(payload, arrived_at)
+
+    if dispatcher is not None and dispatcher.running:
+        # Modo "queue": confirma o recebimento para a Meta e deixa os shards processarem
+        try:
+            return await pipeline.dispatch_webhook_payload(dispatcher, payload, wait=(INGESTION_MODE != "queue"), timeout=INGESTION_ENQUEUE_TIMEOUT)
+        except QueueFullError:
+            raise HTTPException(status_code=503, detail="Fila de ingestão cheia, tente novamente.", headers={"Retry-After": "1"})
+
+    return await pipeline.process_webhook_payload(db, payload)
+
+@app.get("/stats")
+async def read_stats():
+    return {
+        "dispatcher": dispatcher.stats() if dispatcher is not None else None,
+        "user_cache": user_cache.stats(),
+        "reminder_block_cache": reminder_block_cache.stats(),
+        "nlp_cache": nlp_cache.stats(),
+        "reminder_scheduler": reminder_scheduler.stats() if reminder_scheduler is not None else None,
+        "daily_digest": daily_digest.stats() if daily_digest is not None else None,
+        "task_archiver": task_archiver.stats() if task_archiver is not None else None,
+        "outbound": outbound.outbound_dispatcher.stats() if outbound.outbound_dispatcher is not None else None,
+        "outbox": outbox.outbox_sender.stats() if outbox.outbox_sender is not None else None,
+        "traffic_capture": traffic_capture.stats() if traffic_capture is not None else None,
+    }
+
+@app.get("/metrics")
+async def read_metrics():
+    # Formato texto do Prometheus; os valores só são agregados e formatados aqui, no scrape
+    return Response(metrics.render_prometheus(), media_type=metrics.CONTENT_TYPE)
 
 if __name__ == "__main__":
     print("Para testar a aplicação, rode com Uvicorn: uvicorn app.main:app --reload")
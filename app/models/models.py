@@ -1,6 +1,6 @@
 # ia_whatsapp_assistant/app/models/models.py
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -27,9 +27,79 @@ class Task(Base):
     due_date = Column(DateTime(timezone=True), nullable=True)
     priority = Column(String, nullable=True)
     status = Column(String, default="pending") # e.g., pending, completed, cancelled
+    reminded_at = Column(DateTime(timezone=True), nullable=True) # Set when the scheduler pushed the reminder
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     owner = relationship("User", back_populates="tasks")
 
+    __table_args__ = (
+        # Every hot query filters by owner and status, then ranges/orders on due_date.
+        # Existing databases get these through app/db/migrations.py.
+        Index("ix_tasks_owner_status_due", "owner_id", "status", "due_date"),
+        # Reminder scheduler window: all pending tasks due in the next minutes, across owners.
+        Index("ix_tasks_status_due", "status", "due_date"),
+        # Archived tasks keep their id in tasks_archive, so SQLite must never hand out the id of a deleted row
+        # again (a plain rowid table reuses the highest one). Other backends use sequences, which never do.
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TaskArchive(Base):
+    """Cold storage for completed and cancelled tasks, moved out of `tasks` by app.core.archive.
+
+    Rows keep their original id and columns, so history reads can merge both tables.
+    """
+    __tablename__ = "tasks_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String, nullable=False)
+    due_date = Column(DateTime(timezone=True), nullable=True)
+    priority = Column(String, nullable=True)
+    status = Column(String, nullable=False)
+    reminded_at = Column(DateTime(timezone=True), nullable=True)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # History reads: one owner's tasks with a given status, by due_date (as on tasks)
+        Index("ix_tasks_archive_owner_status_due", "owner_id", "status", "due_date"),
+    )
+
+
+class ProcessedMessage(Base):
+    __tablename__ = "processed_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    message_id = Column(String, unique=True, index=True, nullable=False) # WhatsApp message id (wamid)
+    processed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False) # whatsapp_id
+    body = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending") # pending, failed (gave up); sent rows are deleted
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    claim_token = Column(String, nullable=True) # Set by the sender that claimed the row
+    claimed_until = Column(DateTime(timezone=True), nullable=True) # Lease; after it another sender may claim the row
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # The claim query: pending rows whose next attempt is due, oldest first.
+        Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
+class DigestRun(Base):
+    __tablename__ = "digest_runs"
+
+    day = Column(Date, primary_key=True) # One row per day: the process that inserts it sends that day's digest
+    claimed_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,30 @@
+# ia_whatsapp_assistant/app/nlp/cache.py
+
+from app.core.lru import LRUCache
+from config.settings import NLP_CACHE_SIZE
+
+# Intents whose entities quote the message itself; a case variant of the text must not reuse them.
+TEXT_BEARING_INTENTS = frozenset({"add_task"})
+
+class NlpResultCache(LRUCache):
+    """Bounded LRU of interpret_message results keyed on case-folded, whitespace-normalized text.
+
+    Values are date-independent (relative dates stay as raw tokens and are resolved on every lookup), so
+    entries never expire. Results that quote the message are only reused for the exact same text.
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+
+    def get(self, normalized_text: str):
+        """Returns (intent, entities) or None."""
+        entry = super().get(normalized_text.casefold(),
+                            is_valid=lambda entry: entry[0] is None or entry[0] == normalized_text)
+        return entry[1:] if entry is not None else None
+
+    def put(self, normalized_text: str, intent: str, entities: dict):
+        exact_text = normalized_text if intent in TEXT_BEARING_INTENTS else None
+        super().put(normalized_text.casefold(), (exact_text, intent, entities))
+
+# Shared by this process
+nlp_cache = NlpResultCache(NLP_CACHE_SIZE)
@@ -0,0 +1,121 @@
+# ia_whatsapp_assistant/app/nlp/intents.py
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import ClassVar
+
+# Typed results of the NLP layer. `name` is the intent string used in responses and logs; to_dict() gives the
+# legacy {"intent", "entities"} shape returned by process_message_nlp.
+# Task commands carry "task_ids" (a list); a complete_task naming a single id also keeps the original
+# "task_id" entity, so consumers of the legacy shape still see {"task_id": 5}.
+
+@dataclass(frozen=True, slots=True)
+class AddTask:
+    name: ClassVar[str] = "add_task"
+    description: str
+    due_date: datetime
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {"description": self.description, "due_date": self.due_date.strftime("%Y-%m-%d %H:%M:%S")}}
+
+@dataclass(frozen=True, slots=True)
+class ClarifyAddTask:
+    name: ClassVar[str] = "clarify_add_task"
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {}}
+
+@dataclass(frozen=True, slots=True)
+class ListTasks:
+    name: ClassVar[str] = "list_tasks"
+    date_filter: str # "hoje", "amanhã" or "all"
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {"date_filter": self.date_filter}}
+
+@dataclass(frozen=True, slots=True)
+class ListReminders:
+    name: ClassVar[str] = "list_reminders"
+    date_filter: str
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {"date_filter": self.date_filter}}
+
+@dataclass(frozen=True, slots=True)
+class CompleteTask:
+    name: ClassVar[str] = "complete_task"
+    task_ids: tuple # One or more ids, ranges expanded, in the order given
+
+    def to_dict(self):
+        entities = {"task_ids": list(self.task_ids)}
+        if len(self.task_ids) == 1:
+            entities["task_id"] = self.task_ids[0]
+        return {"intent": self.name, "entities": entities}
+
+@dataclass(frozen=True, slots=True)
+class DeleteTask:
+    name: ClassVar[str] = "delete_task"
+    task_ids: tuple
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {"task_ids": list(self.task_ids)}}
+
+@dataclass(frozen=True, slots=True)
+class RescheduleTask:
+    name: ClassVar[str] = "reschedule_task"
+    task_ids: tuple
+    due_date: datetime
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {"task_ids": list(self.task_ids), "due_date": self.due_date.strftime("%Y-%m-%d %H:%M:%S")}}
+
+@dataclass(frozen=True, slots=True)
+class TooManyTaskIds:
+    name: ClassVar[str] = "too_many_task_ids" # A task command naming more than MAX_TASK_IDS ids
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {}}
+
+@dataclass(frozen=True, slots=True)
+class More:
+    name: ClassVar[str] = "more" # Next page of the last list
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {}}
+
+@dataclass(frozen=True, slots=True)
+class OptInYes:
+    name: ClassVar[str] = "opt_in_yes"
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {}}
+
+@dataclass(frozen=True, slots=True)
+class OptInNo:
+    name: ClassVar[str] = "opt_in_no"
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {}}
+
+@dataclass(frozen=True, slots=True)
+class Help:
+    name: ClassVar[str] = "help"
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {}}
+
+@dataclass(frozen=True, slots=True)
+class Unknown:
+    name: ClassVar[str] = "unknown"
+    original_message: str
+
+    def to_dict(self):
+        return {"intent": self.name, "entities": {"original_message": self.original_message}}
+
+# Field-less intents are immutable, so one instance of each is shared
+CLARIFY_ADD_TASK = ClarifyAddTask()
+TOO_MANY_TASK_IDS = TooManyTaskIds()
+MORE = More()
+OPT_IN_YES = OptInYes()
+OPT_IN_NO = OptInNo()
+HELP = Help()
@@ -3,21 +3,150 @@
 import re
 from datetime import datetime, timedelta
 
+from app.nlp import intents
+from app.nlp.cache import nlp_cache
+
+# One or more task ids: "3", "3, 4 e 7", "3 4 7"; "3 a 7", "3 até 7" and "3-7" are ranges (see parse_task_ids)
+TASK_ID_LIST = r"\d+(?:(?:\s*[,;]\s*|\s*-\s*|\s+(?:e|a|até)\s+|\s+)\d+)*"
+DATE = r"amanhã|hoje|\d{1,2}[-/]\d{1,2}(?:[-/]\d{2,4})?"
+TIME = r"\d{1,2}(?:[:hH]\d{2}|[hH])?"
+# Destructive commands must start the message (after an optional polite prefix), so a task description such as
+# "Lembrar de apagar tarefa 5 amanhã" is never read as one. Completing stays unanchored, as it always was:
+# "Ok, concluir tarefa 5" completes the task.
+COMMAND_START = r"^\s*(?:(?:por favor|pfv|pode|poderia|quero|gostaria de)[,:]?\s+)?"
+# Most task ids one command may name; a longer list or range gets an explicit "too many" reply
+MAX_TASK_IDS = 100
+
 # Simple patterns for MVP, will be replaced by a proper NLP engine (e.g., Rasa, spaCy + LLM)
 # Order matters: more specific or potentially conflicting patterns should be ordered carefully.
 PATTERNS = {
+    # Bulk commands come first: "remover tarefas 2 a 5" contains "ver tarefas" (list_tasks)
+    "delete_task": re.compile(rf"{COMMAND_START}(apagar|excluir|remover|deletar) tarefas?[:\s]*(?P<task_ids>{TASK_ID_LIST})", re.IGNORECASE),
+    "reschedule_task": re.compile(rf"{COMMAND_START}(adiar|reagendar|remarcar) tarefas?[:\s]*(?P<task_ids>{TASK_ID_LIST})\s+(?:(?:para|pra|em|no dia)\s+)?(?=\S)(?P<date>{DATE})?(?:\s*(?:(?:às|as|@)\s+)?(?P<time>{TIME}))?\s*$", re.IGNORECASE),
     "list_tasks": re.compile(r"(quais minhas tarefas|minhas tarefas|listar tarefas|ver tarefas)(?:\s+(?:de|para)\s+(?P<date>hoje|amanhã))?", re.IGNORECASE),
     "list_reminders": re.compile(r"(quais meus lembretes|meus lembretes|ver lembretes|lembretes de hoje|consultar lembretes)(?:\s+(?:de|para)\s+(?P<date>hoje|amanhã))?", re.IGNORECASE),
-    "complete_task": re.compile(r"(marcar tarefa|concluir tarefa|tarefa concluída|finalizar tarefa)[:\s]*(?P<task_id>\d+)(?:\s+como concluída)?", re.IGNORECASE),
+    # \b keeps "remarcar tarefa 3" (reschedule) from completing task 3
+    "complete_task": re.compile(rf"\b(marcar tarefas?|concluir tarefas?|tarefas? concluídas?|finalizar tarefas?)[:\s]*(?P<task_ids>{TASK_ID_LIST})(?:\s+como concluídas?)?", re.IGNORECASE),
     # Add task is placed after list_tasks to avoid "tarefas de hoje" (list) being caught by "tarefa" (add)
     "add_task": re.compile(r"(lembrar de|adicionar tarefa|anotar|lembrete|tarefa)[:\s]*(?P<description>.+?)(?:\s+(?:(?:para|em|no dia)\s+)?(?P<date>amanhã|hoje|\d{1,2}[-/]\d{1,2}(?:[-/]\d{2,4})?))?(?:\s+(?:(?:às|as|@)\s+)?(?P<time>\d{1,2}(?:[:hH]\d{2})?))?$", re.IGNORECASE),
+    # Continues the last paginated list; the whole message must be the command
+    "more": re.compile(r"^(?:ver )?mais\??$", re.IGNORECASE),
     "opt_in_yes": re.compile(r"\b(sim|s|aceito|concordo)\b", re.IGNORECASE),
     "opt_in_no": re.compile(r"\b(não|nao|n|recuso|negar)\b", re.IGNORECASE),
     "help": re.compile(r"\b(ajuda|comandos|o que você faz\??)\b", re.IGNORECASE),
 }
 
+# Cues each pattern needs in order to match: a necessary condition, never a sufficient one. The message is
+# case-folded once; substring cues are plain `in` checks and word cues (patterns wrapped in \b...\b) are
+# looked up in the message's set of \w+ tokens. Only intents with a cue present run their full regex, still
+# in PATTERNS order, so results are identical to trying every pattern.
+# Substring cues are grouped under a stem that each of them contains, so most messages cost one check per stem.
+SUBSTRING_CUES = [
+    # (stem, intents, [(longer cue containing the stem, intents)])
+    ("tarefa", ("add_task",), [
+        ("tarefas", ("list_tasks",)),
+        ("marcar tarefa", ("complete_task",)),
+        ("concluir tarefa", ("complete_task",)),
+        ("tarefa concluída", ("complete_task",)),
+        ("tarefas concluída", ("complete_task",)),
+        ("finalizar tarefa", ("complete_task",)),
+        ("apagar tarefa", ("delete_task",)),
+        ("excluir tarefa", ("delete_task",)),
+        ("remover tarefa", ("delete_task",)),
+        ("deletar tarefa", ("delete_task",)),
+        ("adiar tarefa", ("reschedule_task",)),
+        ("reagendar tarefa", ("reschedule_task",)),
+        ("remarcar tarefa", ("reschedule_task",)),
+    ]),
+    ("lembre", (), [
+        ("lembrete", ("add_task",)),
+        ("lembretes", ("list_reminders",)),
+    ]),
+    ("lembrar de", ("add_task",), []),
+    ("anotar", ("add_task",), []),
+    ("o que você faz", ("help",), []),
+    ("mais", ("more",), []),
+]
+WORD_CUES = {
+    "sim": "opt_in_yes", "s": "opt_in_yes", "aceito": "opt_in_yes", "concordo": "opt_in_yes",
+    "não": "opt_in_no", "nao": "opt_in_no", "n": "opt_in_no", "recuso": "opt_in_no", "negar": "opt_in_no",
+    "ajuda": "help", "comandos": "help",
+}
+_WORD_CUE_TOKENS = frozenset(WORD_CUES)
+_WORD = re.compile(r"\w+")
+# Characters re.IGNORECASE matches to an ASCII letter but str.lower() does not map to it
+_IGNORECASE_FOLD_FIXES = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s"})
+
+_WORD_CUE_INTENTS = frozenset(WORD_CUES.values())
+
+def _fold(message_text: str):
+    if not message_text.isascii():
+        message_text = message_text.translate(_IGNORECASE_FOLD_FIXES)
+    return message_text.lower()
+
+def _substring_candidates(lowered: str):
+    candidates = set()
+    for stem, intents, refinements in SUBSTRING_CUES:
+        if stem in lowered:
+            candidates.update(intents)
+            for cue, cue_intents in refinements:
+                if cue in lowered:
+                    candidates.update(cue_intents)
+    return candidates
+
+def _word_candidates(lowered: str):
+    return {WORD_CUES[token] for token in _WORD_CUE_TOKENS.intersection(_WORD.findall(lowered))}
+
+def candidate_intents(message_text: str):
+    """Intents whose cue appears in the message."""
+    lowered = _fold(message_text)
+    return _substring_candidates(lowered) | _word_candidates(lowered)
+
+def match_intent(message_text: str):
+    """Returns (intent, match) for the first pattern in PATTERNS order that matches, or (None, None)."""
+    lowered = _fold(message_text)
+    candidates = _substring_candidates(lowered)
+    words_checked = False
+    for intent, pattern in PATTERNS.items():
+        if not words_checked and intent in _WORD_CUE_INTENTS:
+            # Tokenizing is only worth it once every substring-cued pattern before this one has failed
+            candidates |= _word_candidates(lowered)
+            words_checked = True
+        if intent in candidates:
+            match = pattern.search(message_text)
+            if match:
+                return intent, match
+    return None, None
+
+_TASK_ID_TOKEN = re.compile(r"\d+|-|\b(?:a|até)\b", re.IGNORECASE)
+
+def parse_task_ids(text: str):
+    """Expands a TASK_ID_LIST match into a tuple of distinct ids in the order given; None past MAX_TASK_IDS."""
+    task_ids = []
+    in_range = False
+    for token in _TASK_ID_TOKEN.findall(text):
+        if not token.isdigit():
+            in_range = True
+            continue
+        task_id = int(token)
+        if in_range and task_ids:
+            start = task_ids[-1]
+            if abs(task_id - start) + len(task_ids) > MAX_TASK_IDS:
+                return None
+            step = 1 if task_id >= start else -1
+            task_ids.extend(range(start + step, task_id + step, step))
+        else:
+            task_ids.append(task_id)
+        in_range = False
+    task_ids = tuple(dict.fromkeys(task_ids))
+    return task_ids if len(task_ids) <= MAX_TASK_IDS else None
+
 def parse_datetime_from_text(date_str, time_str):
-    """Rudimentary date/time parser for MVP."""
+    """Rudimentary date/time parser for MVP. Returns "%Y-%m-%d %H:%M:%S"; see resolve_due_date."""
+    return resolve_due_date(date_str, time_str).strftime("%Y-%m-%d %H:%M:%S")
+
+def resolve_due_date(date_str, time_str):
+    """Resolves the raw date/time tokens of a message against today. Returns a datetime."""
     now = datetime.now()
     parsed_date = now # Default to today
 
@@ -49,50 +178,85 @@ def parse_datetime_from_text(date_str, time_str):
         except ValueError:
             pass # Invalid time format
     
-    final_datetime = parsed_date.replace(hour=parsed_time_hour, minute=parsed_time_minute, second=0, microsecond=0)
-    return final_datetime.strftime("%Y-%m-%d %H:%M:%S")
+    return parsed_date.replace(hour=parsed_time_hour, minute=parsed_time_minute, second=0, microsecond=0)
+
+def normalize_message_text(message_text: str):
+    """Collapses runs of whitespace and strips the ends; matching always runs on this form."""
+    return " ".join(message_text.split())
+
+def interpret_message(message_text: str):
+    """Returns (intent, entities) with relative dates left as the raw tokens, so the result never goes stale."""
+    intent, match = match_intent(message_text)
+    if match:
+        entities = match.groupdict()
+
+        if intent == "add_task":
+            description = (entities.get("description") or "").strip()
+            if not description:
+                return "clarify_add_task", {}
+            return "add_task", {"description": description, "date": entities.get("date"), "time": entities.get("time")}
+
+        if intent == "list_tasks" or intent == "list_reminders":
+            date_entity = entities.get("date")
+            if date_entity:
+                date_filter = date_entity.lower()
+            else:
+                date_filter = "all" # Signify all tasks/reminders if no specific date is mentioned
+            return intent, {"date_filter": date_filter}
+
+        if intent in ("complete_task", "delete_task", "reschedule_task"):
+            task_ids = parse_task_ids(entities["task_ids"])
+            if task_ids is None:
+                return "too_many_task_ids", {}
+            if intent == "reschedule_task":
+                return intent, {"task_ids": task_ids, "date": entities.get("date"), "time": entities.get("time")}
+            return intent, {"task_ids": task_ids}
+
+        if intent in ["more", "opt_in_yes", "opt_in_no", "help"]:
+            return intent, {}
+
+    return "unknown", {}
+
+def resolve_interpretation(intent: str, entities: dict, message_text: str):
+    """Turns an interpret_message result into a typed intent (see app.nlp.intents) for today."""
+    if intent == "add_task":
+        # No explicit date/time defaults to today at 09:00
+        return intents.AddTask(entities["description"], resolve_due_date(entities["date"], entities["time"]))
+    if intent == "list_tasks":
+        return intents.ListTasks(entities["date_filter"])
+    if intent == "list_reminders":
+        return intents.ListReminders(entities["date_filter"])
+    if intent == "complete_task":
+        return intents.CompleteTask(entities["task_ids"])
+    if intent == "delete_task":
+        return intents.DeleteTask(entities["task_ids"])
+    if intent == "reschedule_task":
+        return intents.RescheduleTask(entities["task_ids"], resolve_due_date(entities["date"], entities["time"]))
+    if intent in _FIELDLESS_INTENTS:
+        return _FIELDLESS_INTENTS[intent]
+    return intents.Unknown(message_text)
+
+_FIELDLESS_INTENTS = {
+    "clarify_add_task": intents.CLARIFY_ADD_TASK,
+    "too_many_task_ids": intents.TOO_MANY_TASK_IDS,
+    "more": intents.MORE,
+    "opt_in_yes": intents.OPT_IN_YES,
+    "opt_in_no": intents.OPT_IN_NO,
+    "help": intents.HELP,
+}
+
+def parse_intent(message_text: str):
+    """Processes a user message into a typed intent object."""
+    normalized_text = normalize_message_text(message_text)
+    interpretation = nlp_cache.get(normalized_text)
+    if interpretation is None:
+        interpretation = interpret_message(normalized_text)
+        nlp_cache.put(normalized_text, *interpretation)
+    return resolve_interpretation(*interpretation, message_text)
 
 def process_message_nlp(message_text: str):
-    """Processes a user message and extracts intent and entities."""
-    
-    for intent, pattern in PATTERNS.items():
-        match = pattern.search(message_text)
-        if match:
-            entities = match.groupdict()
-            
-            if intent == "add_task":
-                description = entities.get("description", "").strip()
-                if not description:
-                    return {"intent": "clarify_add_task", "entities": {}}
-                
-                date_entity = entities.get("date")
-                time_entity = entities.get("time")
-
-                due_date_str_for_task_manager = None # Initialize
-                if date_entity or time_entity:
-                    due_date_str_for_task_manager = parse_datetime_from_text(date_entity, time_entity)
-                else: # No explicit date/time from regex, default to today
-                    due_date_str_for_task_manager = parse_datetime_from_text(None, None) # Defaults to today at 09:00
-                
-                return {"intent": "add_task", "entities": {"description": description, "due_date": due_date_str_for_task_manager}}
-            
-            if intent == "list_tasks" or intent == "list_reminders":
-                date_entity = entities.get("date")
-                if date_entity:
-                    date_filter = date_entity.lower()
-                else:
-                    date_filter = "all" # Signify all tasks/reminders if no specific date is mentioned
-                return {"intent": intent, "entities": {"date_filter": date_filter}}
-                
-            if intent == "complete_task":
-                task_id = entities.get("task_id")
-                if task_id:
-                    return {"intent": "complete_task", "entities": {"task_id": int(task_id)}}
-            
-            if intent in ["opt_in_yes", "opt_in_no", "help"]:
-                 return {"intent": intent, "entities": {}}
-
-    return {"intent": "unknown", "entities": {"original_message": message_text}}
+    """Processes a user message and extracts intent and entities (dict form of parse_intent)."""
+    return parse_intent(message_text).to_dict()
 
 # Example Usage (for testing)
 if __name__ == "__main__":
@@ -111,6 +275,9 @@ if __name__ == "__main__":
         "Quais meus lembretes de hoje?",
         "ver lembretes para amanhã",
         "marcar tarefa 123 como concluída",
+        "concluir tarefas 3, 4, 7 e 9",
+        "apagar tarefas 10 a 12",
+        "adiar tarefas 5, 6 para amanhã às 10h",
         "Sim",
         "Não quero",
         "ajuda",
@@ -0,0 +1,69 @@
+# benchmarks/bench_add_task_path.py
+#
+# End-to-end add_task path (NLP -> task_manager.create_task -> reply text): the dict/string round trip it
+# used to take vs. the typed intent carrying a datetime. Runs against an in-memory SQLite database.
+# Run: python -m benchmarks.bench_add_task_path
+
+import argparse
+import time
+from datetime import datetime
+
+from app.db.database import initialize_database, get_engine, get_session_local, create_db_and_tables
+initialize_database("sqlite+pysqlite:///:memory:")
+
+from app.core import task_manager
+from app.nlp import processor
+from app.nlp.cache import nlp_cache
+from benchmarks.nlp_corpus import ADD_TASKS
+
+def add_task_via_strings(db, user, message_text):
+    """The previous path: due date formatted by the NLP layer, then parsed by create_task and by the reply."""
+    nlp_result = processor.process_message_nlp(message_text)
+    description, due_date = nlp_result["entities"]["description"], nlp_result["entities"]["due_date"]
+    task_manager.create_task(db, user, description, due_date_str=due_date, commit=False)
+    return f"Tarefa '{description}' adicionada! para {datetime.strptime(due_date, '%Y-%m-%d %H:%M:%S').strftime('%d/%m/%Y %H:%M')}."
+
+def add_task_typed(db, user, message_text):
+    parsed_intent = processor.parse_intent(message_text)
+    task_manager.create_task(db, user, parsed_intent.description, due_date=parsed_intent.due_date, commit=False)
+    return f"Tarefa '{parsed_intent.description}' adicionada! para {parsed_intent.due_date.strftime('%d/%m/%Y %H:%M')}."
+
+def _rate(fn, user, messages, repeat, flush_every):
+    best = float("inf")
+    for _ in range(repeat):
+        db = get_session_local()()
+        start = time.perf_counter()
+        for i, message_text in enumerate(messages, 1):
+            fn(db, user, message_text)
+            if i % flush_every == 0:
+                db.flush()
+        db.flush()
+        best = min(best, time.perf_counter() - start)
+        db.rollback()
+        db.close()
+    return len(messages) / best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--flush-every", type=int, default=50, help="Tasks inserted per flush (a webhook batch)")
+    args = parser.parse_args()
+
+    create_db_and_tables(get_engine())
+    with get_session_local()() as db:
+        user_id = task_manager.create_user(db, "whatsapp:+5500000000001", "whatsapp:+5500000000001").id
+    messages = (ADD_TASKS * (args.messages // len(ADD_TASKS) + 1))[:args.messages]
+
+    for label, use_cache in [("NLP cache off", False), ("NLP cache on", True)]:
+        maxsize = nlp_cache.maxsize
+        if not use_cache:
+            nlp_cache.maxsize = 0
+        nlp_cache.clear()
+        strings = _rate(add_task_via_strings, user_id, messages, args.repeat, args.flush_every)
+        typed = _rate(add_task_typed, user_id, messages, args.repeat, args.flush_every)
+        nlp_cache.maxsize = maxsize
+        print(f"{label:<14} string round trip {strings:>9,.0f} tasks/s   typed intent {typed:>9,.0f} tasks/s  ({typed / strings:.2f}x)")
+
+if __name__ == "__main__":
+    main()
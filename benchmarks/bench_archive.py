@@ -0,0 +1,125 @@
+# benchmarks/bench_archive.py
+#
+# Hot-query latency as the tasks table ages. For each history length, a scratch SQLite file (WAL) gets --users
+# users with --pending pending tasks each plus --finished-per-day completed tasks for every day of history.
+# The hot queries are timed, then the archiver moves everything finished more than --after-days ago to
+# tasks_archive in batches and they are timed again. Also reports how long the archiving took and the longest
+# single batch, which is the longest a request writer could wait on it.
+# Run: python -m benchmarks.bench_archive
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app.core import archive, task_manager
+from app.core.archive import TaskArchiver
+from app.db.database import initialize_database, get_engine, get_session_local
+from app.db.migrations import migrate_database
+from app.models import models
+
+def fill(session_factory, args, history_days: int):
+    now, utc_now = datetime.now(), datetime.utcnow()
+    with session_factory() as db:
+        db.execute(insert(models.User), [
+            {"whatsapp_id": f"55{i:011d}", "phone_number": f"55{i:011d}", "opt_in_status": True} for i in range(args.users)
+        ])
+        owner_ids = list(db.scalars(select(models.User.id)))
+        for owner_id in owner_ids:
+            rows = [{"owner_id": owner_id, "description": f"pendente {n}", "status": "pending",
+                     "due_date": now + timedelta(hours=n * 7)} for n in range(args.pending)]
+            for day in range(history_days):
+                finished_at = utc_now - timedelta(days=day, hours=1)
+                rows.extend({"owner_id": owner_id, "description": f"feita {day}.{n}", "status": "completed",
+                             "due_date": finished_at, "updated_at": finished_at} for n in range(args.finished_per_day))
+            db.execute(insert(models.Task), rows)
+        db.commit()
+    return owner_ids
+
+def hot_queries(session_factory, owner_ids, args):
+    """Mean microseconds per call of each hot query, over --lookups random users."""
+    scheduler_window = (datetime.now() - timedelta(minutes=5), datetime.now() + timedelta(minutes=15))
+    queries = {
+        "first page": lambda db, owner_id: task_manager.get_task_page(db, owner_id, limit=20),
+        "today's reminders": lambda db, owner_id: task_manager.get_pending_reminders_for_today(db, owner_id),
+        "all pending": lambda db, owner_id: task_manager.get_tasks_by_user(db, owner_id),
+        "scheduler window": lambda db, owner_id: db.execute(select(models.Task.id).where(
+            models.Task.status == "pending", models.Task.reminded_at == None,
+            models.Task.due_date >= scheduler_window[0], models.Task.due_date < scheduler_window[1])).all(),
+    }
+    rng = random.Random(7)
+    sample = [rng.choice(owner_ids) for _ in range(args.lookups)]
+    results = {}
+    with session_factory() as db:
+        for label, query in queries.items():
+            for owner_id in sample[:50]: # Warm the page cache
+                query(db, owner_id)
+            start = time.perf_counter()
+            for owner_id in sample:
+                query(db, owner_id)
+                db.expunge_all()
+            results[label] = (time.perf_counter() - start) / len(sample) * 1e6
+    return results
+
+def count_rows(session_factory, model):
+    with session_factory() as db:
+        return db.scalar(select(func.count()).select_from(model))
+
+def timed(archive_batch, batch_times):
+    def run(db, cutoff, limit):
+        start = time.perf_counter()
+        moved = archive_batch(db, cutoff, limit)
+        batch_times.append(time.perf_counter() - start)
+        return moved
+    return run
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--pending", type=int, default=20)
+    parser.add_argument("--finished-per-day", type=int, default=3)
+    parser.add_argument("--history-days", type=int, nargs="+", default=[30, 180, 365, 730])
+    parser.add_argument("--after-days", type=float, default=30)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    print(f"{args.users} users x {args.pending} pending tasks, {args.finished_per_day} finished per user per day; "
+          f"archiving after {args.after_days:g} days in batches of {args.batch_size}")
+
+    for history_days in args.history_days:
+        with tempfile.TemporaryDirectory(prefix="bench_archive_") as workdir:
+            initialize_database(f"sqlite:///{os.path.join(workdir, 'tasks.db')}", profile="production")
+            migrate_database(get_engine())
+            session_factory = get_session_local()
+            try:
+                owner_ids = fill(session_factory, args, history_days)
+                rows_before = count_rows(session_factory, models.Task)
+                before = hot_queries(session_factory, owner_ids, args)
+
+                batch_times = []
+                archiver = TaskArchiver(session_factory, after_days=args.after_days, batch_size=args.batch_size, pause_seconds=0)
+                original_batch = archive.archive_batch
+                archive.archive_batch = timed(original_batch, batch_times)
+                try:
+                    start = time.perf_counter()
+                    moved = asyncio.run(archiver.run_once())
+                    archive_seconds = time.perf_counter() - start
+                finally:
+                    archive.archive_batch = original_batch
+                after = hot_queries(session_factory, owner_ids, args)
+                rows_after = count_rows(session_factory, models.Task)
+            finally:
+                get_engine().dispose()
+
+        print(f"\n{history_days} days of history: tasks {rows_before:,} -> {rows_after:,} rows "
+              f"({moved:,} archived in {archive_seconds:.2f} s, longest batch {max(batch_times) * 1000:.1f} ms)")
+        for label in before:
+            print(f"  {label:<18} {before[label]:>8.1f} us -> {after[label]:>8.1f} us  ({before[label] / after[label]:4.2f}x)")
+
+if __name__ == "__main__":
+    main()
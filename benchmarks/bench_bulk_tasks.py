@@ -0,0 +1,84 @@
+# benchmarks/bench_bulk_tasks.py
+#
+# Completing and deleting N tasks of one user: the per-task loop (update_task_status / delete_task for each
+# id, one transaction) vs. the set-based update_task_statuses / delete_tasks (one owner-scoped statement with
+# RETURNING). Reports SQL statements and wall time per operation, against a scratch SQLite file.
+# Run: python -m benchmarks.bench_bulk_tasks
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+
+from app.core import metrics, task_manager
+from app.db.database import initialize_database, get_engine, get_session_local
+from app.db.migrations import migrate_database
+from app.models import models
+
+def fill_tasks(session_factory, user_id: int, count: int):
+    due_date = datetime.now() + timedelta(days=1)
+    with session_factory() as db:
+        db.execute(update(models.Task).values(status="pending"))
+        missing = count - db.query(models.Task).count()
+        if missing > 0:
+            db.execute(insert(models.Task), [
+                {"owner_id": user_id, "description": f"tarefa {i}", "due_date": due_date, "status": "pending"}
+                for i in range(missing)
+            ])
+        db.commit()
+        return [task_id for (task_id,) in db.query(models.Task.id).order_by(models.Task.id).limit(count)]
+
+def complete_loop(db, task_ids, user_id):
+    for task_id in task_ids:
+        task_manager.update_task_status(db, task_id, user_id, "completed", commit=False)
+
+def complete_bulk(db, task_ids, user_id):
+    task_manager.update_task_statuses(db, task_ids, user_id, "completed", commit=False)
+
+def delete_loop(db, task_ids, user_id):
+    for task_id in task_ids:
+        task_manager.delete_task(db, task_id, user_id, commit=False)
+
+def delete_bulk(db, task_ids, user_id):
+    task_manager.delete_tasks(db, task_ids, user_id, commit=False)
+
+def measure(session_factory, fn, user_id: int, size: int, repeat: int):
+    best, queries = float("inf"), 0
+    for _ in range(repeat):
+        task_ids = fill_tasks(session_factory, user_id, size)
+        with session_factory() as db:
+            with metrics.count_queries() as counter:
+                start = time.perf_counter()
+                fn(db, task_ids, user_id)
+                db.commit()
+                best = min(best, time.perf_counter() - start)
+            queries = counter.count
+    return best, queries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_bulk_tasks_") as workdir:
+        initialize_database(f"sqlite:///{os.path.join(workdir, 'tasks.db')}", profile="production")
+        migrate_database(get_engine())
+        session_factory = get_session_local()
+        with session_factory() as db:
+            user_id = task_manager.create_user(db, "whatsapp:+5500000000001", "whatsapp:+5500000000001").id
+        try:
+            for operation, loop, bulk in (("complete", complete_loop, complete_bulk), ("delete", delete_loop, delete_bulk)):
+                for size in args.sizes:
+                    loop_time, loop_queries = measure(session_factory, loop, user_id, size, args.repeat)
+                    bulk_time, bulk_queries = measure(session_factory, bulk, user_id, size, args.repeat)
+                    print(f"{operation:<8} {size:>5} tasks  per-task loop {loop_queries:>5} queries {loop_time * 1000:>8.2f} ms   "
+                          f"bulk {bulk_queries:>2} queries {bulk_time * 1000:>7.2f} ms  ({loop_time / bulk_time:5.1f}x)")
+        finally:
+            get_engine().dispose()
+
+if __name__ == "__main__":
+    main()
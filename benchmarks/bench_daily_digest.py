@@ -0,0 +1,118 @@
+# benchmarks/bench_daily_digest.py
+#
+# Building the morning digest for every opted-in user of a scratch SQLite file (WAL): per-user
+# get_pending_reminders_for_today calls (N+1 queries), the single digest query fetched whole with .all(), and
+# the same query streamed with yield_per as app.core.digest does. Every mode renders the messages and writes
+# them to the outbox in batches. Reports wall time (untraced run) and peak Python memory (tracemalloc run).
+# Run: python -m benchmarks.bench_daily_digest
+
+import argparse
+import gc
+import itertools
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from app.core import digest, outbox, renderer, task_manager
+from app.db.database import initialize_database, get_engine, get_session_local
+from app.db.migrations import migrate_database
+from app.models import models
+
+def fill(session_factory, users: int, tasks_per_user: int, day: date):
+    day_start = datetime.combine(day, datetime.min.time())
+    with session_factory() as db:
+        db.execute(insert(models.User), [
+            {"whatsapp_id": f"55{i:011d}", "phone_number": f"55{i:011d}", "opt_in_status": i % 10 != 0} # 90% opted in
+            for i in range(users)
+        ])
+        owner_ids = list(db.scalars(select(models.User.id)))
+        for start in range(0, len(owner_ids), 10_000):
+            db.execute(insert(models.Task), [
+                {"owner_id": owner_id, "description": f"tarefa {n} do usuário {owner_id}", "status": "pending",
+                 "due_date": day_start + timedelta(hours=7 + n * 3, days=(n == tasks_per_user))} # One for tomorrow
+                for owner_id in owner_ids[start:start + 10_000] for n in range(tasks_per_user + 1)
+            ])
+        db.commit()
+
+def enqueue_groups(groups, session_factory, batch_size: int):
+    """The batching of digest.enqueue_daily_digest, for any (whatsapp_id, tasks) iterable."""
+    outgoing = []
+    users = 0
+    for whatsapp_id, tasks in groups:
+        outgoing.append((whatsapp_id, renderer.render_daily_digest(tasks)))
+        users += 1
+        if len(outgoing) >= batch_size:
+            with session_factory() as write_db:
+                outbox.enqueue(write_db, outgoing)
+                write_db.commit()
+            outgoing = []
+    if outgoing:
+        with session_factory() as write_db:
+            outbox.enqueue(write_db, outgoing)
+            write_db.commit()
+    return users
+
+def per_user_queries(read_db, session_factory, day, args):
+    users = read_db.execute(select(models.User.id, models.User.whatsapp_id).where(models.User.opt_in_status == True)).all()
+    groups = ((whatsapp_id, tasks) for user_id, whatsapp_id in users
+              if (tasks := task_manager.get_pending_reminders_for_today(read_db, user_id)))
+    return enqueue_groups(groups, session_factory, args.batch_size)
+
+def one_query_fetch_all(read_db, session_factory, day, args):
+    rows = read_db.execute(digest.digest_query(day)).all()
+    groups = ((tasks[0].whatsapp_id, tasks) for tasks in
+              (list(group) for _, group in itertools.groupby(rows, key=lambda row: row.owner_id)))
+    return enqueue_groups(groups, session_factory, args.batch_size)
+
+def one_query_streamed(read_db, session_factory, day, args):
+    return digest.enqueue_daily_digest(read_db, session_factory, day, args.batch_size, args.yield_per)[0]
+
+def run(session_factory, fn, day, args, traced: bool):
+    with session_factory() as db:
+        db.execute(delete(models.OutboxMessage))
+        db.commit()
+    gc.collect()
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with session_factory() as read_db:
+        users = fn(read_db, session_factory, day, args)
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if traced:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return users, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--tasks-per-user", type=int, default=3, help="Due on the digest day (plus one the next day)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--yield-per", type=int, default=2000)
+    args = parser.parse_args()
+    day = date.today()
+
+    with tempfile.TemporaryDirectory(prefix="bench_daily_digest_") as workdir:
+        initialize_database(f"sqlite:///{os.path.join(workdir, 'digest.db')}", profile="production")
+        migrate_database(get_engine())
+        session_factory = get_session_local()
+        fill(session_factory, args.users, args.tasks_per_user, day)
+        print(f"{args.users:,} users (90% opted in), {args.tasks_per_user} tasks each today; "
+              f"outbox batches of {args.batch_size}, yield_per={args.yield_per}")
+        try:
+            for label, fn in (("per-user queries (N+1)", per_user_queries), ("one query, .all()", one_query_fetch_all),
+                              ("one query, yield_per", one_query_streamed)):
+                users, elapsed, _ = run(session_factory, fn, day, args, traced=False)
+                _, _, peak = run(session_factory, fn, day, args, traced=True)
+                print(f"{label:<24} {users:>8,} digests  {elapsed:6.2f} s  {users / elapsed:>8,.0f} users/s  "
+                      f"peak {peak / 2**20:7.1f} MiB")
+        finally:
+            get_engine().dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/bench_db_modes.py
+#
+# Concurrent webhook throughput with DB_SESSION_MODE=sync (Session on the event loop) vs. async (AsyncSession
+# on aiosqlite), driving the FastAPI app in-process against a SQLite file and the fake Graph API. Also reports
+# the worst event loop stall seen by a 1 ms ticker: in sync mode every query stalls every other request.
+# Run: python -m benchmarks.bench_db_modes
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+tmp_dir = tempfile.mkdtemp(prefix="bench_db_modes_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+
+import httpx
+
+from app import main as app_main
+from app.core import task_manager
+from app.db import database
+from app.gateway import whatsapp_handler
+from benchmarks.fake_graph_api import start_fake_graph_api
+
+def webhook_payload(whatsapp_id: str, text: str, message_id: str):
+    return {"object": "whatsapp_business_account", "entry": [{"id": "BENCH", "changes": [{"field": "messages", "value": {
+        "messaging_product": "whatsapp",
+        "messages": [{"from": whatsapp_id, "id": message_id, "timestamp": "1678886400", "type": "text", "text": {"body": text}}],
+    }}]}]}
+
+def seed_users(count: int):
+    with database.get_session_local()() as db:
+        for i in range(count):
+            user = task_manager.create_user(db, f"55110000{i:05d}", f"55110000{i:05d}", commit=False)
+            user.opt_in_status = True
+        db.commit()
+
+async def loop_lag_probe(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        samples.append(time.perf_counter() - start - 0.001)
+
+async def run_mode(mode: str, requests_total: int, concurrency: int, users: int):
+    app_main.DB_SESSION_MODE = mode
+    database.DB_SESSION_MODE = mode
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, lag_samples = [], []
+    stop = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_main.app), base_url="http://bench") as client:
+        async def one(i):
+            text = "Minhas tarefas" if i % 4 == 3 else f"Lembrar de tarefa {i} do benchmark"
+            payload = webhook_payload(f"55110000{i % users:05d}", text, f"wamid.{mode}.{i}")
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/webhook", json=payload)
+                latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+
+        probe = asyncio.create_task(loop_lag_probe(stop, lag_samples))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()): # The webhook still prints every payload
+            await asyncio.gather(*(one(i) for i in range(requests_total)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe
+    await whatsapp_handler.close_async_client()
+    await database.dispose_async_engine()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{mode:<6} {requests_total / elapsed:>8.1f} req/s   p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   "
+          f"max loop stall {max(lag_samples, default=0) * 1000:6.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated Graph API latency")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_graph_api(latency_ms=args.latency_ms)
+    whatsapp_handler.SIMULATE_WHATSAPP_MESSAGES = False
+    whatsapp_handler.WHATSAPP_API_URL = f"{base_url}/FAKE_PHONE_NUMBER_ID/messages"
+    database.create_db_and_tables(database.get_engine())
+    seed_users(args.users)
+    print(f"{args.requests} webhooks, concurrency {args.concurrency}, {database.get_engine().url}")
+    try:
+        for mode in ("sync", "async"):
+            asyncio.run(run_mode(mode, args.requests, args.concurrency, args.users))
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
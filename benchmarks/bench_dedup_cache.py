@@ -0,0 +1,47 @@
+# benchmarks/bench_dedup_cache.py
+#
+# Fast-path cost of the in-process dedup cache at millions of stored ids.
+# Run: python -m benchmarks.bench_dedup_cache --sizes 1000000 3000000
+
+import argparse
+import random
+import resource
+import time
+
+from app.core.dedup import RecentIdCache
+
+def _ns_per_op(fn, keys):
+    start = time.perf_counter_ns()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter_ns() - start) / len(keys)
+
+def bench(size: int, lookups: int):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cache = RecentIdCache(maxsize=size, ttl_seconds=86400)
+    start = time.perf_counter()
+    for i in range(size):
+        cache.add(f"wamid.HBgN{i:020d}")
+    fill_s = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    hit_keys = [f"wamid.HBgN{random.randrange(size):020d}" for _ in range(lookups)]
+    miss_keys = [f"wamid.MISS{i:020d}" for i in range(lookups)]
+    contains = cache.__contains__
+    hit_ns = _ns_per_op(contains, hit_keys)
+    miss_ns = _ns_per_op(contains, miss_keys)
+    # Steady state: every insert also evicts the oldest id
+    add_ns = _ns_per_op(cache.add, [f"wamid.NEW{i:020d}" for i in range(lookups)])
+    print(f"{size:>10,} ids  fill {fill_s:6.2f} s  hit {hit_ns:6.0f} ns  miss {miss_ns:6.0f} ns  "
+          f"add+evict {add_ns:6.0f} ns  ~{(rss_after - rss_before) / 1024:,.0f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 3_000_000])
+    parser.add_argument("--lookups", type=int, default=200_000)
+    args = parser.parse_args()
+    for size in args.sizes:
+        bench(size, args.lookups)
+
+if __name__ == "__main__":
+    main()
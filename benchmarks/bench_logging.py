@@ -0,0 +1,57 @@
+# benchmarks/bench_logging.py
+#
+# Per-webhook logging cost on the request path: the old print(json.dumps(payload, indent=2)) vs. the queued
+# logging subsystem at INFO, at DEBUG with 1% payload sampling, and in production mode. Output goes to
+# /dev/null so only the caller's cost is measured.
+# Run: python -m benchmarks.bench_logging
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import time
+from unittest.mock import patch
+
+from app.core import log
+
+def webhook_payload(whatsapp_id: str, text: str, message_id: str):
+    return {"object": "whatsapp_business_account", "entry": [{"id": "BENCH", "changes": [{"field": "messages", "value": {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "BENCH", "phone_number_id": "BENCH"},
+        "contacts": [{"profile": {"name": "Bench"}, "wa_id": whatsapp_id}],
+        "messages": [{"from": whatsapp_id, "id": message_id, "timestamp": "1678886400", "type": "text", "text": {"body": text}}],
+    }}]}]}
+
+def _us_per_call(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=20_000)
+    args = parser.parse_args()
+    payload = webhook_payload("5511999999999", "Lembrar de pagar a conta de luz amanhã às 10:00", "wamid.bench")
+    logger = logging.getLogger("app.main")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        def print_payload(i):
+            print(f"Received payload: {json.dumps(payload, indent=2)}")
+        old = _us_per_call(print_payload, args.calls)
+
+        results = []
+        for label, level, env, rate in [("INFO", "INFO", "development", 0.01), ("DEBUG, 1% sampled", "DEBUG", "development", 0.01),
+                                        ("DEBUG, every payload", "DEBUG", "development", 1.0), ("production, DEBUG", "DEBUG", "production", 1.0)]:
+            log.configure_logging(level=level, log_format="json", handler=logging.StreamHandler(devnull))
+            with patch.object(log, "APP_ENV", env):
+                results.append((label, _us_per_call(lambda i: log.log_payload(logger, "Received payload", payload, sample_rate=rate), args.calls)))
+            log.stop_logging()
+
+    print(f"print(json.dumps(indent=2))    {old:8.2f} us/webhook")
+    for label, cost in results:
+        print(f"log_payload, {label:<20} {cost:8.2f} us/webhook  ({old / cost:,.0f}x less)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_metrics.py
+#
+# Cost of the per-stage instrumentation on the message path: apply_message_batch (dedup, NLP, task_manager,
+# commit) with METRICS_ENABLED on vs. off, the cost of one record call, and the cost of a /metrics scrape.
+# Runs against an in-memory SQLite database.
+# Run: python -m benchmarks.bench_metrics
+
+import argparse
+import itertools
+import time
+from unittest.mock import patch
+
+from app.db.database import initialize_database, get_engine, get_session_local, create_db_and_tables, Base
+initialize_database("sqlite+pysqlite:///:memory:")
+
+from app.core import metrics, pipeline, task_manager
+from benchmarks.nlp_corpus import SHORT_COMMANDS, ADD_TASKS
+
+message_ids = itertools.count(1)
+
+def _batch(whatsapp_id, texts):
+    return [{"whatsapp_id": whatsapp_id, "phone_number": whatsapp_id, "text": text, "message_id": f"bench.{next(message_ids)}",
+             "timestamp": "1678886400"} for text in texts]
+
+def _fresh_user(whatsapp_id):
+    """Recreates the schema so every run starts from the same (empty) task list."""
+    Base.metadata.drop_all(bind=get_engine())
+    create_db_and_tables(get_engine())
+    with get_session_local()() as db:
+        user = task_manager.create_user(db, whatsapp_id, whatsapp_id)
+        task_manager.update_user_opt_in(db, user, True)
+    task_manager.user_cache.clear()
+
+def _elapsed(whatsapp_id, texts, batch_size):
+    _fresh_user(whatsapp_id)
+    batches = [_batch(whatsapp_id, texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    start = time.perf_counter()
+    for messages in batches:
+        with get_session_local()() as db:
+            pipeline.apply_message_batch(db, messages)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    whatsapp_id = "whatsapp:+5500000000001"
+    corpus = [text for text in SHORT_COMMANDS + ADD_TASKS if "mais" not in text.lower()]
+    texts = (corpus * (args.messages // len(corpus) + 1))[:args.messages]
+
+    # Runs alternate so drift on a shared machine affects both sides alike
+    best = {False: float("inf"), True: float("inf")}
+    for _ in range(args.repeat):
+        for enabled in (False, True):
+            with patch.object(metrics, "enabled", enabled):
+                best[enabled] = min(best[enabled], _elapsed(whatsapp_id, texts, args.batch_size))
+    disabled, enabled = len(texts) / best[False], len(texts) / best[True]
+    print(f"apply_message_batch, metrics off  {disabled:>9,.0f} msg/s")
+    print(f"apply_message_batch, metrics on   {enabled:>9,.0f} msg/s  ({(best[True] / best[False] - 1) * 100:+.1f}% time per message)")
+
+    calls = 200_000
+    start = time.perf_counter()
+    for _ in range(calls):
+        metrics.observe_stage("nlp", start, "add_task")
+    per_observe = (time.perf_counter() - start) / calls * 1e6
+    with patch.object(metrics, "enabled", False):
+        start = time.perf_counter()
+        for _ in range(calls):
+            metrics.observe_stage("nlp", start, "add_task")
+        per_disabled = (time.perf_counter() - start) / calls * 1e6
+    print(f"observe_stage                     {per_observe:9.3f} us on, {per_disabled:.3f} us off")
+
+    start = time.perf_counter()
+    body = metrics.render_prometheus()
+    print(f"/metrics scrape                   {(time.perf_counter() - start) * 1e3:9.2f} ms for {body.count(chr(10)):,} lines")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_nlp_intents.py
+#
+# Messages/sec of intent matching: the sequential PATTERNS loop vs. the cue-prefiltered matcher, and
+# process_message_nlp with and without the result cache.
+# Run: python -m benchmarks.bench_nlp_intents
+
+import argparse
+import time
+
+from app.nlp.processor import PATTERNS, match_intent, process_message_nlp
+from app.nlp.cache import nlp_cache
+from benchmarks.nlp_corpus import build_corpus, SHORT_COMMANDS, ADD_TASKS, FREE_TEXT
+
+def match_intent_sequentially(message_text):
+    """Matching as process_message_nlp did it before the prefilter."""
+    for intent, pattern in PATTERNS.items():
+        match = pattern.search(message_text)
+        if match:
+            return intent, match
+    return None, None
+
+def _rate(fn, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in corpus:
+            fn(message)
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    corpus = build_corpus(args.messages)
+
+    for message in set(corpus):
+        before, after = match_intent_sequentially(message), match_intent(message)
+        assert before[0] == after[0] and (before[1] and before[1].groupdict()) == (after[1] and after[1].groupdict()), message
+
+    sequential = _rate(match_intent_sequentially, corpus, args.repeat)
+    prefiltered = _rate(match_intent, corpus, args.repeat)
+    print(f"{len(corpus):,} messages")
+    print(f"sequential PATTERNS loop   {sequential:>12,.0f} msg/s")
+    print(f"cue prefilter              {prefiltered:>12,.0f} msg/s  ({prefiltered / sequential:.2f}x)")
+    maxsize = nlp_cache.maxsize
+    nlp_cache.maxsize = 0
+    uncached = _rate(process_message_nlp, corpus, args.repeat)
+    nlp_cache.maxsize = maxsize
+    nlp_cache.clear()
+    cached = _rate(process_message_nlp, corpus, args.repeat)
+    print(f"process_message_nlp        {uncached:>12,.0f} msg/s  (no result cache)")
+    print(f"process_message_nlp        {cached:>12,.0f} msg/s  (result cache, {nlp_cache.stats()['hit_rate']:.0%} hits)")
+    for label, messages in [("short commands", SHORT_COMMANDS), ("task additions", ADD_TASKS), ("free text", FREE_TEXT)]:
+        group = messages * (2000 // len(messages))
+        before, after = _rate(match_intent_sequentially, group, args.repeat), _rate(match_intent, group, args.repeat)
+        print(f"  {label:<16} {before:>10,.0f} -> {after:>10,.0f} msg/s  ({after / before:.2f}x)")
+
+if __name__ == "__main__":
+    main()
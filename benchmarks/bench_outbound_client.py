@@ -0,0 +1,69 @@
+# benchmarks/bench_outbound_client.py
+#
+# Compares the blocking `requests` send path with the pooled async client
+# against a local fake Graph API. Run: python -m benchmarks.bench_outbound_client
+
+import argparse
+import asyncio
+import time
+
+from app.gateway import whatsapp_handler
+from benchmarks.fake_graph_api import start_fake_graph_api
+
+def _report(label: str, latencies: list, elapsed: float):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{label:<28} {len(latencies) / elapsed:>9.1f} msg/s   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+async def _timed(coro_fn, *args):
+    start = time.perf_counter()
+    result = await coro_fn(*args)
+    assert result["status"] == "success", result
+    return time.perf_counter() - start
+
+async def bench_requests_on_event_loop(n: int, concurrency: int):
+    """Current path: blocking requests.post inside async handlers, so handlers serialize."""
+    async def one(i):
+        start = time.perf_counter()
+        result = whatsapp_handler.send_whatsapp_message(f"5511{i:08d}", "benchmark")
+        assert result["status"] == "success", result
+        return time.perf_counter() - start
+    semaphore = asyncio.Semaphore(concurrency)
+    async def bounded(i):
+        async with semaphore:
+            return await one(i)
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(bounded(i) for i in range(n)))
+    return latencies, time.perf_counter() - start
+
+async def bench_async_pooled(n: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    async def bounded(i):
+        async with semaphore:
+            return await _timed(whatsapp_handler.send_whatsapp_message_async, f"5511{i:08d}", "benchmark")
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(bounded(i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+    await whatsapp_handler.close_async_client()
+    return latencies, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated Graph API latency")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_graph_api(latency_ms=args.latency_ms)
+    whatsapp_handler.SIMULATE_WHATSAPP_MESSAGES = False
+    whatsapp_handler.WHATSAPP_API_URL = f"{base_url}/FAKE_PHONE_NUMBER_ID/messages"
+    print(f"{args.messages} sends, concurrency {args.concurrency}, server latency {args.latency_ms} ms")
+    try:
+        _report("requests (blocking)", *asyncio.run(bench_requests_on_event_loop(args.messages, args.concurrency)))
+        _report("httpx async pooled", *asyncio.run(bench_async_pooled(args.messages, args.concurrency)))
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/bench_outbound_limits.py
+#
+# A reminder fan-out (several texts for each of many recipients at once) against a fake Graph API that enforces
+# a per-number throughput limit: direct concurrent sends vs. the OutboundDispatcher (token buckets, coalescing,
+# 429 backoff). Reports API calls, 429s, texts lost and how long the fan-out took.
+# Run: python -m benchmarks.bench_outbound_limits
+
+import argparse
+import asyncio
+import time
+
+from app.gateway import whatsapp_handler, outbound
+from benchmarks.fake_graph_api import start_fake_graph_api
+from config.settings import WHATSAPP_HTTP_MAX_CONNECTIONS
+
+def _fan_out(recipients: int, per_recipient: int):
+    return {f"55119{i:08d}": [f"Lembrete {j + 1}: tarefa da lista" for j in range(per_recipient)] for i in range(recipients)}
+
+async def direct(fan_out: dict):
+    """Every text sent as soon as it is due, as many at once as the client's connection pool allows."""
+    pool = asyncio.Semaphore(WHATSAPP_HTTP_MAX_CONNECTIONS)
+    async def send(to, text):
+        async with pool:
+            return await whatsapp_handler.send_whatsapp_message_async(to, text)
+    results = await asyncio.gather(*(send(to, text) for to, texts in fan_out.items() for text in texts))
+    await whatsapp_handler.close_async_client()
+    return [result["status"] for result in results]
+
+async def dispatched(fan_out: dict):
+    outbound.start_outbound_dispatcher() # OUTBOUND_* settings
+    try:
+        results = await asyncio.gather(*(outbound.send_messages(to, texts) for to, texts in fan_out.items()))
+    finally:
+        await outbound.stop_outbound_dispatcher()
+        await whatsapp_handler.close_async_client()
+    return [result["status"] for per_recipient in results for result in per_recipient]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipients", type=int, default=300)
+    parser.add_argument("--per-recipient", type=int, default=3)
+    parser.add_argument("--api-rate-limit", type=float, default=80.0, help="Messages/s the fake Graph API accepts")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    fan_out = _fan_out(args.recipients, args.per_recipient)
+    texts = args.recipients * args.per_recipient
+    whatsapp_handler.SIMULATE_WHATSAPP_MESSAGES = False
+    print(f"{texts:,} texts to {args.recipients:,} recipients, API limit {args.api_rate_limit:g} msg/s, latency {args.latency_ms:g} ms")
+
+    for label in ("direct sends", "outbound dispatcher"):
+        server, base_url = start_fake_graph_api(latency_ms=args.latency_ms, rate_limit=args.api_rate_limit)
+        whatsapp_handler.WHATSAPP_API_URL = f"{base_url}/FAKE_PHONE_NUMBER_ID/messages"
+        start = time.perf_counter()
+        try:
+            if label == "direct sends":
+                statuses = asyncio.run(direct(fan_out))
+                delivered = statuses.count("success")
+            else:
+                statuses = asyncio.run(dispatched(fan_out))
+                delivered = texts if all(status == "success" for status in statuses) else None
+            elapsed = time.perf_counter() - start
+            api = server.stats()
+        finally:
+            server.shutdown()
+        calls = api["sent"] + api["rate_limited"]
+        lost = texts - delivered if delivered is not None else "?"
+        print(f"{label:<20} {calls:>6,} API calls  {api['rate_limited']:>5,} x 429  {lost:>5,} texts lost  {elapsed:6.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_outbox.py
+#
+# Several OutboxSender workers draining one outbox table (a scratch SQLite file in WAL mode) against the fake
+# Graph API, which fails every send for the first --outage-seconds. Run with and without the circuit breaker:
+# reports the sends wasted on the failing API, how long the drain took and how many messages went out twice
+# (there should be none: each batch is claimed by exactly one worker).
+# Run: python -m benchmarks.bench_outbox
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from sqlalchemy import func, select
+
+from app.core import outbox
+from app.core.outbox import OutboxSender, CircuitBreaker
+from app.db.database import initialize_database, get_engine, get_session_local
+from app.db.migrations import migrate_database
+from app.gateway import whatsapp_handler
+from app.models import models
+from benchmarks.fake_graph_api import start_fake_graph_api
+
+def fill_outbox(session_factory, messages: int, recipients: int):
+    with session_factory() as db:
+        outbox.enqueue(db, [(f"55119{i % recipients:08d}", f"Mensagem {i}") for i in range(messages)])
+        db.commit()
+
+def outbox_size(session_factory):
+    with session_factory() as db:
+        return db.scalar(select(func.count()).select_from(models.OutboxMessage))
+
+async def drain(session_factory, server, args, breaker_threshold: int):
+    senders = [
+        OutboxSender(session_factory, batch_size=args.batch_size, max_in_flight=args.max_in_flight, poll_seconds=0.05,
+                     max_attempts=100, backoff_base_seconds=0.25, backoff_max_seconds=2.0,
+                     breaker=CircuitBreaker(threshold=breaker_threshold, cooldown_seconds=args.cooldown_seconds))
+        for _ in range(args.workers)
+    ]
+    server.error_rate = 1.0
+    start = time.perf_counter()
+    for sender in senders:
+        sender.start()
+    try:
+        outage_calls = None
+        while outbox_size(session_factory):
+            if outage_calls is None and time.perf_counter() - start >= args.outage_seconds:
+                server.error_rate = 0.0
+                outage_calls = server.stats()["failed"]
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+    finally:
+        for sender in senders:
+            await sender.stop()
+        await whatsapp_handler.close_async_client()
+    opened = sum(sender.breaker.times_opened for sender in senders)
+    return elapsed, outage_calls if outage_calls is not None else server.stats()["failed"], opened
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--recipients", type=int, default=250)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--max-in-flight", type=int, default=2)
+    parser.add_argument("--outage-seconds", type=float, default=10.0)
+    parser.add_argument("--cooldown-seconds", type=float, default=1.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    whatsapp_handler.SIMULATE_WHATSAPP_MESSAGES = False
+    for noisy in ("app.gateway.whatsapp_handler", "app.core.outbox"): # One warning per failed send / breaker change
+        logging.getLogger(noisy).setLevel(logging.ERROR)
+    print(f"{args.messages:,} messages, {args.workers} workers x {args.max_in_flight} batches of {args.batch_size}, "
+          f"API failing for the first {args.outage_seconds:g} s")
+
+    for label, threshold in (("no breaker", 0), ("circuit breaker", 5)):
+        with tempfile.TemporaryDirectory(prefix="bench_outbox_") as workdir:
+            initialize_database(f"sqlite:///{os.path.join(workdir, 'outbox.db')}", profile="production")
+            migrate_database(get_engine())
+            session_factory = get_session_local()
+            fill_outbox(session_factory, args.messages, args.recipients)
+            server, base_url = start_fake_graph_api(latency_ms=args.latency_ms)
+            whatsapp_handler.WHATSAPP_API_URL = f"{base_url}/FAKE_PHONE_NUMBER_ID/messages"
+            try:
+                elapsed, outage_calls, opened = asyncio.run(drain(session_factory, server, args, threshold))
+                api = server.stats()
+            finally:
+                server.shutdown()
+                get_engine().dispose()
+        duplicates = api["sent"] - args.messages
+        print(f"{label:<16} {outage_calls:>6,} sends during the outage  {api['failed']:>6,} failed in total  "
+              f"breaker opened {opened:>3}x  drained in {elapsed:5.2f} s  {duplicates} sent twice")
+
+if __name__ == "__main__":
+    main()
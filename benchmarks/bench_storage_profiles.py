@@ -0,0 +1,99 @@
+# benchmarks/bench_storage_profiles.py
+#
+# Write-heavy concurrency per storage profile: writer threads commit one small transaction each (a task plus
+# its processed_messages row, like a webhook) while reader threads list tasks. Each profile gets a fresh
+# SQLite file unless --database-url points at a server database.
+# Run: python -m benchmarks.bench_storage_profiles
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, select, delete
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base, STORAGE_PROFILES, engine_options, apply_storage_profile
+from app.models import models
+
+def make_engine(url: str, profile: str):
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    options = engine_options(url, profile)
+    connect_args.update(options.pop("connect_args", {}))
+    engine = create_engine(url, connect_args=connect_args, **options)
+    apply_storage_profile(engine, profile)
+    return engine
+
+def bench(url: str, profile: str, writers: int, readers: int, seconds: float):
+    engine = make_engine(url, profile)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.execute(delete(models.Task))
+        db.execute(delete(models.ProcessedMessage))
+        user = db.scalar(select(models.User).where(models.User.whatsapp_id == "bench"))
+        if user is None:
+            user = models.User(whatsapp_id="bench", phone_number="bench", opt_in_status=True)
+            db.add(user)
+        db.commit()
+        user_id = user.id
+
+    counts = {"commits": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def writer(n):
+        i = 0
+        while time.perf_counter() < stop_at:
+            i += 1
+            try:
+                with Session() as db:
+                    db.add(models.Task(description=f"tarefa {n}-{i}", owner_id=user_id, status="pending"))
+                    db.add(models.ProcessedMessage(message_id=f"{profile}-{n}-{i}"))
+                    db.commit()
+                key = "commits"
+            except OperationalError: # "database is locked"
+                key = "errors"
+            with lock:
+                counts[key] += 1
+
+    def reader():
+        while time.perf_counter() < stop_at:
+            try:
+                with Session() as db:
+                    db.scalars(select(models.Task).where(models.Task.owner_id == user_id, models.Task.status == "pending")
+                               .order_by(models.Task.due_date, models.Task.id).limit(20)).all()
+                key = "reads"
+            except OperationalError:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    print(f"{profile:<11} {counts['commits'] / seconds:>9,.0f} commits/s  {counts['reads'] / seconds:>9,.0f} reads/s  "
+          f"{counts['errors']:>5} lock errors")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=None, help="Server database to use instead of fresh SQLite files")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:.0f} s per profile")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for profile in STORAGE_PROFILES:
+            url = args.database_url or f"sqlite:///{os.path.join(tmp_dir, profile + '.db')}"
+            bench(url, profile, args.writers, args.readers, args.seconds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# benchmarks/bench_timing_wheel.py
+#
+# Insert / cancel / fire cost of the reminder TimingWheel with hundreds of thousands of pending timers.
+# Run: python -m benchmarks.bench_timing_wheel --timers 500000
+
+import argparse
+import random
+import time
+
+from app.core.scheduler import TimingWheel
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--timers", type=int, default=500_000)
+    parser.add_argument("--horizon", type=int, default=900, help="Wheel horizon in seconds (1 s ticks)")
+    parser.add_argument("--spread", type=int, default=86_400, help="Due times are spread over this many seconds")
+    parser.add_argument("--cancel-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    start_ts = 1_700_000_000
+    wheel = TimingWheel(tick_seconds=1, slots=args.horizon + 1, now=start_ts)
+    due_times = [start_ts + random.uniform(1, args.spread) for _ in range(args.timers)]
+
+    t0 = time.perf_counter()
+    for task_id, due_ts in enumerate(due_times):
+        wheel.schedule(task_id, due_ts)
+    insert_s = time.perf_counter() - t0
+
+    to_cancel = random.sample(range(args.timers), int(args.timers * args.cancel_ratio))
+    t0 = time.perf_counter()
+    for task_id in to_cancel:
+        wheel.cancel(task_id)
+    cancel_s = time.perf_counter() - t0
+
+    fired = 0
+    ticks = 0
+    t0 = time.perf_counter()
+    for now in range(start_ts + 1, start_ts + args.spread + 2):
+        fired += len(wheel.advance(now))
+        ticks += 1
+    fire_s = time.perf_counter() - t0
+
+    print(f"{args.timers:,} timers over {args.spread:,} s, horizon {args.horizon} s")
+    print(f"insert  {insert_s / args.timers * 1e9:8.0f} ns/timer")
+    print(f"cancel  {cancel_s / max(len(to_cancel), 1) * 1e9:8.0f} ns/timer")
+    print(f"fire    {fire_s / max(fired, 1) * 1e9:8.0f} ns/timer ({fired:,} fired, {ticks:,} ticks, "
+          f"{fire_s / ticks * 1e6:.1f} us/tick incl. empty ticks)")
+    assert fired == args.timers - len(to_cancel)
+
+if __name__ == "__main__":
+    main()
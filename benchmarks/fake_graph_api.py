@@ -0,0 +1,147 @@
+# benchmarks/fake_graph_api.py
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal stand-in for POST /<version>/<phone_number_id>/messages on the Meta Graph API.
+# It speaks HTTP/1.1 with keep-alive so pooled clients can reuse connections, records what it was sent
+# (GET /stats), and can add latency (a base plus uniform jitter), fail a fraction of sends, and enforce a
+# per-number throughput limit the way Meta does (429 with error code 130429 past rate_limit messages/s).
+
+class FakeGraphAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        server = self.server
+        with server.lock:
+            delay = server.latency_s + (server.random.uniform(0, server.jitter_s) if server.jitter_s else 0.0)
+            inject_error = server.error_rate > 0 and server.random.random() < server.error_rate
+            over_limit = not inject_error and not server.take_rate_token()
+        if delay:
+            time.sleep(delay)
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            self._reply(400, {"error": {"message": "Invalid JSON"}})
+            return
+        if over_limit:
+            with server.lock:
+                server.rate_limited_count += 1
+            self._reply(429, {"error": {"message": "Rate limit hit", "code": 130429}}, {"Retry-After": "1"})
+            return
+        if inject_error:
+            with server.lock:
+                server.failed_count += 1
+            headers = {"Retry-After": "1"} if server.error_status == 429 else {}
+            self._reply(server.error_status, {"error": {"message": "Injected failure", "code": server.error_status}}, headers)
+            return
+        message_id = f"wamid.FAKE{next(server.message_ids)}"
+        with server.lock:
+            server.sent_count += 1
+            server.recipients[payload.get("to")] += 1
+            server.recent.append({"to": payload.get("to"), "body": (payload.get("text") or {}).get("body")})
+        self._reply(200, {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": payload.get("to"), "wa_id": payload.get("to")}],
+            "messages": [{"id": message_id}],
+        })
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._reply(200, self.server.stats())
+        else:
+            self._reply(404, {"error": {"message": "Not found"}})
+
+    def _reply(self, status: int, data: dict, headers: dict = None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output clean
+
+class FakeGraphAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # Accept bursts of new pooled connections without resets
+
+    def take_rate_token(self):
+        """Token bucket with rate and burst of rate_limit messages/s; call with the lock held."""
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        self.rate_tokens = min(self.rate_limit, self.rate_tokens + (now - self.rate_updated) * self.rate_limit)
+        self.rate_updated = now
+        if self.rate_tokens >= 1:
+            self.rate_tokens -= 1
+            return True
+        return False
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sent": self.sent_count,
+                "failed": self.failed_count,
+                "rate_limited": self.rate_limited_count,
+                "recipients": len(self.recipients),
+                "recent": list(self.recent),
+            }
+
+def start_fake_graph_api(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                         error_rate: float = 0.0, error_status: int = 500, record_limit: int = 100, seed: int = None,
+                         rate_limit: float = 0.0):
+    """Starts the fake Graph API in a daemon thread. Returns (server, base_url).
+
+    Each send waits latency_ms plus up to jitter_ms; a fraction error_rate of sends is answered with
+    error_status (429 responses carry Retry-After). With rate_limit, sends past that many per second get 429.
+    The last record_limit accepted sends are kept.
+    """
+    server = FakeGraphAPIServer((host, port), FakeGraphAPIHandler)
+    server.latency_s = latency_ms / 1000.0
+    server.jitter_s = jitter_ms / 1000.0
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.random = random.Random(seed)
+    server.message_ids = itertools.count(1)
+    server.lock = threading.Lock()
+    server.sent_count = 0
+    server.failed_count = 0
+    server.rate_limit = rate_limit
+    server.rate_tokens = rate_limit
+    server.rate_updated = time.monotonic()
+    server.rate_limited_count = 0
+    server.recipients = Counter()
+    server.recent = deque(maxlen=record_limit)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}/v17.0"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake Graph API for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of sends answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Messages/s accepted before answering 429")
+    args = parser.parse_args()
+    server, base_url = start_fake_graph_api(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.error_status,
+                                            rate_limit=args.rate_limit)
+    print(f"Fake Graph API listening on {base_url} (set WHATSAPP_API_BASE_URL to use it)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,275 @@
+# benchmarks/load_webhook.py
+#
+# Webhook load test: many users, a production-like mix of intents (benchmarks/nlp_corpus.py) and batched
+# deliveries, POSTed concurrently to a running app. Reports throughput and p50/p95/p99 latency, the HTTP
+# statuses seen, what the Graph API received and the app's own per-stage timings from /metrics.
+#
+# Offline, one command: starts the fake Graph API (with optional latency/error injection), a scratch SQLite
+# database and the app under uvicorn with sends pointed at the fake, then runs the load against it.
+# Run: python -m benchmarks.load_webhook
+#      python -m benchmarks.load_webhook --api-latency-ms 50 --api-error-rate 0.05 --app-env INGESTION_MODE=queue
+# Against an app that is already running (point its WHATSAPP_API_BASE_URL at python -m benchmarks.fake_graph_api):
+#      python -m benchmarks.load_webhook --target http://127.0.0.1:8000
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+from benchmarks.fake_graph_api import start_fake_graph_api
+from benchmarks.nlp_corpus import SHORT_COMMANDS, ADD_TASKS, FREE_TEXT
+
+# (messages, weight): the same 60/25/15 split as nlp_corpus.build_corpus
+TRAFFIC_MIX = [(SHORT_COMMANDS, 60), (ADD_TASKS, 25), (FREE_TEXT, 15)]
+PHONE_NUMBER_ID = "LOADTEST"
+
+def _text_message(whatsapp_id: str, text: str, message_id: str):
+    return {"from": whatsapp_id, "id": message_id, "timestamp": str(int(time.time())), "type": "text", "text": {"body": text}}
+
+def build_delivery(messages: list):
+    """A webhook delivery carrying the given (already built) message objects."""
+    return {"object": "whatsapp_business_account", "entry": [{"id": "LOADTEST", "changes": [{"field": "messages", "value": {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "LOADTEST", "phone_number_id": PHONE_NUMBER_ID},
+        "messages": messages,
+    }}]}]}
+
+class TrafficModel:
+    """Deterministic (seeded) stream of deliveries for one worker's users."""
+
+    def __init__(self, users: list, batch_max: int, seed: int):
+        self.users = users
+        self.batch_max = batch_max
+        self.random = random.Random(seed)
+        self.groups = [messages for messages, _ in TRAFFIC_MIX]
+        self.weights = [weight for _, weight in TRAFFIC_MIX]
+        self.sequence = 0
+
+    def next_text(self):
+        return self.random.choice(self.random.choices(self.groups, self.weights)[0])
+
+    def delivery(self, texts_by_user: dict):
+        messages = []
+        for whatsapp_id, text in texts_by_user.items():
+            self.sequence += 1
+            messages.append(_text_message(whatsapp_id, text, f"wamid.LOAD.{whatsapp_id}.{self.sequence}"))
+        return build_delivery(messages), len(messages)
+
+    def next_delivery(self):
+        # Meta batches messages from different senders; a user never has two messages in one delivery here
+        size = min(len(self.users), self.random.randint(1, self.batch_max))
+        return self.delivery({whatsapp_id: self.next_text() for whatsapp_id in self.random.sample(self.users, size)})
+
+async def run_load(target: str, users: int, deliveries: int, concurrency: int, batch_max: int, seed: int):
+    """Opts every user in (not measured), then sends `deliveries` deliveries from `concurrency` workers.
+
+    Each worker owns a disjoint set of users and waits for each response before its next POST, so a user's
+    messages arrive in order. Returns (latencies, statuses, messages_sent, elapsed).
+    """
+    all_users = [f"55119{i:08d}" for i in range(users)]
+    workers = [TrafficModel(all_users[w::concurrency], batch_max, seed + w) for w in range(concurrency)]
+    workers = [model for model in workers if model.users]
+    latencies, statuses = [], Counter()
+    messages_sent = 0
+
+    async with httpx.AsyncClient(base_url=target, timeout=60.0, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def warm_up(model):
+            for text in ("Oi", "Sim"):
+                for i in range(0, len(model.users), batch_max):
+                    payload, _ = model.delivery({whatsapp_id: text for whatsapp_id in model.users[i:i + batch_max]})
+                    (await client.post("/webhook", json=payload)).raise_for_status()
+        await asyncio.gather(*(warm_up(model) for model in workers))
+
+        async def worker(model, count):
+            nonlocal messages_sent
+            for _ in range(count):
+                payload, size = model.next_delivery()
+                start = time.perf_counter()
+                response = await client.post("/webhook", json=payload)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] += 1
+                messages_sent += size
+
+        per_worker = [deliveries // len(workers) + (1 if w < deliveries % len(workers) else 0) for w in range(len(workers))]
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(model, count) for model, count in zip(workers, per_worker)))
+        elapsed = time.perf_counter() - start
+    return latencies, statuses, messages_sent, elapsed
+
+def percentile(sorted_values: list, q: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))]
+
+_SAMPLE = re.compile(r'^whatsapp_stage_duration_seconds_(sum|count)\{stage="([^"]*)",intent="[^"]*"\} (\S+)$')
+
+def stage_means(metrics_text: str):
+    """Mean seconds per stage (all intents together) from a /metrics scrape."""
+    totals = defaultdict(lambda: [0.0, 0])
+    for line in metrics_text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            totals[stage][0 if kind == "sum" else 1] += float(value)
+    return {stage: total / count for stage, (total, count) in totals.items() if count}
+
+def wait_for_sends_to_settle(get_stats, timeout: float, quiet_seconds: float = 1.0):
+    """Waits until the Graph API has seen no new sends for quiet_seconds (queued ingestion and dispatcher
+    shards keep sending after the last webhook was acknowledged). Returns (stats, seconds waited)."""
+    start = time.monotonic()
+    stats = get_stats()
+    last_change = start
+    while time.monotonic() - start < timeout:
+        time.sleep(0.2)
+        current = get_stats()
+        if (current["sent"], current["failed"]) != (stats["sent"], stats["failed"]):
+            last_change = time.monotonic()
+        stats = current
+        if time.monotonic() - last_change >= quiet_seconds:
+            break
+    return stats, time.monotonic() - start
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_app(port: int, env: dict, log_path: str):
+    """Starts the app under uvicorn in a subprocess and waits until it answers."""
+    log_file = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env}, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode}; see {log_path}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).raise_for_status()
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"App did not start within 30s; see {log_path}")
+
+def prepare_database(db_url: str, opted_in_users=()):
+    """Creates the schema in the scratch database (the app does not create tables on startup) and,
+    optionally, users that have already opted in."""
+    from app.db.database import initialize_database, get_engine
+    from app.db.migrations import migrate_database
+    from app.models import models
+    initialize_database(db_url)
+    migrate_database(get_engine())
+    if opted_in_users:
+        with get_engine().begin() as connection:
+            connection.execute(models.User.__table__.insert(), [
+                {"whatsapp_id": whatsapp_id, "phone_number": whatsapp_id, "opt_in_status": True} for whatsapp_id in opted_in_users
+            ])
+    get_engine().dispose()
+
+def add_local_stack_arguments(parser: argparse.ArgumentParser):
+    """Options for the local fake Graph API and app, shared with benchmarks/replay_capture.py."""
+    parser.add_argument("--target", help="Base URL of a running app; by default one is started locally")
+    parser.add_argument("--api-latency-ms", type=float, default=20.0, help="Fake Graph API latency per send")
+    parser.add_argument("--api-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--api-error-rate", type=float, default=0.0, help="Fraction of sends the fake Graph API fails")
+    parser.add_argument("--api-error-status", type=int, default=500)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="Extra environment for the local app")
+    parser.add_argument("--graph-api-stats", help="Stats URL of an external fake Graph API (with --target)")
+    parser.add_argument("--settle-seconds", type=float, default=30.0, help="Longest wait for outstanding sends after the run")
+    parser.add_argument("--seed", type=int, default=1)
+
+def start_local_stack(args, workdir: str, opted_in_users=()):
+    """Fake Graph API, scratch SQLite database and the app under uvicorn. Returns (server, process, target)."""
+    server, base_url = start_fake_graph_api(latency_ms=args.api_latency_ms, jitter_ms=args.api_jitter_ms,
+                                            error_rate=args.api_error_rate, error_status=args.api_error_status, seed=args.seed)
+    try:
+        db_url = f"sqlite:///{os.path.join(workdir, 'scratch.db')}"
+        prepare_database(db_url, opted_in_users)
+        port = free_port()
+        env = {
+            "DATABASE_URL": db_url,
+            "WHATSAPP_API_BASE_URL": base_url,
+            "WHATSAPP_SIMULATE_SENDS": "false",
+            "WHATSAPP_API_TOKEN": "LOADTEST",
+            "PHONE_NUMBER_ID": PHONE_NUMBER_ID,
+            "LOG_LEVEL": "WARNING",
+            "CAPTURE_ENABLED": "false",
+        }
+        env.update(item.split("=", 1) for item in args.app_env)
+        process = start_app(port, env, os.path.join(workdir, "app.log"))
+    except Exception:
+        server.shutdown()
+        raise
+    return server, process, f"http://127.0.0.1:{port}"
+
+def stop_local_stack(server, process):
+    if process is not None:
+        process.terminate()
+        process.wait(timeout=15)
+    if server is not None:
+        server.shutdown()
+
+def report(latencies: list, statuses: Counter, messages_sent: int, elapsed: float):
+    latencies = sorted(latencies)
+    if not latencies:
+        print("no delivery was answered; HTTP/transport outcomes: " + ", ".join(f"{k}: {v:,}" for k, v in statuses.items()))
+        return
+    print(f"throughput   {len(latencies) / elapsed:>9,.1f} deliveries/s   {messages_sent / elapsed:>9,.1f} messages/s   ({elapsed:.1f} s)")
+    print("latency      " + "   ".join(f"p{q} {percentile(latencies, q) * 1000:8.2f} ms" for q in (50, 95, 99))
+          + f"   max {latencies[-1] * 1000:8.2f} ms")
+    print("HTTP status  " + ", ".join(f"{status}: {count:,}" for status, count in sorted(statuses.items())))
+
+def report_app_side(args, server, target: str):
+    """What the Graph API received (once outstanding sends settle) and the app's per-stage means."""
+    get_stats = server.stats if server is not None else None
+    if get_stats is None and args.graph_api_stats:
+        get_stats = lambda: httpx.get(args.graph_api_stats).json()
+    if get_stats is not None:
+        graph_stats, waited = wait_for_sends_to_settle(get_stats, args.settle_seconds)
+        print(f"Graph API    {graph_stats['sent']:,} sends accepted, {graph_stats['failed']:,} injected failures, "
+              f"{graph_stats['recipients']:,} recipients  (settled {waited:.1f} s after the last delivery)")
+    response = httpx.get(f"{target}/metrics")
+    if response.status_code == 200:
+        means = stage_means(response.text)
+        if means:
+            print("app stages   " + "   ".join(f"{stage} {mean * 1000:.2f} ms" for stage, mean in means.items()) + "  (mean)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--deliveries", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--batch-max", type=int, default=3, help="Most messages in one delivery")
+    add_local_stack_arguments(parser)
+    args = parser.parse_args()
+
+    server = process = None
+    target = args.target
+    workdir = tempfile.TemporaryDirectory(prefix="load_webhook_")
+    try:
+        if target is None:
+            server, process, target = start_local_stack(args, workdir.name)
+        print(f"{args.deliveries:,} deliveries (up to {args.batch_max} messages each) from {args.users:,} users, "
+              f"concurrency {args.concurrency}, against {target}")
+        latencies, statuses, messages_sent, elapsed = asyncio.run(
+            run_load(target, args.users, args.deliveries, args.concurrency, args.batch_max, args.seed))
+        report(latencies, statuses, messages_sent, elapsed)
+        report_app_side(args, server, target)
+    finally:
+        stop_local_stack(server, process)
+        workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
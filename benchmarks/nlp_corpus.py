@@ -0,0 +1,42 @@
+# benchmarks/nlp_corpus.py
+#
+# Realistic mix of incoming Portuguese messages, weighted roughly like production traffic:
+# short commands and confirmations dominate, with a tail of long free-text messages.
+
+SHORT_COMMANDS = [
+    "ajuda", "Ajuda", "sim", "Sim", "não", "Não", "ok", "obrigado", "Oi", "bom dia",
+    "minhas tarefas", "Minhas tarefas de hoje", "minhas tarefas para amanhã", "listar tarefas",
+    "meus lembretes", "Meus lembretes de hoje", "ver lembretes para amanhã",
+    "concluir tarefa 12", "marcar tarefa 7 como concluída", "finalizar tarefa 3",
+]
+
+ADD_TASKS = [
+    "Lembrar de comprar pão amanhã às 8h",
+    "lembrar de pagar o boleto do condomínio dia 10/11 às 9",
+    "adicionar tarefa reunião com cliente para 20/12 às 14:30",
+    "anotar consulta médica dia 25/05/2025 as 10",
+    "tarefa: ligar para o João hoje 17H",
+    "Lembrete buscar as crianças na escola hoje às 17:30",
+    "lembrar de mandar o relatório trimestral revisado para a diretoria e copiar o financeiro amanhã",
+    "Tarefa urgente para agora mesmo",
+]
+
+FREE_TEXT = [
+    "Olá, bom dia! Tudo bem com você? Estou testando o assistente hoje e queria saber como funciona.",
+    "Qual a previsão do tempo para amanhã em São Paulo? Vou viajar cedo e preciso me organizar.",
+    "Ontem esqueci completamente da reunião, você pode me ajudar a não esquecer mais das coisas importantes?",
+    "kkkkkk valeu demais, depois eu vejo isso com calma quando chegar em casa do trabalho",
+    "Preciso reorganizar minha semana inteira porque o projeto atrasou e o cliente pediu mudanças no escopo",
+]
+
+def build_corpus(size: int = 10_000):
+    """Deterministic corpus: 60% short commands, 25% task additions, 15% free text."""
+    corpus = []
+    groups = [(SHORT_COMMANDS, 60), (ADD_TASKS, 25), (FREE_TEXT, 15)]
+    i = 0
+    while len(corpus) < size:
+        for messages, weight in groups:
+            for _ in range(weight):
+                corpus.append(messages[i % len(messages)])
+                i += 1
+    return corpus[:size]
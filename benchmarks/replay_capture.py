@@ -0,0 +1,127 @@
+# benchmarks/replay_capture.py
+#
+# Replays webhook deliveries captured with CAPTURE_ENABLED (app/core/capture.py) against the app: at the
+# original pace, scaled (--speed 4 = four times faster), or as fast as possible (--speed max, bounded by
+# --concurrency). Deliveries go out in captured order and a delivery never overtakes an earlier one from
+# the same sender, so every user sees the same message sequence as in production.
+#
+# By default it runs offline like benchmarks/load_webhook.py: fake Graph API, a scratch SQLite database in
+# which every captured sender already opted in (--no-opt-in to start from empty), and the app under uvicorn.
+# Run: python -m benchmarks.replay_capture ./captures
+#      python -m benchmarks.replay_capture ./captures --speed max --concurrency 32 --app-env DB_SESSION_MODE=async
+
+import argparse
+import asyncio
+import time
+import tempfile
+from collections import Counter
+
+import httpx
+
+from app.core.capture import capture_files, read_capture
+from app.gateway.whatsapp_handler import iter_incoming_whatsapp_messages
+from benchmarks.load_webhook import (add_local_stack_arguments, start_local_stack, stop_local_stack, report,
+                                     report_app_side, percentile)
+
+def parse_speed(value: str):
+    """'original' -> 1.0, 'max' -> None (no pacing), otherwise a positive factor."""
+    if value == "max":
+        return None
+    if value == "original":
+        return 1.0
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive, 'original' or 'max'")
+    return speed
+
+def senders(payload: dict):
+    return {message["whatsapp_id"] for message in iter_incoming_whatsapp_messages(payload)}
+
+async def replay(target: str, records: list, speed: float = None, concurrency: int = 16):
+    """POSTs every (arrival timestamp, payload) record. Returns (latencies, lags, statuses, messages_sent, elapsed).
+
+    With a speed, delivery i is sent (ts_i - ts_0) / speed seconds after the start, whatever is still in
+    flight; `lags` says how far behind that schedule each send went out. Without one, up to `concurrency`
+    deliveries are in flight.
+    """
+    latencies, lags, statuses = [], [], Counter()
+    messages_sent = 0
+    in_flight = asyncio.Semaphore(concurrency) if speed is None else None
+    last_by_sender = {} # whatsapp_id -> task of that sender's latest delivery
+
+    async with httpx.AsyncClient(base_url=target, timeout=60.0, limits=httpx.Limits(max_connections=max(concurrency, 100))) as client:
+        async def send(payload, earlier):
+            nonlocal messages_sent
+            try:
+                if earlier:
+                    await asyncio.gather(*earlier, return_exceptions=True)
+                start = time.perf_counter()
+                response = await client.post("/webhook", json=payload)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] += 1
+                messages_sent += len(list(iter_incoming_whatsapp_messages(payload)))
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            finally:
+                if in_flight is not None:
+                    in_flight.release()
+
+        loop = asyncio.get_running_loop()
+        first_ts = records[0][0]
+        start = loop.time()
+        tasks = []
+        for arrived_at, payload in records:
+            if speed is not None:
+                delay = start + (arrived_at - first_ts) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                lags.append(max(0.0, -delay))
+            else:
+                await in_flight.acquire()
+            payload_senders = senders(payload)
+            earlier = {last_by_sender[s] for s in payload_senders if s in last_by_sender and not last_by_sender[s].done()}
+            task = asyncio.create_task(send(payload, earlier))
+            for sender in payload_senders:
+                last_by_sender[sender] = task
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+    return latencies, lags, statuses, messages_sent, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="Capture directory or a single capture file")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="'original' (default), a factor such as 4, or 'max'")
+    parser.add_argument("--concurrency", type=int, default=16, help="Deliveries in flight with --speed max")
+    parser.add_argument("--limit", type=int, help="Replay only the first N deliveries")
+    parser.add_argument("--no-opt-in", dest="opt_in", action="store_false",
+                        help="Do not pre-create the captured senders as opted-in users in the scratch database")
+    add_local_stack_arguments(parser)
+    args = parser.parse_args()
+
+    records = list(read_capture(capture_files(args.capture)))[:args.limit]
+    if not records:
+        parser.error(f"no captured deliveries in {args.capture}")
+    all_senders = sorted({sender for _, payload in records for sender in senders(payload)})
+    span = records[-1][0] - records[0][0]
+
+    server = process = None
+    target = args.target
+    workdir = tempfile.TemporaryDirectory(prefix="replay_capture_")
+    try:
+        if target is None:
+            server, process, target = start_local_stack(args, workdir.name, all_senders if args.opt_in else ())
+        pace = "max speed" if args.speed is None else f"{args.speed:g}x ({span / args.speed:.1f} s of {span:.1f} s captured)"
+        print(f"Replaying {len(records):,} deliveries from {len(all_senders):,} senders at {pace} against {target}")
+        latencies, lags, statuses, messages_sent, elapsed = asyncio.run(replay(target, records, args.speed, args.concurrency))
+        report(latencies, statuses, messages_sent, elapsed)
+        if lags:
+            lags.sort()
+            print(f"pacing       p99 {percentile(lags, 99) * 1000:.2f} ms behind schedule   max {lags[-1] * 1000:.2f} ms")
+        report_app_side(args, server, target)
+    finally:
+        stop_local_stack(server, process)
+        workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # ia_whatsapp_assistant/config/settings.py
 
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -18,10 +19,138 @@ WHATSAPP_VERIFY_TOKEN = os.getenv("VERIFY_TOKEN")
 # ID do número de telefone do WhatsApp Business (será necessário para enviar mensagens)
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
 
+# Endpoint base da Graph API. Pode ser apontado para um servidor falso local em benchmarks.
+WHATSAPP_API_BASE_URL = os.getenv("WHATSAPP_API_BASE_URL", "https://graph.facebook.com/v17.0")
+# Envio simulado (só registra no log) em vez de chamar a Graph API. Desligue para enviar de verdade ou
+# para testes de carga contra o servidor falso (benchmarks/fake_graph_api.py).
+WHATSAPP_SIMULATE_SENDS = os.getenv("WHATSAPP_SIMULATE_SENDS", "True").lower() in ('true', '1', 't')
+
+# Cliente HTTP de saída (envio de mensagens): tamanho do pool keep-alive e timeouts em segundos.
+WHATSAPP_HTTP_MAX_CONNECTIONS = int(os.getenv("WHATSAPP_HTTP_MAX_CONNECTIONS", "50"))
+WHATSAPP_HTTP_MAX_KEEPALIVE = int(os.getenv("WHATSAPP_HTTP_MAX_KEEPALIVE", "20"))
+WHATSAPP_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("WHATSAPP_HTTP_KEEPALIVE_EXPIRY", "30"))
+WHATSAPP_HTTP_CONNECT_TIMEOUT = float(os.getenv("WHATSAPP_HTTP_CONNECT_TIMEOUT", "3"))
+WHATSAPP_HTTP_TIMEOUT = float(os.getenv("WHATSAPP_HTTP_TIMEOUT", "10"))
+
+# Limite de envio (token bucket): mensagens/s e rajada para o nosso PHONE_NUMBER_ID e para cada destinatário
+# (0 desativa o limite). Respostas para o mesmo destinatário dentro da janela OUTBOUND_COALESCE_WINDOW_MS, ou
+# enquanto o limite dele está esgotado, são juntadas em uma única mensagem. Um 429 da Graph API pausa o envio
+# pelo Retry-After e a mensagem é reenviada até OUTBOUND_MAX_429_RETRIES vezes. O padrão fica abaixo das 80
+# mensagens/s da Graph API para que variações de latência não gerem 429.
+OUTBOUND_NUMBER_RATE = float(os.getenv("OUTBOUND_NUMBER_RATE", "70"))
+OUTBOUND_NUMBER_BURST = float(os.getenv("OUTBOUND_NUMBER_BURST", "35"))
+OUTBOUND_RECIPIENT_RATE = float(os.getenv("OUTBOUND_RECIPIENT_RATE", "1"))
+OUTBOUND_RECIPIENT_BURST = float(os.getenv("OUTBOUND_RECIPIENT_BURST", "5"))
+OUTBOUND_COALESCE_WINDOW_MS = float(os.getenv("OUTBOUND_COALESCE_WINDOW_MS", "100"))
+OUTBOUND_MAX_429_RETRIES = int(os.getenv("OUTBOUND_MAX_429_RETRIES", "3"))
+OUTBOUND_RECIPIENT_BUCKETS = int(os.getenv("OUTBOUND_RECIPIENT_BUCKETS", "10000"))
+
+# Outbox transacional: respostas e lembretes são gravados na tabela outbox_messages na mesma transação da
+# mudança de tarefa e enviados depois por um loop que reivindica lotes de OUTBOX_BATCH_SIZE (vários workers
+# podem drenar a mesma tabela; cada lote fica reservado por OUTBOX_LEASE_SECONDS). Falhas são reenviadas com
+# backoff exponencial (OUTBOX_BACKOFF_BASE_SECONDS dobrando até OUTBOX_BACKOFF_MAX_SECONDS) até
+# OUTBOX_MAX_ATTEMPTS tentativas. Após OUTBOX_BREAKER_THRESHOLD falhas seguidas da Graph API o circuit breaker
+# abre e os envios param por OUTBOX_BREAKER_COOLDOWN_SECONDS, até uma mensagem de teste passar.
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_IN_FLIGHT = int(os.getenv("OUTBOX_MAX_IN_FLIGHT", "8"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "2"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "300"))
+OUTBOX_BREAKER_THRESHOLD = int(os.getenv("OUTBOX_BREAKER_THRESHOLD", "5"))
+OUTBOX_BREAKER_COOLDOWN_SECONDS = float(os.getenv("OUTBOX_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Ingestão do webhook: "inline" processa a mensagem antes de responder; "queue" responde 200
+# imediatamente e os shards do dispatcher processam em segundo plano.
+INGESTION_MODE = os.getenv("INGESTION_MODE", "inline")
+# Dispatcher por usuário: mensagens de um mesmo whatsapp_id caem sempre no mesmo shard e rodam em ordem.
+# Cada shard tem um worker e uma fila limitada. DISPATCH_SHARDS=0 desativa o dispatcher.
+DISPATCH_SHARDS = int(os.getenv("DISPATCH_SHARDS", "8"))
+DISPATCH_SHARD_QUEUE_MAXSIZE = int(os.getenv("DISPATCH_SHARD_QUEUE_MAXSIZE", "200"))
+# Segundos que o webhook espera por espaço na fila antes de responder 503 (backpressure)
+INGESTION_ENQUEUE_TIMEOUT = float(os.getenv("INGESTION_ENQUEUE_TIMEOUT", "0.5"))
+# Segundos para drenar a fila no shutdown
+INGESTION_DRAIN_TIMEOUT = float(os.getenv("INGESTION_DRAIN_TIMEOUT", "10"))
+
+# Deduplicação de reentregas do webhook: cache em memória (tamanho e TTL em segundos) na frente da
+# tabela processed_messages.
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "100000"))
+DEDUP_CACHE_TTL_SECONDS = float(os.getenv("DEDUP_CACHE_TTL_SECONDS", "86400"))
+# Ids em processed_messages são apagados depois de DEDUP_RETENTION_DAYS dias (bem além da janela em que a
+# Meta reentrega um webhook), pelo mesmo laço do arquivamento (ARCHIVE_ENABLED).
+DEDUP_RETENTION_DAYS = float(os.getenv("DEDUP_RETENTION_DAYS", "14"))
+
+# Cache de usuários entre requisições (id e opt-in dos usuários mais ativos), tamanho e TTL em segundos.
+# O TTL limita por quanto tempo outro processo pode enxergar um opt-in desatualizado.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+
+# Cache do bloco "Lembrete Rápido" por usuário e dia: refeito só quando as tarefas do usuário mudam (aviso do
+# task_manager) ou o dia vira. O TTL limita o atraso para mudanças feitas por outro processo.
+REMINDER_BLOCK_CACHE_SIZE = int(os.getenv("REMINDER_BLOCK_CACHE_SIZE", "10000"))
+REMINDER_BLOCK_CACHE_TTL_SECONDS = float(os.getenv("REMINDER_BLOCK_CACHE_TTL_SECONDS", "300"))
+
+# Cache de resultados do NLP por texto normalizado (comandos curtos repetidos não reexecutam as regex).
+# Datas relativas ("hoje", "amanhã") são guardadas como texto e resolvidas a cada consulta. 0 desativa.
+NLP_CACHE_SIZE = int(os.getenv("NLP_CACHE_SIZE", "4096"))
+
+# Respostas com listas: tarefas por página ("mais" mostra a próxima), tamanho máximo de cada mensagem enviada
+# (o WhatsApp rejeita textos acima de 4096 caracteres) e por quanto tempo a posição na lista é lembrada.
+TASK_LIST_PAGE_SIZE = int(os.getenv("TASK_LIST_PAGE_SIZE", "20"))
+WHATSAPP_MAX_TEXT_LENGTH = int(os.getenv("WHATSAPP_MAX_TEXT_LENGTH", "4096"))
+LIST_CURSOR_CACHE_SIZE = int(os.getenv("LIST_CURSOR_CACHE_SIZE", "10000"))
+LIST_CURSOR_TTL_SECONDS = float(os.getenv("LIST_CURSOR_TTL_SECONDS", "1800"))
+
+# Agendador de lembretes: envia o lembrete no horário do due_date. Mantém em memória apenas as tarefas
+# que vencem nos próximos REMINDER_HORIZON_SECONDS e recarrega essa janela a cada REMINDER_REFRESH_SECONDS.
+# Lembretes atrasados até REMINDER_GRACE_SECONDS (ex.: após um restart) ainda são enviados.
+REMINDER_SCHEDULER_ENABLED = os.getenv("REMINDER_SCHEDULER_ENABLED", "True").lower() in ('true', '1', 't')
+REMINDER_TICK_SECONDS = float(os.getenv("REMINDER_TICK_SECONDS", "1"))
+REMINDER_HORIZON_SECONDS = float(os.getenv("REMINDER_HORIZON_SECONDS", "900"))
+REMINDER_REFRESH_SECONDS = float(os.getenv("REMINDER_REFRESH_SECONDS", "60"))
+REMINDER_GRACE_SECONDS = float(os.getenv("REMINDER_GRACE_SECONDS", "300"))
+
+# Resumo diário: às DIGEST_TIME (hora local) cada usuário com opt-in recebe as tarefas pendentes do dia. Uma
+# única consulta é lida em lotes de DIGEST_YIELD_PER linhas; a cada DIGEST_BATCH_SIZE usuários as mensagens
+# são gravadas na outbox e o envio começa, sem esperar o resto.
+DIGEST_ENABLED = os.getenv("DIGEST_ENABLED", "True").lower() in ('true', '1', 't')
+DIGEST_TIME = os.getenv("DIGEST_TIME", "08:00")
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "500"))
+DIGEST_YIELD_PER = int(os.getenv("DIGEST_YIELD_PER", "2000"))
+
+# Arquivamento: tarefas concluídas ou canceladas há mais de ARCHIVE_AFTER_DAYS dias saem de "tasks" para
+# "tasks_archive", em lotes de ARCHIVE_BATCH_SIZE (transações curtas, com ARCHIVE_BATCH_PAUSE_SECONDS entre
+# elas para não segurar o banco), verificadas a cada ARCHIVE_INTERVAL_SECONDS.
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "True").lower() in ('true', '1', 't')
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ARCHIVE_BATCH_PAUSE_SECONDS", "0.1"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
 # URL do Banco de Dados
 # Para o Render, se você não configurar uma variável DATABASE_URL, ele usará o SQLite local.
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ia_whatsapp_assistant.db")
 
+# Modo de acesso ao banco no caminho das requisições: "sync" (Session) ou "async" (AsyncSession com driver
+# assíncrono: aiosqlite para SQLite, asyncpg para Postgres), que não bloqueia o event loop durante as queries.
+DB_SESSION_MODE = os.getenv("DB_SESSION_MODE", "sync").lower()
+
+# Perfil de armazenamento aplicado pelo initialize_database: "default" (padrões do SQLAlchemy) ou "production".
+# Em SQLite, "production" liga WAL e os PRAGMAs abaixo em cada conexão; em bancos servidor (Postgres) define
+# o pool e o cache de statements.
+STORAGE_PROFILE = os.getenv("STORAGE_PROFILE", "production").lower()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "65536"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() in ('true', '1', 't')
+# Statements compilados guardados pelo SQLAlchemy e preparados no servidor (asyncpg/psycopg) por conexão
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
 # Configurações para o motor de PLN (exemplo)
 NLP_MODEL_NAME = "default_pt_br_model"
 
@@ -30,8 +159,32 @@ NLP_MODEL_NAME = "default_pt_br_model"
 DEBUG_MODE_STR = os.getenv("DEBUG", "True") # Padrão para True se não definido
 DEBUG = DEBUG_MODE_STR.lower() in ('true', '1', 't')
 
+# Ambiente: em "production" os payloads completos nunca são serializados nos logs
+APP_ENV = os.getenv("APP_ENV", "development").lower()
+
+# Logs: nível, formato ("json" estruturado ou "text") e fração dos payloads de webhook/envio registrados em DEBUG
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if DEBUG else "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json" if APP_ENV == "production" else "text").lower()
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+# Métricas (latência por etapa, intents, queries por lote, falhas de envio) expostas em GET /metrics no formato
+# do Prometheus. Desligadas, as chamadas de registro retornam imediatamente.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() in ('true', '1', 't')
+
+# Captura opcional das entregas brutas do webhook (para replay com benchmarks/replay_capture.py): NDJSON
+# comprimido com gzip em CAPTURE_DIR, um arquivo novo a cada CAPTURE_ROTATE_MB (descomprimidos), mantendo os
+# CAPTURE_MAX_FILES mais recentes. Com CAPTURE_PSEUDONYMIZE os números de telefone viram pseudônimos estáveis
+# (HMAC com CAPTURE_PSEUDONYMIZE_KEY) e os nomes de perfil são removidos.
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "False").lower() in ('true', '1', 't')
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "./captures")
+CAPTURE_ROTATE_MB = float(os.getenv("CAPTURE_ROTATE_MB", "64"))
+CAPTURE_MAX_FILES = int(os.getenv("CAPTURE_MAX_FILES", "50"))
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "10000"))
+CAPTURE_PSEUDONYMIZE = os.getenv("CAPTURE_PSEUDONYMIZE", "True").lower() in ('true', '1', 't')
+CAPTURE_PSEUDONYMIZE_KEY = os.getenv("CAPTURE_PSEUDONYMIZE_KEY")
+
 # Verificação importante na inicialização (opcional, mas bom para depuração)
 if WHATSAPP_VERIFY_TOKEN is None and not DEBUG: # Em modo não-debug, é crítico
-    print("ALERTA CRÍTICO: A variável de ambiente VERIFY_TOKEN não está configurada!")
+    logging.getLogger(__name__).critical("A variável de ambiente VERIFY_TOKEN não está configurada!")
 elif WHATSAPP_VERIFY_TOKEN is None and DEBUG:
-    print("AVISO DEBUG: A variável de ambiente VERIFY_TOKEN não está configurada. Webhook GET falhará se não for um teste local com valor mockado.")
+    logging.getLogger(__name__).warning("A variável de ambiente VERIFY_TOKEN não está configurada. Webhook GET falhará se não for um teste local com valor mockado.")
@@ -0,0 +1,43 @@
+# tests/helpers.py
+
+import unittest
+
+from app.core.dedup import recent_message_ids
+from app.core.reminder_cache import reminder_block_cache
+from app.core.renderer import list_cursors
+from app.core.user_cache import user_cache
+from app.db.database import get_engine, get_session_local, create_db_and_tables, Base
+from app.nlp.cache import nlp_cache
+
+# Shared test fixtures. Modules that touch the database still call initialize_database(None, is_test_setup=True)
+# before importing this one, so every app module binds to the in-memory test engine.
+
+# Every process-wide cache; their entries point at rows of tables the tests drop and recreate
+IN_PROCESS_CACHES = (user_cache, list_cursors, reminder_block_cache, recent_message_ids, nlp_cache)
+
+def reset_in_process_caches():
+    for cache in IN_PROCESS_CACHES:
+        cache.clear()
+
+def text_message(whatsapp_id, text, message_id):
+    """A parsed inbound text message, as whatsapp_handler hands it to the pipeline."""
+    return {"whatsapp_id": whatsapp_id, "phone_number": whatsapp_id, "text": text, "message_id": message_id, "timestamp": "1678886400"}
+
+class FakeClock:
+    """Stands in for time.monotonic/time.time; tests move it by setting `now`."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class DatabaseTestCase(unittest.TestCase):
+    """Starts each test on empty tables and empty caches."""
+
+    def setUp(self):
+        self.engine = get_engine()
+        Base.metadata.drop_all(bind=self.engine)
+        create_db_and_tables(self.engine)
+        reset_in_process_caches()
+        self.session_factory = get_session_local()
@@ -0,0 +1,106 @@
+# tests/test_archive.py
+
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from app.db.database import initialize_database
+initialize_database(None, is_test_setup=True)
+
+from app.core import archive, task_manager
+from app.core.archive import TaskArchiver
+from app.models import models
+from tests.helpers import DatabaseTestCase
+
+class TestTaskArchive(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = datetime.utcnow()
+        old, recent = self.now - timedelta(days=90), self.now - timedelta(days=1)
+        due = datetime.now()
+        with self.session_factory() as db:
+            user = task_manager.create_user(db, "5511900000801", "5511900000801")
+            self.user_id = user.id
+            self.tasks = {}
+            for name, status, finished_at, due_in_hours in (
+                ("velha concluída", "completed", old, 1),
+                ("velha cancelada", "cancelled", old, 2),
+                ("outra velha", "completed", old, 3),
+                ("recente concluída", "completed", recent, 4),
+                ("pendente antiga", "pending", old, 5),
+            ):
+                task = models.Task(description=name, owner_id=user.id, status=status, updated_at=finished_at,
+                                   due_date=due + timedelta(hours=due_in_hours))
+                db.add(task)
+                db.flush()
+                self.tasks[name] = task.id
+            db.commit()
+
+    def table_ids(self, model):
+        with self.session_factory() as db:
+            return sorted(db.scalars(db.query(model.id).statement))
+
+    def test_batches_move_only_old_finished_tasks(self):
+        cutoff = self.now - timedelta(days=30)
+        with self.session_factory() as db:
+            self.assertEqual(archive.archive_batch(db, cutoff, limit=2), 2) # Bounded
+        with self.session_factory() as db:
+            self.assertEqual(archive.archive_batch(db, cutoff, limit=2), 1)
+        with self.session_factory() as db:
+            self.assertEqual(archive.archive_batch(db, cutoff, limit=2), 0)
+
+        old = sorted(self.tasks[name] for name in ("velha concluída", "velha cancelada", "outra velha"))
+        self.assertEqual(self.table_ids(models.TaskArchive), old) # Original ids are kept
+        self.assertEqual(self.table_ids(models.Task), sorted([self.tasks["recente concluída"], self.tasks["pendente antiga"]]))
+        with self.session_factory() as db:
+            archived = db.get(models.TaskArchive, self.tasks["velha cancelada"])
+            self.assertEqual((archived.description, archived.status, archived.owner_id), ("velha cancelada", "cancelled", self.user_id))
+            self.assertIsNotNone(archived.archived_at)
+
+    def test_history_reads_both_tables(self):
+        asyncio.run(TaskArchiver(self.session_factory, after_days=30, batch_size=1, pause_seconds=0).run_once())
+        self.assertEqual(len(self.table_ids(models.TaskArchive)), 3)
+        with self.session_factory() as db:
+            completed = task_manager.get_tasks_by_user(db, self.user_id, status="completed")
+            self.assertEqual([task.description for task in completed], ["velha concluída", "outra velha", "recente concluída"])
+            # Keyset pages run across the boundary between the tables
+            first, after = task_manager.get_task_page(db, self.user_id, status="completed", limit=2)
+            second, last = task_manager.get_task_page(db, self.user_id, status="completed", after=after, limit=2)
+            self.assertEqual([task.description for task in first + second], ["velha concluída", "outra velha", "recente concluída"])
+            self.assertIsNone(last)
+            # Pending reads never touch the archive
+            self.assertEqual([task.description for task in task_manager.get_tasks_by_user(db, self.user_id)], ["pendente antiga"])
+
+    def test_ids_are_not_reused_after_archiving_the_newest_task(self):
+        with self.session_factory() as db:
+            newest = task_manager.create_task(db, self.user_id, "última", due_date=datetime.now())
+            task_manager.update_task_status(db, newest.id, self.user_id, "completed")
+            db.query(models.Task).filter(models.Task.id == newest.id).update({"updated_at": self.now - timedelta(days=90)})
+            db.commit()
+        cutoff = self.now - timedelta(days=30)
+        with self.session_factory() as db:
+            self.assertEqual(archive.archive_batch(db, cutoff, limit=10), 4) # Including the max-id row
+        with self.session_factory() as db:
+            later = task_manager.create_task(db, self.user_id, "depois", due_date=datetime.now())
+            self.assertGreater(later.id, newest.id)
+            task_manager.update_task_status(db, later.id, self.user_id, "cancelled")
+            db.query(models.Task).filter(models.Task.id == later.id).update({"updated_at": self.now - timedelta(days=90)})
+            db.commit()
+        with self.session_factory() as db:
+            self.assertEqual(archive.archive_batch(db, cutoff, limit=10), 1)
+        self.assertIn(later.id, self.table_ids(models.TaskArchive))
+
+    def test_the_same_loop_prunes_old_processed_message_ids(self):
+        with self.session_factory() as db:
+            for message_id, days_ago in (("wamid.OLD1", 20), ("wamid.OLD2", 15), ("wamid.RECENT", 2)):
+                db.add(models.ProcessedMessage(message_id=message_id, processed_at=self.now - timedelta(days=days_ago)))
+            db.commit()
+        archiver = TaskArchiver(self.session_factory, after_days=30, batch_size=1, pause_seconds=0, dedup_retention_days=14)
+        asyncio.run(archiver.run_once())
+        with self.session_factory() as db:
+            self.assertEqual(list(db.scalars(db.query(models.ProcessedMessage.message_id).statement)), ["wamid.RECENT"])
+        self.assertEqual(archiver.stats()["pruned_message_ids"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# tests/test_async_db.py
+
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, AsyncMock
+
+from app.db.database import initialize_database, get_engine, get_session_local
+initialize_database(None, is_test_setup=True)
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import pipeline, task_manager
+from app.db import database
+from app.models import models
+from tests.helpers import DatabaseTestCase, text_message
+
+class TestAsyncSessionMode(DatabaseTestCase):
+
+    def run_async(self, coroutine_fn):
+        async def run():
+            try:
+                return await coroutine_fn()
+            finally:
+                await database.dispose_async_engine() # The async engine's pool is bound to this event loop
+        return asyncio.run(run())
+
+    def test_async_url_uses_aiosqlite_on_the_same_database(self):
+        url = database.to_async_url(get_engine().url)
+        self.assertEqual(url.drivername, "sqlite+aiosqlite")
+        self.assertEqual(url.database, get_engine().url.database)
+
+    def test_task_manager_async_variants(self):
+        async def scenario():
+            async with database.get_async_session_local()() as db:
+                self.assertIsInstance(db, AsyncSession)
+                user = await task_manager.create_user_async(db, "whatsapp:+550000000300", "whatsapp:+550000000300")
+                await task_manager.update_user_opt_in_async(db, user, True)
+                due_date = datetime.now() + timedelta(hours=1)
+                task = await task_manager.create_task_async(db, user.id, "pagar internet", due_date=due_date)
+                tasks = await task_manager.get_tasks_by_user_async(db, user.id)
+                page, next_after = await task_manager.get_task_page_async(db, user.id, limit=5)
+                completed = await task_manager.update_task_status_async(db, task.id, user.id, "completed")
+                return [t.description for t in tasks], [t.id for t in page], next_after, completed.status
+        descriptions, page_ids, next_after, status = self.run_async(scenario)
+        self.assertEqual(descriptions, ["pagar internet"])
+        self.assertEqual(len(page_ids), 1)
+        self.assertIsNone(next_after)
+        self.assertEqual(status, "completed")
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_message_batch_on_an_async_session(self, mock_send):
+        user = "whatsapp:+550000000301"
+        async def scenario():
+            async with database.get_async_session_local()() as db:
+                await pipeline.process_message_batch(db, [text_message(user, "Oi", "ASYNC_1"), text_message(user, "Sim", "ASYNC_2")])
+                return await pipeline.process_message_batch(db, [
+                    text_message(user, "Lembrar de revisar contrato", "ASYNC_3"), text_message(user, "Minhas tarefas", "ASYNC_4"),
+                ])
+        results = self.run_async(scenario)
+        self.assertEqual([r["intent"] for r in results], ["add_task", "list_tasks"])
+        self.assertIn("revisar contrato", mock_send.call_args.args[1])
+        with get_session_local()() as db:
+            self.assertEqual(db.query(models.Task).filter(models.Task.description == "revisar contrato").count(), 1)
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_dispatcher_job_uses_the_configured_session_mode(self, mock_send):
+        with patch.object(database, "DB_SESSION_MODE", "async"):
+            self.assertIs(database.get_session_factory(), database.get_async_session_local())
+            results = self.run_async(lambda: pipeline.process_message_batch_in_new_session([
+                text_message("whatsapp:+550000000302", "Oi", "ASYNC_5"),
+            ]))
+        self.assertEqual(results[0]["status"], "new_user_prompted_for_opt_in")
+        mock_send.assert_awaited_once()
+
+if __name__ == "__main__":
+    unittest.main()
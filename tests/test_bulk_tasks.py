@@ -0,0 +1,109 @@
+# tests/test_bulk_tasks.py
+
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, AsyncMock
+
+from app.db.database import initialize_database
+initialize_database(None, is_test_setup=True)
+
+from app.core import metrics, pipeline, task_manager
+from app.core.renderer import render_bulk_result
+from app.models import models
+from tests.helpers import DatabaseTestCase, text_message
+
+class TestBulkTaskOperations(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.due = datetime.now() + timedelta(hours=2)
+        with self.session_factory() as db:
+            owner = task_manager.create_user(db, "5511900000401", "5511900000401")
+            task_manager.update_user_opt_in(db, owner, True)
+            other = task_manager.create_user(db, "5511900000402", "5511900000402")
+            self.owner_id, self.other_id = owner.id, other.id
+            tasks = [task_manager.create_task(db, owner.id, f"tarefa {i}", due_date=self.due, commit=False) for i in range(5)]
+            foreign = task_manager.create_task(db, other.id, "de outra pessoa", due_date=self.due, commit=False)
+            db.commit()
+            self.task_ids, self.foreign_id = [task.id for task in tasks], foreign.id
+        self.changes = []
+        task_manager.register_task_listener(self.changes.extend)
+        self.addCleanup(task_manager.unregister_task_listener, self.changes.extend)
+
+    def statuses(self):
+        with self.session_factory() as db:
+            return {task.id: task.status for task in db.query(models.Task)}
+
+    def test_update_is_one_owner_scoped_statement(self):
+        wanted = [self.task_ids[3], self.task_ids[0], self.foreign_id, 9999]
+        with self.session_factory() as db:
+            with metrics.count_queries() as queries:
+                rows = task_manager.update_task_statuses(db, wanted, self.owner_id, "completed", commit=False)
+            db.commit()
+        self.assertEqual(queries.count, 1)
+        self.assertEqual([row.id for row in rows], sorted([self.task_ids[0], self.task_ids[3]]))
+        self.assertTrue(all(row.status == "completed" and row.owner_id == self.owner_id for row in rows))
+        statuses = self.statuses()
+        self.assertEqual(statuses[self.foreign_id], "pending")
+        self.assertEqual(sorted(i for i, status in statuses.items() if status == "completed"), [row.id for row in rows])
+        self.assertEqual([(c.event, c.task_id, c.status) for c in self.changes],
+                         [("updated", row.id, "completed") for row in rows])
+
+    def test_reschedule_moves_only_pending_tasks_and_rearms_reminders(self):
+        with self.session_factory() as db:
+            task_manager.update_task_statuses(db, self.task_ids[:1], self.owner_id, "completed")
+            db.query(models.Task).filter(models.Task.id == self.task_ids[1]).update({"reminded_at": datetime.now()})
+            db.commit()
+        new_due = self.due + timedelta(days=1)
+        with self.session_factory() as db:
+            rows = task_manager.reschedule_tasks(db, self.task_ids[:2] + [self.foreign_id], self.owner_id, new_due)
+        self.assertEqual([(row.id, row.due_date) for row in rows], [(self.task_ids[1], new_due)])
+        with self.session_factory() as db:
+            moved = db.get(models.Task, self.task_ids[1])
+            self.assertEqual((moved.due_date, moved.reminded_at), (new_due, None))
+            self.assertEqual(db.get(models.Task, self.foreign_id).due_date, self.due)
+        self.assertEqual(self.changes[-1].due_date, new_due)
+
+    def test_delete_and_rollback(self):
+        with self.session_factory() as db:
+            task_manager.delete_tasks(db, self.task_ids, self.owner_id, commit=False)
+            db.rollback()
+        self.assertEqual(len(self.statuses()), 6)
+        self.assertEqual(self.changes, []) # Rolled back work is never announced
+        with self.session_factory() as db:
+            rows = task_manager.delete_tasks(db, self.task_ids[1:3] + [self.foreign_id], self.owner_id)
+        self.assertEqual([row.id for row in rows], self.task_ids[1:3])
+        self.assertEqual(set(self.statuses()), set(self.task_ids) - set(self.task_ids[1:3]) | {self.foreign_id})
+        self.assertEqual([c.event for c in self.changes], ["deleted", "deleted"])
+
+    def test_render_bulk_result(self):
+        self.assertEqual(render_bulk_result([7], [7], "marcada como concluída", "marcadas como concluídas"),
+                         "Tarefa 7 marcada como concluída!")
+        self.assertEqual(render_bulk_result([7], [], "apagada", "apagadas"), "Não encontrei a tarefa 7 ou ela não é sua.")
+        self.assertEqual(render_bulk_result([3, 9, 4, 7], [3, 4, 7], "apagada", "apagadas"),
+                         "Tarefas 3, 4 e 7 apagadas! Não encontrei a tarefa 9 ou ela não é sua.")
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_message_completes_a_list_of_tasks(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        ids = ", ".join(str(task_id) for task_id in self.task_ids[:3])
+        with self.session_factory() as db:
+            asyncio.run(pipeline.process_message_batch(db, [
+                text_message("5511900000401", f"concluir tarefas {ids}, {self.foreign_id}", "BULK_1")]))
+        reply = mock_send.call_args.args[1]
+        self.assertIn(f"Tarefas {self.task_ids[0]}, {self.task_ids[1]} e {self.task_ids[2]} marcadas como concluídas!", reply)
+        self.assertIn(f"Não encontrei a tarefa {self.foreign_id}", reply)
+        statuses = self.statuses()
+        self.assertEqual([statuses[i] for i in self.task_ids], ["completed"] * 3 + ["pending"] * 2)
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_too_many_ids_get_an_explicit_reply(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        with self.session_factory() as db:
+            asyncio.run(pipeline.process_message_batch(db, [text_message("5511900000401", "concluir tarefas 1 a 500", "BULK_2")]))
+        self.assertIn("no máximo 100 tarefas por mensagem", mock_send.call_args.args[1])
+        self.assertEqual(set(self.statuses().values()), {"pending"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# tests/test_capture.py
+
+import gzip
+import tempfile
+import unittest
+
+from app.core.capture import TrafficCapture, Pseudonymizer, capture_files, read_capture
+from app.gateway.whatsapp_handler import parse_incoming_whatsapp_messages
+
+def delivery(whatsapp_id: str, text: str, message_id: str):
+    return {"object": "whatsapp_business_account", "entry": [{"id": "WABA", "changes": [{"field": "messages", "value": {
+        "messaging_product": "whatsapp",
+        "contacts": [{"profile": {"name": "Maria Silva"}, "wa_id": whatsapp_id}],
+        "messages": [{"from": whatsapp_id, "id": message_id, "timestamp": "1678886400", "type": "text", "text": {"body": text}}],
+    }}]}]}
+
+class TestTrafficCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def capture(self, **options):
+        capture = TrafficCapture(directory=self.directory.name, **{"pseudonymize": False, **options})
+        capture.start()
+        return capture
+
+    def test_deliveries_round_trip_with_arrival_times(self):
+        capture = self.capture()
+        payloads = [delivery("5511999990001", f"mensagem {i}", f"wamid.{i}") for i in range(5)]
+        for i, payload in enumerate(payloads):
+            capture.record(payload, arrived_at=1000.0 + i)
+        capture.stop()
+        [path] = capture_files(self.directory.name)
+        self.assertTrue(path.endswith(".ndjson.gz"))
+        self.assertEqual(list(read_capture([path])), [(1000.0 + i, payload) for i, payload in enumerate(payloads)])
+
+    def test_files_rotate_by_size_and_old_ones_are_pruned(self):
+        capture = self.capture(rotate_bytes=600, max_files=3)
+        for i in range(20):
+            capture.record(delivery("5511999990001", f"mensagem {i}", f"wamid.{i}"), arrived_at=float(i))
+        capture.stop()
+        files = capture_files(self.directory.name)
+        self.assertEqual(len(files), 3)
+        self.assertGreater(capture.files_closed, 3)
+        timestamps = [ts for ts, _ in read_capture(files)]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(timestamps[-1], 19.0) # The newest deliveries are the ones kept
+
+    def test_pseudonymized_numbers_are_stable_and_still_parse(self):
+        capture = self.capture(pseudonymize=True, pseudonymize_key="test-key")
+        original = delivery("5511999990001", "minhas tarefas", "wamid.1")
+        capture.record(original)
+        capture.record(delivery("5511999990001", "ajuda", "wamid.2"))
+        capture.record(delivery("5511999990002", "ajuda", "wamid.3"))
+        capture.stop()
+        payloads = [payload for _, payload in read_capture(capture_files(self.directory.name))]
+        senders = [parse_incoming_whatsapp_messages(payload)[0]["whatsapp_id"] for payload in payloads]
+        self.assertEqual(senders[0], senders[1])
+        self.assertNotEqual(senders[0], senders[2])
+        self.assertEqual(senders[0], Pseudonymizer("test-key").phone("5511999990001"))
+        self.assertTrue(senders[0].isdigit())
+        raw = b"".join(gzip.open(path).read() for path in capture_files(self.directory.name))
+        self.assertNotIn(b"5511999990001", raw)
+        self.assertNotIn(b"Maria", raw)
+        self.assertEqual(original["entry"][0]["changes"][0]["value"]["messages"][0]["from"], "5511999990001") # Request's copy untouched
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        capture = TrafficCapture(directory=self.directory.name, queue_size=2) # Writer not started
+        for i in range(5):
+            capture.record(delivery("5511999990001", "ajuda", f"wamid.{i}"))
+        self.assertEqual(capture.dropped, 3)
+
+    def test_truncated_file_yields_complete_records(self):
+        capture = self.capture()
+        for i in range(50):
+            capture.record(delivery("5511999990001", f"mensagem {i}", f"wamid.{i}"), arrived_at=float(i))
+        capture.stop()
+        [path] = capture_files(self.directory.name)
+        with open(path, "rb") as capture_file:
+            data = capture_file.read()
+        with open(path, "wb") as capture_file:
+            capture_file.write(data[:len(data) // 2])
+        with self.assertLogs("app.core.capture", "WARNING"):
+            records = list(read_capture([path]))
+        self.assertLess(len(records), 50)
+        self.assertEqual([ts for ts, _ in records], [float(i) for i in range(len(records))])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+# tests/test_dedup.py
+
+import unittest
+
+from app.core.dedup import RecentIdCache
+from tests.helpers import FakeClock
+
+class TestRecentIdCache(unittest.TestCase):
+
+    def test_evicts_oldest_when_full(self):
+        cache = RecentIdCache(maxsize=3, ttl_seconds=60, clock=FakeClock())
+        for message_id in ["a", "b", "c", "d"]:
+            cache.add(message_id)
+        self.assertNotIn("a", cache)
+        self.assertIn("d", cache)
+        self.assertEqual(len(cache), 3)
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = RecentIdCache(maxsize=10, ttl_seconds=5, clock=clock)
+        cache.add("a")
+        clock.now = 3
+        cache.add("b")
+        self.assertIn("a", cache)
+        clock.now = 6
+        self.assertNotIn("a", cache)
+        self.assertIn("b", cache)
+        cache.add("c") # Expired head entries are purged on insert
+        clock.now = 9
+        cache.add("d")
+        self.assertEqual(len(cache), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# tests/test_digest.py
+
+import asyncio
+import unittest
+from datetime import date, datetime, time, timedelta
+from unittest.mock import patch, AsyncMock
+
+from app.db.database import initialize_database
+initialize_database(None, is_test_setup=True)
+
+from app.core import digest, metrics, task_manager
+from app.core.digest import DailyDigest
+from app.models import models
+from tests.helpers import DatabaseTestCase
+
+class TestDailyDigest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.day = date.today()
+        at = lambda hour, days=0: datetime.combine(self.day + timedelta(days=days), time(hour))
+        with self.session_factory() as db:
+            users = {}
+            for name, opted_in in (("A", True), ("B", True), ("C", False), ("D", True)):
+                users[name] = task_manager.create_user(db, f"55119000006{ord(name)}", f"55119000006{ord(name)}", commit=False)
+                users[name].opt_in_status = opted_in
+            for owner, description, due_date, status in (
+                ("A", "reunião", at(15), "pending"),
+                ("A", "academia", at(7), "pending"),
+                ("A", "amanhã", at(9, days=1), "pending"),
+                ("A", "já feita", at(10), "completed"),
+                ("B", "ontem", at(9, days=-1), "pending"),
+                ("C", "sem opt-in", at(9), "pending"),
+                ("D", "dentista", at(11), "pending"),
+            ):
+                task = task_manager.create_task(db, users[owner], description, due_date=due_date, commit=False)
+                task.status = status
+            db.commit()
+            self.whatsapp_ids = {name: user.whatsapp_id for name, user in users.items()}
+
+    def outbox_rows(self):
+        with self.session_factory() as db:
+            return [(row.recipient, row.body) for row in db.query(models.OutboxMessage).order_by(models.OutboxMessage.id)]
+
+    def test_one_streamed_query_and_one_write_per_batch(self):
+        batches = []
+        with self.session_factory() as read_db:
+            with metrics.count_queries() as queries:
+                result = digest.enqueue_daily_digest(read_db, self.session_factory, self.day, batch_size=1, yield_per=2,
+                                                     on_batch=lambda: batches.append(queries.count))
+        self.assertEqual(result, (2, 3)) # Users A and D, three tasks
+        self.assertEqual(batches, [2, 3]) # The digest query, then one INSERT per batch of users
+        (first_to, first_body), (second_to, second_body) = self.outbox_rows()
+        self.assertEqual((first_to, second_to), (self.whatsapp_ids["A"], self.whatsapp_ids["D"]))
+        self.assertLess(first_body.index("academia (Prazo: 07:00)"), first_body.index("reunião (Prazo: 15:00)"))
+        self.assertNotIn("amanhã", first_body)
+        self.assertNotIn("já feita", first_body)
+        self.assertIn("dentista", second_body)
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_run_once_hands_the_digest_to_the_outbox_sender(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        job = DailyDigest(session_factory=self.session_factory, batch_size=10)
+        self.assertEqual(asyncio.run(job.run_once(self.day)), (2, 3))
+        self.assertEqual(sorted(call.args[0] for call in mock_send.await_args_list),
+                         sorted([self.whatsapp_ids["A"], self.whatsapp_ids["D"]]))
+        self.assertEqual(self.outbox_rows(), [])
+        self.assertEqual(job.stats()["last_run"][:3], (self.day.isoformat(), 2, 3))
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_only_one_process_sends_the_day(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        first, second = DailyDigest(session_factory=self.session_factory), DailyDigest(session_factory=self.session_factory)
+        self.assertEqual(asyncio.run(first.run_once(self.day)), (2, 3))
+        self.assertIsNone(asyncio.run(second.run_once(self.day))) # e.g. another uvicorn worker
+        self.assertEqual(mock_send.await_count, 2) # One digest each for A and D
+        self.assertEqual(second.stats()["skipped_runs"], 1)
+        self.assertEqual(asyncio.run(second.run_once(self.day + timedelta(days=1))), (1, 1)) # The next day is free ("amanhã")
+
+    def test_next_run(self):
+        job = DailyDigest(send_at="08:00")
+        self.assertEqual(job.next_run(datetime(2025, 3, 10, 7, 59)), datetime(2025, 3, 10, 8, 0))
+        self.assertEqual(job.next_run(datetime(2025, 3, 10, 8, 0)), datetime(2025, 3, 11, 8, 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# tests/test_dispatcher.py
+
+import asyncio
+import unittest
+
+from app.core.dispatcher import ShardedDispatcher
+
+class TestShardedDispatcher(unittest.TestCase):
+
+    def test_same_key_runs_in_submission_order(self):
+        order = []
+
+        def job(label, delay):
+            async def run():
+                await asyncio.sleep(delay)
+                order.append(label)
+                return label
+            return run
+
+        async def scenario():
+            dispatcher = ShardedDispatcher(shards=4, queue_maxsize=10)
+            dispatcher.start()
+            # The first job is the slowest; a global pool would finish it last
+            results = await asyncio.gather(
+                dispatcher.run("5511999990001", job("lembrar", 0.03)),
+                dispatcher.run("5511999990001", job("listar", 0.0)),
+            )
+            await dispatcher.stop()
+            return results
+
+        self.assertEqual(asyncio.run(scenario()), ["lembrar", "listar"])
+        self.assertEqual(order, ["lembrar", "listar"])
+
+    def test_different_shards_run_in_parallel(self):
+        async def scenario():
+            dispatcher = ShardedDispatcher(shards=8, queue_maxsize=10)
+            dispatcher.start()
+            keys = {}
+            i = 0
+            while len(keys) < 4: # One key per distinct shard
+                key = f"55119999{i:05d}"
+                keys.setdefault(dispatcher.shard_for(key), key)
+                i += 1
+            start = asyncio.get_running_loop().time()
+            await asyncio.gather(*(dispatcher.run(key, lambda: asyncio.sleep(0.05)) for key in keys.values()))
+            elapsed = asyncio.get_running_loop().time() - start
+            stats = dispatcher.stats()
+            await dispatcher.stop()
+            return elapsed, stats
+
+        elapsed, stats = asyncio.run(scenario())
+        self.assertLess(elapsed, 0.15)
+        self.assertEqual(stats["processed"], 4)
+        self.assertEqual(stats["shards"], 8)
+
+    def test_run_propagates_job_errors(self):
+        async def failing():
+            raise ValueError("boom")
+
+        async def scenario():
+            dispatcher = ShardedDispatcher(shards=2, queue_maxsize=10)
+            dispatcher.start()
+            try:
+                with self.assertRaises(ValueError):
+                    await dispatcher.run("5511999990001", failing)
+                self.assertEqual(await dispatcher.run("5511999990001", lambda: asyncio.sleep(0, result="ok")), "ok")
+            finally:
+                await dispatcher.stop()
+
+        asyncio.run(scenario())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# tests/test_ingestion.py
+
+import asyncio
+import unittest
+
+from app.core.ingestion import IngestionQueue, QueueFullError
+
+class TestIngestionQueue(unittest.TestCase):
+
+    def test_stop_drains_accepted_events(self):
+        processed = []
+
+        async def handler(event):
+            await asyncio.sleep(0.001)
+            processed.append(event)
+
+        async def scenario():
+            queue = IngestionQueue(handler, workers=3, maxsize=100)
+            queue.start()
+            for i in range(50):
+                await queue.submit(i)
+            await queue.stop(drain_timeout=5)
+            with self.assertRaises(QueueFullError):
+                await queue.submit("late")
+            return queue
+
+        queue = asyncio.run(scenario())
+        self.assertEqual(sorted(processed), list(range(50)))
+        self.assertEqual(queue.processed, 50)
+
+    def test_full_queue_applies_backpressure(self):
+        release = None
+
+        async def handler(event):
+            await release.wait()
+
+        async def scenario():
+            nonlocal release
+            release = asyncio.Event()
+            queue = IngestionQueue(handler, workers=1, maxsize=2)
+            queue.start()
+            await queue.submit("a")
+            await asyncio.sleep(0) # worker takes "a" and blocks
+            await queue.submit("b")
+            await queue.submit("c")
+            with self.assertRaises(QueueFullError):
+                await queue.submit("d", timeout=0.01)
+            release.set()
+            await queue.stop(drain_timeout=5)
+            return queue
+
+        queue = asyncio.run(scenario())
+        self.assertEqual(queue.rejected, 1)
+        self.assertEqual(queue.processed, 3)
+
+    def test_handler_errors_do_not_kill_workers(self):
+        async def handler(event):
+            if event == "bad":
+                raise RuntimeError("boom")
+
+        async def scenario():
+            queue = IngestionQueue(handler, workers=1, maxsize=10)
+            queue.start()
+            for event in ["ok", "bad", "ok"]:
+                await queue.submit(event)
+            await queue.stop(drain_timeout=5)
+            return queue
+
+        queue = asyncio.run(scenario())
+        self.assertEqual(queue.processed, 2)
+        self.assertEqual(queue.failed, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,8 @@
 import unittest
 import os
 import json
-from unittest.mock import patch, MagicMock
+import itertools
+from unittest.mock import patch, MagicMock, AsyncMock
 
 os.environ["DATABASE_URL"] = "sqlite:///file:memdb1?mode=memory&cache=shared"
 SQLALCHEMY_DATABASE_URL_TEST = "sqlite:///file:memdb1?mode=memory&cache=shared"
@@ -17,7 +18,11 @@ from fastapi.testclient import TestClient
 from sqlalchemy import inspect as sqlalchemy_inspect
 from app.main import app, get_db_session as app_get_db_session
 from app.models import models
+from app.core import dedup, task_manager, metrics
+from app.core.user_cache import user_cache
+from sqlalchemy import event
 from config import settings
+from tests.helpers import reset_in_process_caches
 
 def override_get_db():
     TestSessionLocal = get_session_local()
@@ -32,8 +37,10 @@ app.dependency_overrides[app_get_db_session] = override_get_db
 
 client = TestClient(app)
 mock_sent_messages_list = []
+# Each simulated message gets its own WhatsApp id, otherwise dedup would drop it as a redelivery
+message_id_sequence = itertools.count(1)
 
-def helper_simulate_whatsapp_post(mock_whatsapp_send_fn, user_phone, message_body):
+def helper_simulate_whatsapp_post(mock_whatsapp_send_fn, user_phone, message_body, message_id=None):
     current_test_engine = get_engine()
     print(f"DEBUG HELPER: Ensuring tables on engine {current_test_engine.url} before POST.")
     create_db_and_tables(current_test_engine)
@@ -52,7 +59,7 @@ def helper_simulate_whatsapp_post(mock_whatsapp_send_fn, user_phone, message_bod
                     "contacts": [{"profile": {"name": "Test User"}, "wa_id": user_phone}],
                     "messages": [{
                         "from": user_phone,
-                        "id": "MSG_ID_TEST",
+                        "id": message_id or f"MSG_ID_TEST_{next(message_id_sequence)}",
                         "timestamp": "1678886400",
                         "text": {"body": message_body},
                         "type": "text"
@@ -65,6 +72,40 @@ def helper_simulate_whatsapp_post(mock_whatsapp_send_fn, user_phone, message_bod
     response = client.post("/webhook", json=payload)
     return response, mock_sent_messages_list
 
+def helper_simulate_whatsapp_batch_post(mock_whatsapp_send_fn, messages):
+    """Posts one delivery carrying several (user_phone, message_body) messages split across two entries."""
+    create_db_and_tables(get_engine())
+    mock_sent_messages_list.clear()
+    mock_whatsapp_send_fn.side_effect = lambda to, msg: mock_sent_messages_list.append({"to": to, "text": msg})
+
+    def change(chunk):
+        return {
+            "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {"display_phone_number": "TEST_PHONE", "phone_number_id": settings.PHONE_NUMBER_ID},
+                "messages": [{
+                    "from": user_phone,
+                    "id": f"MSG_ID_TEST_{i}",
+                    "timestamp": "1678886400",
+                    "text": {"body": message_body},
+                    "type": "text"
+                } for i, (user_phone, message_body) in chunk]
+            },
+            "field": "messages"
+        }
+
+    numbered = [(next(message_id_sequence), message) for message in messages]
+    half = (len(numbered) + 1) // 2
+    payload = {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {"id": "BUSINESS_ACCOUNT_ID", "changes": [change(numbered[:half])]},
+            {"id": "BUSINESS_ACCOUNT_ID", "changes": [change(numbered[half:])]},
+        ]
+    }
+    response = client.post("/webhook", json=payload)
+    return response, mock_sent_messages_list
+
 class TestWhatsappIntegration(unittest.TestCase):
 
     def setUp(self):
@@ -73,6 +114,7 @@ class TestWhatsappIntegration(unittest.TestCase):
         print(f"Engine in setUp: {self.current_test_engine.url}")
         Base.metadata.drop_all(bind=self.current_test_engine) 
         create_db_and_tables(self.current_test_engine)
+        reset_in_process_caches()
         print("Tables dropped and recreated in setUp.")
         
         try:
@@ -93,7 +135,7 @@ class TestWhatsappIntegration(unittest.TestCase):
         mock_sent_messages_list.clear()
         print("Finished tearDown.")
 
-    @patch("app.gateway.whatsapp_handler.send_whatsapp_message")
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
     def test_01_new_user_flow_and_opt_in(self, mock_send_whatsapp_message_fn):
         print("\nExecutando test_01_new_user_flow_and_opt_in")
         user_phone = "whatsapp:+550000000001"
@@ -123,7 +165,7 @@ class TestWhatsappIntegration(unittest.TestCase):
         self.assertEqual(len(sent), 1)
         self.assertIn("Ótimo! Sua inscrição foi confirmada.", sent[0]["text"])
 
-    @patch("app.gateway.whatsapp_handler.send_whatsapp_message")
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
     def test_02_task_management_flow(self, mock_send_whatsapp_message_fn):
         print("\nExecutando test_02_task_management_flow")
         user_phone = "whatsapp:+550000000002"
@@ -184,7 +226,7 @@ class TestWhatsappIntegration(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(f"Tarefa {task_id_urgent} marcada como concluída!", sent[0]["text"])
 
-    @patch("app.gateway.whatsapp_handler.send_whatsapp_message")
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
     def test_03_help_and_unknown_intent(self, mock_send_whatsapp_message_fn):
         print("\nExecutando test_03_help_and_unknown_intent")
         user_phone = "whatsapp:+550000000003"
@@ -213,6 +255,151 @@ class TestWhatsappIntegration(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("Não entendi. Tente 'ajuda'", sent[0]["text"])
 
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_04_batched_delivery_processes_every_message(self, mock_send_whatsapp_message_fn):
+        print("\nExecutando test_04_batched_delivery_processes_every_message")
+        user_a = "whatsapp:+550000000004"
+        user_b = "whatsapp:+550000000005"
+
+        response, sent = helper_simulate_whatsapp_batch_post(mock_send_whatsapp_message_fn, [
+            (user_a, "Olá"), (user_b, "Oi"), (user_a, "Sim"),
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["status"], "batch_processed")
+        self.assertEqual([r["status"] for r in body["results"]],
+                         ["new_user_prompted_for_opt_in", "new_user_prompted_for_opt_in", "opt_in_processed"])
+        self.assertEqual([m["to"] for m in sent if m["to"] == user_a], [user_a, user_a])
+        self.assertIn("Ótimo! Sua inscrição foi confirmada.", [m for m in sent if m["to"] == user_a][1]["text"])
+
+        response, sent = helper_simulate_whatsapp_batch_post(mock_send_whatsapp_message_fn, [
+            (user_a, "Lembrar de pagar boleto"), (user_a, "Lembrar de ligar para Ana"), (user_a, "Minhas tarefas"),
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(sent), 3)
+        self.assertIn("pagar boleto", sent[2]["text"])
+        self.assertIn("ligar para Ana", sent[2]["text"])
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_05_redelivered_message_is_processed_once(self, mock_send_whatsapp_message_fn):
+        print("\nExecutando test_05_redelivered_message_is_processed_once")
+        user_phone = "whatsapp:+550000000006"
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Oi")
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Sim")
+
+        response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Lembrar de regar plantas", message_id="MSG_ID_REDELIVERED")
+        self.assertEqual(response.json()["status"], "processed")
+        self.assertEqual(len(sent), 1)
+
+        # Redelivery caught by the in-process cache
+        response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Lembrar de regar plantas", message_id="MSG_ID_REDELIVERED")
+        self.assertEqual(response.json()["status"], "duplicate_ignored")
+        self.assertEqual(sent, [])
+
+        # Redelivery after a restart (empty cache) caught by processed_messages
+        dedup.recent_message_ids.clear()
+        response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Lembrar de regar plantas", message_id="MSG_ID_REDELIVERED")
+        self.assertEqual(response.json()["status"], "duplicate_ignored")
+        self.assertEqual(sent, [])
+
+        db = get_session_local()()
+        try:
+            self.assertEqual(db.query(models.Task).filter(models.Task.description == "regar plantas").count(), 1)
+        finally:
+            db.close()
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_06_known_user_is_served_from_user_cache(self, mock_send_whatsapp_message_fn):
+        print("\nExecutando test_06_known_user_is_served_from_user_cache")
+        user_phone = "whatsapp:+550000000007"
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Oi")
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Sim")
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "ajuda") # Loads the user into the cache
+
+        user_queries = []
+        def count_user_selects(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+                user_queries.append(statement)
+        event.listen(self.current_test_engine, "before_cursor_execute", count_user_selects)
+        try:
+            hits_before = user_cache.hits
+            response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Lembrar de pagar aluguel")
+            self.assertIn("pagar aluguel", sent[0]["text"])
+            response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Minhas tarefas")
+            self.assertIn("pagar aluguel", sent[0]["text"])
+        finally:
+            event.remove(self.current_test_engine, "before_cursor_execute", count_user_selects)
+        self.assertEqual(user_queries, [])
+        self.assertEqual(user_cache.hits - hits_before, 2)
+
+        # Changing the opt-in invalidates the cached status
+        db = get_session_local()()
+        try:
+            task_manager.update_user_opt_in(db, user_phone, False)
+        finally:
+            db.close()
+        response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Minhas tarefas")
+        self.assertEqual(response.json()["status"], "opt_in_processed")
+
+    @patch("app.core.pipeline.WHATSAPP_MAX_TEXT_LENGTH", 300)
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_07_long_task_lists_are_paginated(self, mock_send_whatsapp_message_fn):
+        print("\nExecutando test_07_long_task_lists_are_paginated")
+        user_phone = "whatsapp:+550000000008"
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Oi")
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Sim")
+        db = get_session_local()()
+        try:
+            user = task_manager.get_user_by_whatsapp_id(db, user_phone)
+            for i in range(45):
+                task_manager.create_task(db, user, f"tarefa de número {i:02d}", commit=False)
+            db.commit()
+        finally:
+            db.close()
+
+        def listed(sent):
+            return [line for message in sent for line in message["text"].split("\n") if "tarefa de número" in line]
+
+        response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Minhas tarefas")
+        self.assertGreater(len(sent), 1) # Split to fit the (patched) body limit
+        self.assertTrue(all(len(message["text"]) <= 300 for message in sent))
+        first_page = listed(sent)
+        self.assertEqual(len(first_page), 20)
+        self.assertIn("'mais'", sent[-1]["text"])
+
+        response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "mais")
+        second_page = listed(sent)
+        self.assertEqual(len(second_page), 20)
+        response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Mais")
+        last_page = listed(sent)
+        self.assertEqual(len(last_page), 5)
+        self.assertNotIn("'mais'", "".join(message["text"] for message in sent))
+        self.assertEqual(len(set(first_page + second_page + last_page)), 45)
+
+        response, sent = helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "mais")
+        self.assertIn("Não há mais nada para mostrar", sent[0]["text"])
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_08_metrics_endpoint_reports_stages_per_intent(self, mock_send_whatsapp_message_fn):
+        print("\nExecutando test_08_metrics_endpoint_reports_stages_per_intent")
+        metrics.reset()
+        user_phone = "whatsapp:+550000000009"
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Oi")
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Sim")
+        helper_simulate_whatsapp_post(mock_send_whatsapp_message_fn, user_phone, "Lembrar de pagar aluguel amanhã")
+
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        body = response.text
+        self.assertIn('whatsapp_stage_duration_seconds_count{stage="nlp",intent="add_task"} 1', body)
+        self.assertIn('whatsapp_stage_duration_seconds_count{stage="task_manager",intent="add_task"} 1', body)
+        self.assertIn('whatsapp_stage_duration_seconds_count{stage="send",intent=""} 3', body)
+        self.assertIn('whatsapp_intents_total{intent="opt_in_yes"} 1', body)
+        self.assertIn("whatsapp_webhook_duration_seconds_count 3", body)
+        self.assertIn("whatsapp_db_queries_per_batch_count 3", body)
+        self.assertEqual(metrics.db_queries_per_batch.count(), 3)
+
 if __name__ == "__main__":
     print("Iniciando testes de integração do MVP...")
     suite = unittest.TestSuite()
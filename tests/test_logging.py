@@ -0,0 +1,68 @@
+# tests/test_logging.py
+
+import io
+import json
+import logging
+import unittest
+from unittest.mock import patch
+
+from app.core import log
+
+class CountingPayload(dict):
+    """Counts how often the payload is serialized."""
+    serialized = 0
+
+    def items(self):
+        CountingPayload.serialized += 1
+        return super().items()
+
+class TestLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.output = io.StringIO()
+        log.configure_logging(level="DEBUG", log_format="json", handler=logging.StreamHandler(self.output))
+        self.addCleanup(log.configure_logging) # Back to the settings' configuration
+        self.logger = logging.getLogger("app.tests.logging")
+        CountingPayload.serialized = 0
+
+    def records(self):
+        log.stop_logging() # Flushes the queue
+        return [json.loads(line) for line in self.output.getvalue().splitlines()]
+
+    def test_structured_record_through_the_queue(self):
+        self.logger.info("Message sent to %s", "5511", extra={"to": "5511", "chars": 12})
+        [record] = self.records()
+        self.assertEqual(record["msg"], "Message sent to 5511")
+        self.assertEqual((record["level"], record["logger"], record["to"], record["chars"]), ("INFO", "app.tests.logging", "5511", 12))
+
+    def test_payload_dumps_are_sampled(self):
+        log.log_payload(self.logger, "Received payload", {"object": "x"}, sample_rate=1.0)
+        for _ in range(20):
+            log.log_payload(self.logger, "Received payload", CountingPayload(object="y"), sample_rate=0.0)
+        records = self.records()
+        self.assertEqual([r["msg"] for r in records], ['Received payload: {"object": "x"}'])
+        self.assertEqual(CountingPayload.serialized, 0)
+
+    def test_production_never_serializes_payloads(self):
+        with patch.object(log, "APP_ENV", "production"):
+            log.log_payload(self.logger, "Received payload", CountingPayload(object="y"), sample_rate=1.0)
+        self.assertEqual(self.records(), [])
+        self.assertEqual(CountingPayload.serialized, 0)
+
+    def test_debug_applies_to_app_loggers_only(self):
+        self.logger.debug("Parsed intent")
+        logging.getLogger("httpx").debug("Sending request")
+        logging.getLogger("aiosqlite").debug("Executing statement")
+        logging.getLogger("httpx").warning("Retrying")
+        self.assertEqual([(r["logger"], r["msg"]) for r in self.records()],
+                         [("app.tests.logging", "Parsed intent"), ("httpx", "Retrying")])
+
+    def test_disabled_levels_are_not_formatted(self):
+        logging.getLogger(log.APP_LOGGER).setLevel(logging.INFO)
+        self.logger.debug("Processing %s", log.LazyJson(CountingPayload(object="y")))
+        log.log_payload(self.logger, "Received payload", CountingPayload(object="y"), sample_rate=1.0)
+        self.assertEqual(self.records(), [])
+        self.assertEqual(CountingPayload.serialized, 0)
+
+if __name__ == "__main__":
+    unittest.main()
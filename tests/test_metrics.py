@@ -0,0 +1,118 @@
+# tests/test_metrics.py
+
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+from app.db.database import initialize_database, get_session_local
+initialize_database(None, is_test_setup=True)
+
+from sqlalchemy import text
+
+from app.core import metrics
+from app.core.dispatcher import ShardedDispatcher
+from app.core.ingestion import QueueFullError
+from app.db import database
+from app.gateway import whatsapp_handler
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_histogram_buckets_are_upper_bounds_and_render_cumulatively(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+        self.addCleanup(metrics._registry.remove, histogram)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, "nlp")
+        body = metrics.render_prometheus()
+        self.assertIn("# TYPE test_seconds histogram", body)
+        self.assertIn('test_seconds_bucket{stage="nlp",le="0.1"} 2', body)
+        self.assertIn('test_seconds_bucket{stage="nlp",le="1.0"} 3', body)
+        self.assertIn('test_seconds_bucket{stage="nlp",le="+Inf"} 4', body)
+        self.assertIn('test_seconds_sum{stage="nlp"} 3.65', body)
+        self.assertIn('test_seconds_count{stage="nlp"} 4', body)
+
+    def test_label_values_are_escaped(self):
+        metrics.intents_total.inc('say "hi"\n')
+        self.assertIn('whatsapp_intents_total{intent="say \\"hi\\"\\n"} 1', metrics.render_prometheus())
+
+    def test_disabled_metrics_record_nothing(self):
+        with patch.object(metrics, "enabled", False):
+            metrics.intents_total.inc("help")
+            metrics.observe_stage("nlp", 0.0, "help")
+        self.assertEqual(metrics.intents_total.value("help"), 0)
+        self.assertEqual(metrics.stage_seconds.count("nlp", "help"), 0)
+
+    def test_count_queries_counts_sync_and_async_round_trips(self):
+        with get_session_local()() as db, metrics.count_queries() as queries:
+            db.execute(text("SELECT 1"))
+            db.execute(text("SELECT 2"))
+        self.assertEqual(queries.count, 2)
+
+        async def scenario():
+            try:
+                async with database.get_async_session_local()() as db:
+                    def work(session):
+                        with metrics.count_queries() as counted:
+                            session.execute(text("SELECT 1"))
+                        return counted.count
+                    return await db.run_sync(work)
+            finally:
+                await database.dispose_async_engine()
+        self.assertEqual(asyncio.run(scenario()), 1)
+        self.assertGreaterEqual(metrics.db_queries_total.value(), 3)
+
+    def test_send_failures_are_counted_by_reason(self):
+        def refuse(request):
+            raise httpx.ConnectError("refused", request=request)
+        def reject(request):
+            return httpx.Response(400, json={"error": "bad"})
+
+        async def send(handler):
+            await whatsapp_handler.close_async_client()
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch.object(whatsapp_handler, "SIMULATE_WHATSAPP_MESSAGES", False), \
+                 patch.object(whatsapp_handler, "get_async_client", return_value=client):
+                result = await whatsapp_handler.send_whatsapp_message_async("5511", "oi")
+            await client.aclose()
+            return result
+
+        self.assertEqual(asyncio.run(send(refuse))["status"], "error")
+        self.assertEqual(asyncio.run(send(reject))["status"], "error")
+        self.assertEqual(metrics.send_failures_total.value("transport"), 1)
+        self.assertEqual(metrics.send_failures_total.value("http_status"), 1)
+
+    def test_dispatcher_shards_are_exported_per_shard(self):
+        async def scenario():
+            dispatcher = ShardedDispatcher(shards=2, queue_maxsize=1)
+            dispatcher.start()
+            metrics.track_dispatcher(dispatcher)
+            self.addCleanup(metrics.track_dispatcher, None)
+            key = "5511999990001"
+            release = asyncio.Event()
+            await dispatcher.submit(key, release.wait) # Running
+            await asyncio.sleep(0)
+            await dispatcher.submit(key, release.wait) # Queued behind it
+            with self.assertRaises(QueueFullError):
+                await dispatcher.submit(key, release.wait)
+            body, shard = metrics.render_prometheus(), dispatcher.shard_for(key)
+            release.set()
+            await dispatcher.stop()
+            return body, shard, 1 - shard
+
+        body, busy, idle = asyncio.run(scenario())
+        self.assertIn("# TYPE whatsapp_dispatcher_queue_depth gauge", body)
+        self.assertIn("# TYPE whatsapp_dispatcher_rejected_total counter", body)
+        self.assertIn(f'whatsapp_dispatcher_queue_depth{{shard="{busy}"}} 1', body)
+        self.assertIn(f'whatsapp_dispatcher_in_flight{{shard="{busy}"}} 1', body)
+        self.assertIn(f'whatsapp_dispatcher_rejected_total{{shard="{busy}"}} 1', body)
+        self.assertIn(f'whatsapp_dispatcher_in_flight{{shard="{idle}"}} 0', body)
+        metrics.track_dispatcher(None)
+        self.assertNotIn("whatsapp_dispatcher_queue_depth{", metrics.render_prometheus())
+
+if __name__ == "__main__":
+    unittest.main()
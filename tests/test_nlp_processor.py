@@ -0,0 +1,174 @@
+# tests/test_nlp_processor.py
+
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from app.nlp import processor, intents
+from app.nlp.cache import NlpResultCache
+from app.nlp.processor import PATTERNS, match_intent, process_message_nlp
+
+# The examples from processor.py's __main__ block plus messages that stress the prefilter
+MESSAGES = [
+    "Lembrar de comprar pão amanhã às 8h",
+    "adicionar tarefa reunião com cliente para 20/12 às 14:30",
+    "anotar consulta médica dia 25/05/2025 as 10",
+    "tarefa: ligar para o João hoje 17H",
+    "Lembrar de comprar leite",
+    "Lembrar de call com time amanhã",
+    "Lembrar de apresentação às 15h",
+    "Tarefa urgente para agora mesmo",
+    "Quais minhas tarefas de hoje?",
+    "minhas tarefas para amanhã",
+    "listar tarefas",
+    "Quais meus lembretes de hoje?",
+    "ver lembretes para amanhã",
+    "marcar tarefa 123 como concluída",
+    "concluir tarefas 3, 4, 7 e 9",
+    "tarefas concluídas 3 a 5",
+    "remover tarefas 2-4",
+    "adiar tarefa 8 para 20/12 às 9h",
+    "remarcar tarefas 1 e 2 amanhã",
+    "Lembrar de apagar tarefa 5 amanhã",
+    "Ok, concluir tarefa 5",
+    "oi marcar tarefa 3 como concluída",
+    "Já pode marcar tarefa 4",
+    "anotar: remarcar tarefa 3 para amanhã",
+    "Por favor, apagar tarefa 5",
+    "Sim",
+    "Não quero",
+    "ajuda",
+    "Qual o tempo para amanhã?",
+    "NÃO",
+    "s",
+    "O que você faz?",
+    "comandos por favor",
+    "anotarefa concluída 7",
+    "TAREFA CONCLUÍDA 42",
+    "lembretes",
+    "Lembrete pagar conta de luz 10/11 às 9",
+    "Olá, bom dia! Tudo bem com você? Estou testando o assistente hoje.",
+    "quero ver tarefas concluídas e meus lembretes",
+    "mais",
+    "Ver mais?",
+    "quero mais tarefas",
+    "ſim", # re.IGNORECASE folds these to ASCII letters
+    "İnfelizmente não",
+    "",
+]
+
+def match_intent_sequentially(message_text):
+    """Reference behaviour: every pattern in PATTERNS order, no prefilter."""
+    for intent, pattern in PATTERNS.items():
+        match = pattern.search(message_text)
+        if match:
+            return intent, match.groupdict()
+    return None, None
+
+def fixed_datetime(now):
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+    return FixedDatetime
+
+class TestIntentMatching(unittest.TestCase):
+
+    def test_prefiltered_matching_agrees_with_sequential_patterns(self):
+        for message in MESSAGES:
+            with self.subTest(message=message):
+                intent, match = match_intent(message)
+                self.assertEqual((intent, match.groupdict() if match else None), match_intent_sequentially(message))
+                if intent is not None:
+                    self.assertIn(intent, processor.candidate_intents(message))
+
+    def test_examples(self):
+        self.assertEqual(process_message_nlp("marcar tarefa 123 como concluída"),
+                         {"intent": "complete_task", "entities": {"task_ids": [123], "task_id": 123}})
+        self.assertEqual(process_message_nlp("concluir tarefas 3 e 4"),
+                         {"intent": "complete_task", "entities": {"task_ids": [3, 4]}})
+        self.assertEqual(process_message_nlp("minhas tarefas para amanhã"),
+                         {"intent": "list_tasks", "entities": {"date_filter": "amanhã"}})
+        self.assertEqual(process_message_nlp("Qual o tempo para amanhã?")["intent"], "unknown")
+        self.assertEqual(process_message_nlp("ajuda")["intent"], "help")
+
+    def test_typed_intents_carry_datetimes(self):
+        with patch.object(processor, "datetime", fixed_datetime(datetime(2025, 3, 10, 12, 0))):
+            parsed = processor.parse_intent("anotar consulta médica 25/05/2025 as 10")
+        self.assertEqual(parsed, intents.AddTask("consulta médica", datetime(2025, 5, 25, 10, 0)))
+        self.assertEqual(processor.parse_intent("marcar tarefa 7"), intents.CompleteTask((7,)))
+        self.assertIs(processor.parse_intent("ajuda"), intents.HELP)
+        self.assertEqual(parsed.to_dict()["entities"]["due_date"], "2025-05-25 10:00:00")
+
+    def test_task_id_lists_and_ranges(self):
+        self.assertEqual(processor.parse_intent("concluir tarefas 3, 4, 7, 9"), intents.CompleteTask((3, 4, 7, 9)))
+        self.assertEqual(processor.parse_intent("Concluir tarefas 3 4 e 7"), intents.CompleteTask((3, 4, 7)))
+        self.assertEqual(processor.parse_intent("finalizar tarefas 5 a 8, 2"), intents.CompleteTask((5, 6, 7, 8, 2)))
+        self.assertEqual(processor.parse_intent("remover tarefas 4-2, 3"), intents.DeleteTask((4, 3, 2)))
+        self.assertEqual(processor.parse_intent("apagar tarefa 6 até 6"), intents.DeleteTask((6,)))
+        self.assertEqual(processor.parse_intent("Por favor, apagar tarefa 5"), intents.DeleteTask((5,)))
+        self.assertEqual(processor.parse_intent("pode concluir tarefa 5"), intents.CompleteTask((5,)))
+        # Commands quoted inside another message are not run
+        for message in ("Lembrar de apagar tarefa 5 amanhã", "anotar: remarcar tarefa 3 para amanhã"):
+            self.assertIsInstance(processor.parse_intent(message), intents.AddTask, message)
+        # Completing is read anywhere in the message, as before
+        self.assertEqual(processor.parse_intent("Ok, concluir tarefa 5"), intents.CompleteTask((5,)))
+        self.assertEqual(processor.parse_intent("oi marcar tarefa 3 como concluída"), intents.CompleteTask((3,)))
+        self.assertEqual(processor.parse_intent("Já pode marcar tarefa 4"), intents.CompleteTask((4,)))
+        self.assertNotIsInstance(processor.parse_intent("Ok, remarcar tarefa 3 amanhã"), intents.CompleteTask)
+        with patch.object(processor, "datetime", fixed_datetime(datetime(2025, 3, 10, 12, 0))):
+            self.assertEqual(processor.parse_intent("adiar tarefas 1, 2 para amanhã às 10h"),
+                             intents.RescheduleTask((1, 2), datetime(2025, 3, 11, 10, 0)))
+            self.assertEqual(processor.parse_intent("reagendar tarefa 3 20/12 14:30"),
+                             intents.RescheduleTask((3,), datetime(2025, 12, 20, 14, 30)))
+        # A list or range past MAX_TASK_IDS is refused explicitly rather than expanded
+        self.assertIs(processor.parse_intent("apagar tarefas 1 a 100000"), intents.TOO_MANY_TASK_IDS)
+        self.assertIs(processor.parse_intent("concluir tarefas 1 a 500"), intents.TOO_MANY_TASK_IDS)
+
+    def test_every_pattern_is_reachable_through_a_cue(self):
+        cued_intents = set(processor.WORD_CUES.values())
+        for _, intents, refinements in processor.SUBSTRING_CUES:
+            cued_intents.update(intents)
+            for _, cue_intents in refinements:
+                cued_intents.update(cue_intents)
+        self.assertEqual(cued_intents, set(PATTERNS))
+
+class TestNlpResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = NlpResultCache(maxsize=2)
+        patcher = patch.object(processor, "nlp_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_commands_hit_across_case_and_whitespace(self):
+        first = process_message_nlp("minhas tarefas de hoje")
+        self.assertEqual(process_message_nlp("  Minhas   TAREFAS de hoje "), first)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_relative_dates_are_resolved_on_every_lookup(self):
+        with patch.object(processor, "datetime", fixed_datetime(datetime(2025, 3, 10, 12, 0))):
+            self.assertEqual(process_message_nlp("Lembrar de comprar pão amanhã às 8:00")["entities"]["due_date"], "2025-03-11 08:00:00")
+        with patch.object(processor, "datetime", fixed_datetime(datetime(2025, 3, 11, 0, 1))):
+            self.assertEqual(process_message_nlp("Lembrar de comprar pão amanhã às 8:00")["entities"]["due_date"], "2025-03-12 08:00:00")
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_quoted_text_is_not_reused_for_a_case_variant(self):
+        process_message_nlp("Lembrar de ligar para o João")
+        result = process_message_nlp("lembrar de ligar para o joão")
+        self.assertEqual(result["entities"]["description"], "ligar para o joão")
+        self.assertEqual(self.cache.hits, 0)
+        unknown = process_message_nlp("Oi")
+        self.assertEqual(process_message_nlp("oi"), {"intent": "unknown", "entities": {"original_message": "oi"}})
+        self.assertEqual(unknown["entities"]["original_message"], "Oi")
+
+    def test_bounded_lru(self):
+        for message in ["ajuda", "sim", "ajuda", "não"]:
+            process_message_nlp(message)
+        self.assertEqual(self.cache.stats()["size"], 2)
+        process_message_nlp("ajuda") # Recently used, still cached
+        process_message_nlp("sim") # Least recently used, evicted
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 4))
+
+if __name__ == "__main__":
+    unittest.main()
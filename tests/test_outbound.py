@@ -0,0 +1,111 @@
+# tests/test_outbound.py
+
+import asyncio
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from app.gateway import outbound
+from app.gateway.outbound import TokenBucket, OutboundDispatcher
+from tests.helpers import FakeClock
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_paced(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock)
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.try_acquire(), 0.5)
+        clock.now = 0.5
+        self.assertEqual(bucket.try_acquire(), 0.0)
+        clock.now = 100
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [0.0, 0.0, 0.0]) # Refill is capped at the burst
+        self.assertGreater(bucket.try_acquire(), 0)
+
+    def test_penalize_and_unlimited(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=10, clock=clock)
+        bucket.penalize(2.0)
+        self.assertAlmostEqual(bucket.try_acquire(), 2.1)
+        self.assertEqual(TokenBucket(rate=0, burst=1).try_acquire(), 0.0)
+
+@patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+class TestOutboundDispatcher(unittest.TestCase):
+
+    def run_dispatcher(self, scenario, **options):
+        async def run():
+            dispatcher = OutboundDispatcher(**{"number_rate": 0, "recipient_rate": 0, "coalesce_window_ms": 20, **options})
+            dispatcher.start()
+            try:
+                return dispatcher, await scenario(dispatcher)
+            finally:
+                await dispatcher.stop()
+        return asyncio.run(run())
+
+    def sent(self, mock_send):
+        return [call.args for call in mock_send.call_args_list]
+
+    def test_replies_within_the_window_are_coalesced(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        async def scenario(dispatcher):
+            futures = [dispatcher.submit("A", "um"), dispatcher.submit("B", "oi"), dispatcher.submit("A", "dois"), dispatcher.submit("A", "três")]
+            return await asyncio.gather(*futures)
+        dispatcher, results = self.run_dispatcher(scenario)
+        self.assertCountEqual(self.sent(mock_send), [("A", "um\n\ndois\n\ntrês"), ("B", "oi")])
+        self.assertEqual(results[0], {"status": "success", "coalesced": 3})
+        self.assertEqual((dispatcher.api_calls, dispatcher.coalesced), (2, 2))
+
+    def test_coalescing_respects_the_length_limit_and_order(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        async def scenario(dispatcher):
+            return await asyncio.gather(*(dispatcher.submit("A", text) for text in ["a" * 6, "b" * 6, "c" * 6]))
+        self.run_dispatcher(scenario, max_length=14)
+        self.assertEqual(self.sent(mock_send), [("A", "aaaaaa\n\nbbbbbb"), ("A", "cccccc")])
+
+    def test_texts_queued_while_throttled_go_out_together(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        async def scenario(dispatcher):
+            await dispatcher.submit("A", "primeira")
+            return await asyncio.gather(dispatcher.submit("A", "segunda"), dispatcher.submit("A", "terceira"))
+        dispatcher, _ = self.run_dispatcher(scenario, recipient_rate=20, recipient_burst=1, coalesce_window_ms=0)
+        self.assertEqual(self.sent(mock_send), [("A", "primeira"), ("A", "segunda\n\nterceira")])
+        self.assertGreater(dispatcher.throttled_seconds, 0)
+
+    def test_rate_limited_send_is_retried(self, mock_send):
+        mock_send.side_effect = [{"status": "error", "status_code": 429, "retry_after": 0.01}, {"status": "success"}]
+        async def scenario(dispatcher):
+            return await dispatcher.submit("A", "oi")
+        dispatcher, result = self.run_dispatcher(scenario, number_rate=100, coalesce_window_ms=0)
+        self.assertEqual(result, {"status": "success"})
+        self.assertEqual((dispatcher.api_calls, dispatcher.rate_limited), (2, 1))
+
+    def test_send_messages_without_a_dispatcher_sends_each_text(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        self.assertIsNone(outbound.outbound_dispatcher)
+        results = asyncio.run(outbound.send_messages("A", ["um", "dois"]))
+        self.assertEqual(self.sent(mock_send), [("A", "um"), ("A", "dois")])
+        self.assertEqual(len(results), 2)
+
+    def test_send_messages_uses_the_running_dispatcher(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        async def run():
+            outbound.start_outbound_dispatcher(number_rate=0, recipient_rate=0, coalesce_window_ms=10)
+            try:
+                return await outbound.send_messages("A", ["um", "dois"])
+            finally:
+                await outbound.stop_outbound_dispatcher()
+        results = asyncio.run(run())
+        self.assertEqual(self.sent(mock_send), [("A", "um\n\ndois")])
+        self.assertEqual(results[0], results[1])
+
+    def test_handing_over_without_waiting_still_delivers_on_stop(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        async def run():
+            outbound.start_outbound_dispatcher(number_rate=0, recipient_rate=0, coalesce_window_ms=10)
+            self.assertIsNone(await outbound.send_messages("A", ["um", "dois"], wait=False))
+            self.assertEqual(mock_send.call_count, 0)
+            await outbound.stop_outbound_dispatcher()
+        asyncio.run(run())
+        self.assertEqual(self.sent(mock_send), [("A", "um\n\ndois")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+# tests/test_outbox.py
+
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, AsyncMock
+
+from app.db.database import initialize_database
+initialize_database(None, is_test_setup=True)
+
+from app.core import outbox, pipeline, task_manager
+from app.core.outbox import OutboxSender, CircuitBreaker
+from app.models import models
+from tests.helpers import DatabaseTestCase, FakeClock, text_message
+
+HTTP_500 = {"status": "error", "error_message": "500 Internal Server Error", "status_code": 500, "retry_after": None}
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_consecutive_failures_and_probes_after_cooldown(self):
+        clock = FakeClock(0.0)
+        breaker = CircuitBreaker(threshold=3, cooldown_seconds=30, clock=clock)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success() # Resets the streak
+        for _ in range(3):
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        clock.now = 30
+        self.assertTrue(breaker.allow()) # One probe...
+        self.assertFalse(breaker.allow()) # ...at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        clock.now = 60
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.times_opened, 2)
+
+class TestOutbox(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock(datetime.now() + timedelta(seconds=1)) # Rows enqueued by the test are due
+
+    def sender(self, **options):
+        options.setdefault("clock", self.clock)
+        return OutboxSender(self.session_factory, **options)
+
+    def enqueue(self, outgoing):
+        with self.session_factory() as db:
+            outbox.enqueue(db, outgoing)
+            db.commit()
+
+    def rows(self):
+        with self.session_factory() as db:
+            return db.query(models.OutboxMessage).order_by(models.OutboxMessage.id).all()
+
+    def test_rolled_back_work_leaves_no_message(self):
+        with self.session_factory() as db:
+            outbox.enqueue(db, [("A", "não deve sair")])
+            db.rollback()
+        self.assertEqual(self.rows(), [])
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_failed_reply_stays_in_the_outbox_and_is_retried_with_backoff(self, mock_send):
+        mock_send.return_value = HTTP_500
+        with self.session_factory() as db:
+            results = asyncio.run(pipeline.process_message_batch(db, [text_message("5511900000001", "Oi", "OUTBOX_1")]))
+        self.assertEqual(results[0]["status"], "new_user_prompted_for_opt_in")
+        mock_send.assert_awaited_once()
+        [row] = self.rows()
+        self.assertEqual((row.status, row.attempts, row.claim_token), ("pending", 1, None))
+        self.assertGreater(row.next_attempt_at, datetime.now())
+
+        # Not due yet: nothing is claimed
+        asyncio.run(self.sender(clock=datetime.now).drain())
+        self.assertEqual(mock_send.await_count, 1)
+
+        mock_send.return_value = {"status": "success"}
+        self.clock.now = datetime.now() + timedelta(seconds=5)
+        asyncio.run(self.sender().drain())
+        self.assertEqual(mock_send.await_count, 2)
+        self.assertIn("Olá!", mock_send.call_args.args[1])
+        self.assertEqual(self.rows(), []) # Sent rows are deleted
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        sender = self.sender(backoff_base_seconds=2, backoff_max_seconds=60)
+        for attempts, full_delay in ((1, 2), (2, 4), (3, 8), (6, 60), (10, 60)):
+            delay = sender.backoff_seconds(attempts)
+            self.assertGreaterEqual(delay, full_delay / 2)
+            self.assertLessEqual(delay, full_delay)
+        self.assertEqual(sender.backoff_seconds(1, retry_after=30), 30)
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_gives_up_on_permanent_errors_and_after_max_attempts(self, mock_send):
+        self.enqueue([("A", "número inválido"), ("B", "sempre 500")])
+        def answer(to, text):
+            if to == "A":
+                return {"status": "error", "error_message": "400 Bad Request", "status_code": 400, "retry_after": None}
+            return HTTP_500
+        mock_send.side_effect = answer
+        sender = self.sender(max_attempts=2, backoff_base_seconds=1)
+        asyncio.run(sender.drain())
+        self.clock.now += timedelta(seconds=5)
+        asyncio.run(sender.drain())
+        a, b = self.rows()
+        self.assertEqual((a.status, a.attempts), ("failed", 1))
+        self.assertEqual((b.status, b.attempts), ("failed", 2))
+        self.assertEqual(mock_send.await_count, 3)
+
+    def test_concurrent_senders_claim_disjoint_batches(self):
+        self.enqueue([(f"R{i}", f"mensagem {i}") for i in range(5)])
+        first, second = self.sender(batch_size=3), self.sender(batch_size=3)
+        with self.session_factory() as db:
+            claimed_first = first.claim_batch(db, 3)
+        with self.session_factory() as db:
+            claimed_second = second.claim_batch(db, 3)
+        with self.session_factory() as db:
+            self.assertEqual(first.claim_batch(db, 3), []) # Everything is leased
+        self.assertEqual([e.body for e in claimed_first], ["mensagem 0", "mensagem 1", "mensagem 2"])
+        self.assertEqual([e.body for e in claimed_second], ["mensagem 3", "mensagem 4"])
+
+        # After the lease expires (the first sender died) the rows can be claimed again, and the stale
+        # claim can no longer record results
+        self.clock.now += timedelta(seconds=first.lease_seconds + 1)
+        with self.session_factory() as db:
+            reclaimed = second.claim_batch(db, 3)
+        self.assertEqual([e.id for e in reclaimed], [e.id for e in claimed_first])
+        with self.session_factory() as db:
+            first.record_results(db, claimed_first, [], [])
+        self.assertEqual(len(self.rows()), 5)
+        with self.session_factory() as db:
+            second.record_results(db, reclaimed, [], [])
+        self.assertEqual([row.body for row in self.rows()], ["mensagem 3", "mensagem 4"])
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_open_breaker_stops_claiming(self, mock_send):
+        mock_send.return_value = HTTP_500
+        self.enqueue([(f"R{i}", "oi") for i in range(10)])
+        breaker_clock = FakeClock(0.0)
+        sender = self.sender(batch_size=4, breaker=CircuitBreaker(threshold=3, cooldown_seconds=30, clock=breaker_clock))
+        asyncio.run(sender.drain())
+        self.assertEqual(sender.breaker.state, "open")
+        self.assertEqual(mock_send.await_count, 4) # The first batch; the next one is never claimed
+
+        # Once the cooldown is over a single row goes out as a probe; its success closes the breaker
+        mock_send.return_value = {"status": "success"}
+        breaker_clock.now = 30
+        self.clock.now += timedelta(hours=1)
+        asyncio.run(sender.drain())
+        self.assertEqual(sender.breaker.state, "closed")
+        self.assertEqual(self.rows(), [])
+        self.assertEqual(mock_send.await_count, 4 + 10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+# tests/test_query_plans.py
+
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+
+from app.db.database import initialize_database, get_engine, get_session_local, Base
+initialize_database(None, is_test_setup=True)
+
+from app.core import task_manager
+from app.db.migrations import migrate_database, get_schema_version, MIGRATIONS
+from app.models import models
+from tests.helpers import reset_in_process_caches
+
+def explain_query_plan(connection, statement, parameters):
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+class TestHotQueryPlans(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = get_engine()
+        Base.metadata.drop_all(bind=self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS schema_version"))
+        reset_in_process_caches()
+
+    def test_migration_adds_indexes_to_existing_database(self):
+        # Simulate a database created before the composite index existed
+        Base.metadata.create_all(bind=self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_tasks_owner_status_due"))
+
+        applied = migrate_database(self.engine)
+        self.assertEqual(applied, [version for version, _, _ in MIGRATIONS])
+        with self.engine.connect() as connection:
+            self.assertEqual(get_schema_version(connection), MIGRATIONS[-1][0])
+            index_names = {row[1] for row in connection.exec_driver_sql("PRAGMA index_list('tasks')")}
+        self.assertIn("ix_tasks_owner_status_due", index_names)
+        self.assertEqual(migrate_database(self.engine), []) # Idempotent
+
+    def test_migration_stops_sqlite_reusing_task_ids(self):
+        # A database from before AUTOINCREMENT, where id 2 was archived and then handed out again
+        Base.metadata.create_all(bind=self.engine)
+        with self.engine.begin() as connection:
+            table_sql = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'tasks'").scalar()
+            connection.execute(text("DROP TABLE tasks"))
+            connection.exec_driver_sql(table_sql.replace(" AUTOINCREMENT", ""))
+            connection.execute(text("INSERT INTO tasks (id, description, status) VALUES (1, 'a', 'pending'), (2, 'nova', 'pending')"))
+            connection.execute(text("INSERT INTO tasks_archive (id, description, status) VALUES (2, 'velha', 'completed')"))
+
+        migrate_database(self.engine)
+        with self.engine.begin() as connection:
+            self.assertIn("AUTOINCREMENT", connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'tasks'").scalar())
+            self.assertEqual(connection.exec_driver_sql("SELECT id, description FROM tasks ORDER BY id").all(), [(1, "a"), (3, "nova")])
+            index_names = {row[1] for row in connection.exec_driver_sql("PRAGMA index_list('tasks')")}
+            self.assertIn("ix_tasks_owner_status_due", index_names)
+            connection.execute(text("DELETE FROM tasks WHERE id = 3"))
+            connection.execute(text("INSERT INTO tasks (description, status) VALUES ('outra', 'pending')"))
+            self.assertEqual(connection.exec_driver_sql("SELECT MAX(id) FROM tasks").scalar(), 4) # Never 3 again
+
+    def test_migrated_column_matches_the_model(self):
+        Base.metadata.create_all(bind=self.engine)
+        with self.engine.begin() as connection:
+            fresh_type = self.column_types(connection)["reminded_at"]
+            connection.execute(text("ALTER TABLE tasks DROP COLUMN reminded_at")) # Created before the column existed
+        migrate_database(self.engine)
+        with self.engine.connect() as connection:
+            self.assertEqual(self.column_types(connection)["reminded_at"], fresh_type)
+
+    def column_types(self, connection):
+        return {row[1]: row[2] for row in connection.exec_driver_sql("PRAGMA table_info('tasks')")}
+
+    def test_hot_task_queries_use_an_index(self):
+        migrate_database(self.engine)
+        db = get_session_local()()
+        try:
+            user = task_manager.create_user(db, "whatsapp:+550000000100", "whatsapp:+550000000100")
+            now = datetime.now()
+            for i in range(50):
+                db.add(models.Task(description=f"tarefa {i}", owner_id=user.id, status="pending" if i % 3 else "completed",
+                                   due_date=now + timedelta(hours=i)))
+            db.commit()
+
+            captured = []
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                if "FROM tasks" in statement:
+                    captured.append((statement, parameters))
+            event.listen(self.engine, "before_cursor_execute", capture)
+            try:
+                task_manager.get_tasks_by_user(db, user.id, status="pending")
+                task_manager.get_reminders_for_user_by_date_filter(db, user.id, "amanhã")
+                task_manager.get_pending_reminders_for_today(db, user.id)
+                task_manager.get_task_by_id(db, 1, user.id)
+                # Keyset pages read rows in index order: no sort step before the LIMIT
+                task_manager.get_task_page(db, user.id, limit=5)
+                task_manager.get_task_page(db, user.id, after=(now, 10), limit=5)
+                task_manager.get_task_page(db, user.id, due_from=now, due_before=now + timedelta(days=1), after=(now, 10), limit=5)
+            finally:
+                event.remove(self.engine, "before_cursor_execute", capture)
+        finally:
+            db.close()
+
+        self.assertEqual(len(captured), 7)
+        with self.engine.connect() as connection:
+            for statement, parameters in captured:
+                plan = explain_query_plan(connection, statement, parameters)
+                self.assertNotIn("SCAN tasks", plan, f"Full table scan for:\n{statement}\nPlan: {plan}")
+                if "LIMIT" in statement:
+                    self.assertNotIn("TEMP B-TREE", plan, f"Sort before LIMIT for:\n{statement}\nPlan: {plan}")
+
+if __name__ == "__main__":
+    unittest.main()
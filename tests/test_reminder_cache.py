@@ -0,0 +1,89 @@
+# tests/test_reminder_cache.py
+
+import asyncio
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch, AsyncMock
+
+from app.db.database import initialize_database
+initialize_database(None, is_test_setup=True)
+
+from app.core import metrics, pipeline, task_manager
+from app.core.reminder_cache import ReminderBlockCache, reminder_block_cache, get_reminder_block
+from tests.helpers import DatabaseTestCase, FakeClock, text_message
+
+class TestReminderBlockCache(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.session_factory() as db:
+            user = task_manager.create_user(db, "5511900000701", "5511900000701")
+            task_manager.update_user_opt_in(db, user, True)
+            self.user_id = user.id
+        self.later_today = datetime.now().replace(hour=23, minute=30, second=0, microsecond=0)
+
+    def block(self):
+        with self.session_factory() as db:
+            with metrics.count_queries() as queries:
+                text = get_reminder_block(db, task_manager.resolve_user(db, "5511900000701"))
+        return text, queries.count
+
+    def test_block_is_cached_until_the_users_tasks_change(self):
+        self.assertEqual(self.block(), ("", 2)) # User lookup + the day's tasks
+        self.assertEqual(self.block(), ("", 0))
+
+        with self.session_factory() as db:
+            task = task_manager.create_task(db, self.user_id, "pagar boleto", due_date=self.later_today)
+        text, queries = self.block()
+        self.assertIn("pagar boleto", text)
+        self.assertEqual(queries, 1)
+        self.assertEqual(self.block(), (text, 0))
+
+        with self.session_factory() as db:
+            task_manager.update_task_status(db, task.id, self.user_id, "completed")
+        self.assertEqual(self.block(), ("", 1))
+
+        with self.session_factory() as db:
+            task = task_manager.create_task(db, self.user_id, "ligar para a escola", due_date=self.later_today)
+        self.assertIn("ligar para a escola", self.block()[0])
+        with self.session_factory() as db:
+            task_manager.delete_task(db, task.id, self.user_id)
+        self.assertEqual(self.block(), ("", 1))
+
+    def test_uncommitted_changes_do_not_outlive_a_rollback(self):
+        self.block()
+        with self.session_factory() as db:
+            task_manager.create_task(db, self.user_id, "nunca salva", due_date=self.later_today, commit=False)
+            db.flush()
+            self.assertIn("nunca salva", get_reminder_block(db, task_manager.resolve_user(db, "5511900000701")))
+            db.rollback()
+        self.assertEqual(self.block()[0], "")
+
+    def test_entries_expire_with_the_day_and_the_ttl(self):
+        clock = FakeClock(0.0)
+        cache = ReminderBlockCache(maxsize=2, ttl_seconds=60, clock=clock)
+        today = date(2025, 3, 10)
+        cache.put(1, today, "bloco")
+        self.assertEqual(cache.get(1, today), "bloco")
+        self.assertIsNone(cache.get(1, today + timedelta(days=1))) # The day rolled over
+        cache.put(1, today, "bloco")
+        clock.now = 61
+        self.assertIsNone(cache.get(1, today))
+        for owner_id in (1, 2, 3):
+            cache.put(owner_id, today, "")
+        self.assertIsNone(cache.get(1, today)) # Least recently used goes first
+        self.assertEqual(cache.get(3, today), "")
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_chatty_user_pays_the_reminder_query_once(self, mock_send):
+        mock_send.return_value = {"status": "success"}
+        with self.session_factory() as db:
+            task_manager.create_task(db, self.user_id, "reunião", due_date=self.later_today)
+        for i in range(5):
+            with self.session_factory() as db:
+                asyncio.run(pipeline.process_message_batch(db, [text_message("5511900000701", "ajuda", f"CHATTY_{i}")]))
+            self.assertIn("Lembrete Rápido!", mock_send.call_args.args[1])
+        self.assertEqual((reminder_block_cache.misses, reminder_block_cache.hits), (1, 4))
+
+if __name__ == "__main__":
+    unittest.main()
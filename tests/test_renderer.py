@@ -0,0 +1,55 @@
+# tests/test_renderer.py
+
+import unittest
+from collections import namedtuple
+from datetime import datetime
+
+from app.core.renderer import split_message, render_task_page, render_reminder_block, ListCursorStore, ListCursor, MORE_HINT
+
+FakeTask = namedtuple("FakeTask", ["id", "description", "due_date"])
+
+class TestSplitMessage(unittest.TestCase):
+
+    def test_short_text_is_one_message(self):
+        self.assertEqual(split_message("ok", 10), ["ok"])
+
+    def test_splits_on_line_breaks_within_the_limit(self):
+        text = "".join(f"{i}. tarefa número {i}\n" for i in range(200))
+        chunks = split_message(text, 100)
+        self.assertEqual("".join(chunks), text)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertTrue(all(chunk.endswith("\n") for chunk in chunks))
+
+    def test_cuts_a_line_longer_than_the_limit(self):
+        chunks = split_message("x" * 25, 10)
+        self.assertEqual(chunks, ["x" * 10, "x" * 10, "x" * 5])
+
+class TestRenderTaskPage(unittest.TestCase):
+
+    def test_matches_the_line_format(self):
+        tasks = [FakeTask(1, "pagar conta", datetime(2025, 1, 2, 9, 30)), FakeTask(2, "ler", None)]
+        self.assertEqual(render_task_page("Suas tarefas:\n", tasks, has_more=False),
+                         "Suas tarefas:\n1. pagar conta (Prazo: 02/01/2025 09:30)\n2. ler\n")
+        self.assertTrue(render_task_page("Suas tarefas:\n", tasks, has_more=True).endswith(MORE_HINT))
+
+    def test_reminder_block(self):
+        self.assertEqual(render_reminder_block([]), "")
+        self.assertEqual(render_reminder_block([FakeTask(1, "remédio", datetime(2025, 1, 2, 8, 0))]),
+                         "\n\nLembrete Rápido! Você tem as seguintes tarefas para hoje:\n- remédio (Prazo: 08:00)\n")
+
+class TestListCursorStore(unittest.TestCase):
+
+    def test_expires_and_is_bounded(self):
+        now = [0.0]
+        store = ListCursorStore(maxsize=2, ttl_seconds=60, clock=lambda: now[0])
+        cursor = ListCursor("list_tasks", "all", (None, 3))
+        store.put("a", cursor)
+        store.put("b", cursor)
+        store.put("c", cursor)
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.get("c"), cursor)
+        now[0] = 61
+        self.assertIsNone(store.get("c"))
+
+if __name__ == "__main__":
+    unittest.main()
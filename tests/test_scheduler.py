@@ -0,0 +1,123 @@
+# tests/test_scheduler.py
+
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, AsyncMock
+
+from app.db.database import initialize_database
+initialize_database(None, is_test_setup=True)
+
+from app.core import task_manager
+from app.core.scheduler import TimingWheel, ReminderScheduler
+from tests.helpers import DatabaseTestCase, FakeClock
+
+class TestTimingWheel(unittest.TestCase):
+
+    def test_fires_in_due_order_and_skips_cancelled(self):
+        wheel = TimingWheel(tick_seconds=1, slots=60, now=1000)
+        wheel.schedule("b", 1010)
+        wheel.schedule("a", 1005)
+        wheel.schedule("c", 1007)
+        wheel.cancel("c")
+        self.assertEqual(wheel.advance(1004), [])
+        self.assertEqual([key for key, _, _ in wheel.advance(1010)], ["a", "b"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_far_timers_move_from_overflow_into_the_wheel(self):
+        wheel = TimingWheel(tick_seconds=1, slots=60, now=0)
+        wheel.schedule("tomorrow", 86400)
+        wheel.schedule("moved", 90000)
+        wheel.schedule("moved", 30) # Rescheduling leaves a stale heap entry behind
+        self.assertEqual([key for key, _, _ in wheel.advance(30)], ["moved"])
+        self.assertEqual(wheel.advance(86399), [])
+        self.assertEqual([key for key, _, _ in wheel.advance(86400)], ["tomorrow"])
+
+    def test_past_due_and_long_pauses(self):
+        wheel = TimingWheel(tick_seconds=1, slots=10, now=100)
+        wheel.schedule("late", 50)
+        wheel.schedule("soon", 105)
+        wheel.schedule("later", 250)
+        # A pause longer than a full turn still fires everything that came due
+        self.assertEqual([key for key, _, _ in wheel.advance(1000)], ["late", "soon", "later"])
+
+class TestReminderScheduler(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = datetime.now().replace(microsecond=0)
+        self.clock = FakeClock(self.now.timestamp())
+        self.scheduler = ReminderScheduler(self.session_factory, tick_seconds=1, horizon_seconds=600,
+                                           refresh_seconds=60, grace_seconds=300, clock=self.clock)
+        with self.session_factory() as db:
+            user = task_manager.create_user(db, "whatsapp:+550000000200", "whatsapp:+550000000200")
+            task_manager.update_user_opt_in(db, user, True)
+            self.user_id = user.id
+
+    def add_task(self, description, due_date):
+        with self.session_factory() as db:
+            return task_manager.create_task(db, self.user_id, description, due_date=due_date).id
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_sends_each_reminder_once_at_due_time(self, mock_send):
+        self.add_task("tomar remédio", self.now + timedelta(seconds=120))
+        self.add_task("fora da janela", self.now + timedelta(hours=5))
+
+        asyncio.run(self.scheduler.run_once())
+        self.assertEqual(len(self.scheduler.wheel), 1)
+        mock_send.assert_not_called()
+
+        self.clock.now += 120
+        asyncio.run(self.scheduler.run_once())
+        mock_send.assert_called_once()
+        self.assertIn("tomar remédio", mock_send.call_args.args[1])
+
+        # Another scheduler (e.g. after a restart) does not send it again
+        other = ReminderScheduler(self.session_factory, horizon_seconds=600, grace_seconds=300, clock=self.clock)
+        asyncio.run(other.run_once())
+        self.assertEqual(len(other.wheel), 0)
+        self.assertEqual(mock_send.call_count, 1)
+
+    def test_committed_task_changes_update_the_wheel(self):
+        with self.session_factory() as db:
+            self.scheduler.refresh(db)
+        task_manager.register_task_listener(self.scheduler.on_task_changes)
+        try:
+            task_id = self.add_task("ligar para o banco", self.now + timedelta(minutes=5))
+            self.assertIn(task_id, self.scheduler.wheel)
+
+            with self.session_factory() as db:
+                task_manager.update_task_status(db, task_id, self.user_id, "completed", commit=False)
+                db.rollback() # Rolled back work is never reported
+            self.assertIn(task_id, self.scheduler.wheel)
+
+            with self.session_factory() as db:
+                task_manager.update_task_status(db, task_id, self.user_id, "completed")
+            self.assertNotIn(task_id, self.scheduler.wheel)
+        finally:
+            task_manager.unregister_task_listener(self.scheduler.on_task_changes)
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_tasks_created_or_moved_into_the_past_are_not_reminded(self, mock_send):
+        with self.session_factory() as db:
+            self.scheduler.refresh(db)
+        task_manager.register_task_listener(self.scheduler.on_task_changes)
+        try:
+            # e.g. "Lembrar de comprar leite" sent after 09:00 defaults to 09:00 today
+            past_id = self.add_task("comprar leite", self.now - timedelta(hours=2))
+            self.assertNotIn(past_id, self.scheduler.wheel)
+            self.assertNotIn(self.add_task("mês passado", self.now - timedelta(days=30)), self.scheduler.wheel)
+
+            moved_id = self.add_task("ligar para o banco", self.now + timedelta(minutes=5))
+            self.assertIn(moved_id, self.scheduler.wheel)
+            with self.session_factory() as db:
+                task_manager.reschedule_tasks(db, [moved_id], self.user_id, self.now - timedelta(days=1))
+            self.assertNotIn(moved_id, self.scheduler.wheel)
+
+            asyncio.run(self.scheduler.run_once())
+            mock_send.assert_not_called()
+        finally:
+            task_manager.unregister_task_listener(self.scheduler.on_task_changes)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+# tests/test_storage_profiles.py
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import database
+from app.db.database import engine_options, apply_storage_profile, to_async_url
+
+class TestStorageProfiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'profile.db')}"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_production_profile_sets_sqlite_pragmas_on_connect(self):
+        engine = create_engine(self.url, **engine_options(self.url, "production"))
+        apply_storage_profile(engine, "production")
+        try:
+            with engine.connect() as connection:
+                self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+                self.assertEqual(connection.execute(text("PRAGMA synchronous")).scalar(), 1) # NORMAL
+                self.assertEqual(connection.execute(text("PRAGMA busy_timeout")).scalar(), database.SQLITE_BUSY_TIMEOUT_MS)
+                self.assertEqual(connection.execute(text("PRAGMA cache_size")).scalar(), -database.SQLITE_CACHE_SIZE_KIB)
+        finally:
+            engine.dispose()
+
+    def test_default_profile_leaves_sqlite_alone(self):
+        engine = create_engine(self.url, **engine_options(self.url, "default"))
+        apply_storage_profile(engine, "default")
+        try:
+            with engine.connect() as connection:
+                self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "delete")
+        finally:
+            engine.dispose()
+
+    def test_async_engine_gets_the_same_pragmas(self):
+        async_url = to_async_url(self.url)
+        async def synchronous_mode():
+            async_engine = create_async_engine(async_url, **engine_options(async_url, "production"))
+            apply_storage_profile(async_engine.sync_engine, "production")
+            try:
+                async with async_engine.connect() as connection:
+                    return (await connection.execute(text("PRAGMA synchronous"))).scalar()
+            finally:
+                await async_engine.dispose()
+        self.assertEqual(asyncio.run(synchronous_mode()), 1)
+
+    def test_server_database_pool_and_statement_cache(self):
+        options = engine_options("postgresql+asyncpg://app@db/assistant", "production")
+        self.assertEqual(options["pool_size"], database.DB_POOL_SIZE)
+        self.assertTrue(options["pool_pre_ping"])
+        self.assertEqual(options["connect_args"], {"prepared_statement_cache_size": database.DB_STATEMENT_CACHE_SIZE})
+        self.assertEqual(engine_options("postgresql://app@db/assistant", "default"), {})
+        with self.assertRaises(ValueError):
+            engine_options(self.url, "turbo")
+
+if __name__ == "__main__":
+    unittest.main()
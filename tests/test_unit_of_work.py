@@ -0,0 +1,107 @@
+# tests/test_unit_of_work.py
+
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, AsyncMock
+
+from app.db.database import initialize_database
+initialize_database(None, is_test_setup=True)
+
+from app.core import metrics, pipeline, task_manager
+from app.core.renderer import list_cursors
+from app.models import models
+from tests.helpers import DatabaseTestCase, text_message
+
+class TestUnitOfWork(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+    def apply(self, texts, first_id=0):
+        """Runs one webhook batch; returns (statements executed, commits)."""
+        messages = [text_message("5511900000501", text, f"UOW_{first_id + i}") for i, text in enumerate(texts)]
+        with self.session_factory() as db:
+            with patch.object(db, "commit", wraps=db.commit) as commit, metrics.count_queries() as queries:
+                pipeline.apply_message_batch(db, messages)
+        return queries.count, commit.call_count
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_one_commit_and_a_fixed_number_of_round_trips_per_message(self, mock_send):
+        # Every message costs the dedup INSERT and the outbox INSERT, plus:
+        expected = [
+            ("Oi", 4), # user lookup, INSERT user ... RETURNING id, created_at (no refresh)
+            ("Sim", 4), # user lookup, UPDATE user
+            ("Lembrar de pagar a conta hoje às 23h", 5), # user lookup (opt-in evicted it), reminder block, INSERT task
+            ("minhas tarefas", 4), # reminder block (the new task dropped it), one page; the user comes from the cache
+            ("concluir tarefa 1", 3), # UPDATE ... RETURNING; the reminder block is cached
+            ("ajuda", 3), # reminder block again, since the completion changed it
+        ]
+        for i, (text, round_trips) in enumerate(expected):
+            with self.subTest(text=text):
+                self.assertEqual(self.apply([text], first_id=i), (round_trips, 1))
+
+        # A webhook with several messages is still one transaction
+        queries, commits = self.apply(["Lembrar de a amanhã", "Lembrar de b amanhã", "Lembrar de c amanhã"], first_id=10)
+        self.assertEqual(commits, 1)
+        self.assertLessEqual(queries, 3 * 5)
+
+    def test_standalone_calls_commit_without_refreshing(self):
+        with self.session_factory() as db:
+            with metrics.count_queries() as queries:
+                user = task_manager.create_user(db, "5511900000502", "5511900000502")
+                task = task_manager.create_task(db, user, "pagar internet", due_date=datetime.now() + timedelta(hours=1))
+                self.assertEqual(queries.count, 2) # The INSERTs; no SELECT after either commit
+                # Values survive the commit, server defaults included
+                self.assertIsNotNone(user.id)
+                self.assertIsNotNone(task.created_at)
+                self.assertEqual(task.status, "pending")
+                completed = task_manager.update_task_status(db, task.id, user.id, "completed")
+                self.assertEqual(completed.status, "completed")
+            self.assertEqual(queries.count, 2 + 2) # Owner-scoped SELECT + UPDATE
+
+    def test_unit_of_work_defers_commits_and_rolls_back_on_error(self):
+        with self.session_factory() as db:
+            with self.assertRaises(RuntimeError):
+                with task_manager.unit_of_work(db):
+                    user = task_manager.create_user(db, "5511900000503", "5511900000503")
+                    with task_manager.unit_of_work(db): # Nested blocks join the outer one
+                        task_manager.create_task(db, user, "nunca salva")
+                    self.assertIsNotNone(user.id) # commit=True still flushes
+                    raise RuntimeError("falha no meio do webhook")
+        with self.session_factory() as db:
+            self.assertEqual(db.query(models.User).count(), 0)
+            self.assertEqual(db.query(models.Task).count(), 0)
+
+    @patch("app.gateway.whatsapp_handler.send_whatsapp_message_async", new_callable=AsyncMock)
+    def test_list_cursor_only_moves_when_the_page_is_committed(self, mock_send):
+        whatsapp_id = "5511900000503"
+        with self.session_factory() as db:
+            user = task_manager.create_user(db, whatsapp_id, whatsapp_id)
+            task_manager.update_user_opt_in(db, user, True)
+            for i in range(pipeline.TASK_LIST_PAGE_SIZE * 2 + 1):
+                task_manager.create_task(db, user, f"tarefa {i}", due_date=datetime.now() + timedelta(days=1, minutes=i),
+                                         commit=False)
+            db.commit()
+        first = [text_message(whatsapp_id, "minhas tarefas", "CURSOR_1")]
+        with self.session_factory() as db:
+            pipeline.apply_message_batch(db, first)
+        stored = list_cursors.get(whatsapp_id)
+        self.assertIsNotNone(stored)
+
+        # "mais" in a batch that fails to commit: the page never went out, so the cursor stays put
+        with self.session_factory() as db:
+            with patch.object(pipeline.outbox, "enqueue", side_effect=RuntimeError("outbox unavailable")):
+                with self.assertRaises(RuntimeError):
+                    pipeline.apply_message_batch(db, [text_message(whatsapp_id, "mais", "CURSOR_2")])
+        self.assertEqual(list_cursors.get(whatsapp_id), stored)
+
+        # Within one committed batch, the second "mais" continues from the first
+        with self.session_factory() as db:
+            results = pipeline.apply_message_batch(db, [text_message(whatsapp_id, "mais", "CURSOR_3"),
+                                                        text_message(whatsapp_id, "mais", "CURSOR_4")])
+        self.assertIn(f"tarefa {pipeline.TASK_LIST_PAGE_SIZE}", results[0]["response_sent"])
+        self.assertIn(f"tarefa {pipeline.TASK_LIST_PAGE_SIZE * 2}", results[1]["response_sent"])
+        self.assertIsNone(list_cursors.get(whatsapp_id))
+
+if __name__ == "__main__":
+    unittest.main()